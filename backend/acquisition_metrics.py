@@ -0,0 +1,124 @@
+import time
+
+
+class LatencyHistogram:
+    """
+    Histogram of latencies in power-of-two microsecond buckets.
+
+    Recording is a multiplication, a bit_length() and a list increment, so it can run for every packet.
+    Bucket i counts latencies below 2**i microseconds (and at least 2**(i-1)).
+    """
+    BUCKETS = 26  # the last bucket collects everything above ~33 s
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.total = 0
+
+    def record(self, seconds: float):
+        bucket = int(seconds * 1e6).bit_length()
+        self.counts[bucket if bucket < self.BUCKETS else self.BUCKETS - 1] += 1
+        self.total += 1
+
+    def percentile(self, q: float) -> float:
+        """Upper bound (in seconds) of the bucket holding the q-th percentile, 0.0 when empty."""
+        if self.total == 0:
+            return 0.0
+        rank = q / 100 * self.total
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return (1 << bucket) / 1e6
+        return (1 << (self.BUCKETS - 1)) / 1e6
+
+    def as_dict(self) -> dict:
+        """{bucket upper bound in microseconds: count} of the non-empty buckets."""
+        return {1 << bucket: count for bucket, count in enumerate(self.counts) if count}
+
+
+class AcquisitionMetrics:
+    """
+    Telemetry of one acquisition session, readable from the UI and logs at any time.
+
+    The hot path (on_packet, record_latency) only increments counters; rates, error counters of the attached
+    packet reassembler and queue depths are computed when a snapshot is taken. Taking one changes nothing,
+    so the UI and the logs can read the metrics independently: a reader that polls for current rates passes
+    its own previous snapshot.
+    """
+
+    def __init__(self, name: str = 'acquisition'):
+        self.name = name
+        self.started_at = time.monotonic()
+
+        self.packets = 0
+        self.samples = 0
+        self.bytes = 0
+        self.invalid_packets = 0
+        self.latency = LatencyHistogram()
+
+        self._reassemblers = []
+        self._gauges = {}
+
+    def on_packet(self, size: int, samples: int):
+        self.packets += 1
+        self.samples += samples
+        self.bytes += size
+
+    def on_invalid_packet(self):
+        self.invalid_packets += 1
+
+    def record_latency(self, seconds: float):
+        self.latency.record(seconds)
+
+    def attach_reassembler(self, reassembler):
+        """Report the error counters of a band_interface.gforce.PacketReassembler, counted from now on."""
+        self._reassemblers.append((reassembler, self._reassembler_counters(reassembler)))
+
+    def add_gauge(self, name: str, read):
+        """Report ``read()`` (e.g. a queue's qsize) under ``name`` in every snapshot."""
+        self._gauges[name] = read
+
+    def snapshot(self, previous: dict = None) -> dict:
+        """Totals since the start, and rates since the ``previous`` snapshot of the caller (since the start without)."""
+        now = time.monotonic()
+        elapsed = now - self.started_at
+        packets, samples, size = self.packets, self.samples, self.bytes
+        if previous is None:
+            previous = {'elapsed': 0.0, 'packets': 0, 'samples': 0, 'bytes': 0}
+        period = elapsed - previous['elapsed']
+        last_packets, last_samples, last_bytes = previous['packets'], previous['samples'], previous['bytes']
+
+        return {
+            'name': self.name,
+            'elapsed': elapsed,
+            'packets': packets,
+            'samples': samples,
+            'bytes': size,
+            'packets_per_s': (packets - last_packets) / period if period > 0 else 0.0,
+            'samples_per_s': (samples - last_samples) / period if period > 0 else 0.0,
+            'bytes_per_s': (size - last_bytes) / period if period > 0 else 0.0,
+            'invalid_packets': self.invalid_packets,
+            'reassembly_errors': self._reassembler_total(0),
+            'dropped_fragments': self._reassembler_total(1),
+            'out_of_order_fragments': self._reassembler_total(2),
+            'queue_depths': {name: read() for name, read in self._gauges.items()},
+            'latency_p50': self.latency.percentile(50),
+            'latency_p99': self.latency.percentile(99),
+            'latency_histogram_us': self.latency.as_dict(),
+        }
+
+    def _reassembler_total(self, counter: int) -> int:
+        return sum(self._reassembler_counters(reassembler)[counter] - baseline[counter]
+                   for reassembler, baseline in self._reassemblers)
+
+    @staticmethod
+    def _reassembler_counters(reassembler) -> tuple:
+        return reassembler.droppedPackets, reassembler.lostFragments, reassembler.outOfOrderFragments
+
+    def summary(self) -> str:
+        """One line of the snapshot, with the average rates of the whole session."""
+        s = self.snapshot()
+        return (f"[{s['name']}] {s['packets_per_s']:.1f} packets/s, {s['samples_per_s']:.1f} samples/s, "
+                f"{s['bytes_per_s']:.0f} B/s, {s['reassembly_errors']} reassembly errors, "
+                f"{s['dropped_fragments']} dropped fragments, latency p50<{s['latency_p50'] * 1e3:.3f} ms "
+                f"p99<{s['latency_p99'] * 1e3:.3f} ms, queues {s['queue_depths']}")
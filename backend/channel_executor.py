@@ -0,0 +1,57 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+EXECUTOR_KINDS = ('serial', 'thread', 'process')
+
+
+class ChannelExecutor:
+    """
+    Runs independent per-channel work of EMGSignal (filtering, feature extraction) on a pool of workers.
+
+    ``thread`` suits numpy/scipy work - sosfilt, FFTs and ufuncs release the GIL, so channels really run
+    in parallel. ``process`` is for pure-Python feature extractors; their arguments and results are pickled.
+    Results always come back in channel order and every channel is computed the same way whatever the
+    number of workers, so the output doesn't depend on the configuration.
+    """
+
+    def __init__(self, workers: int = None, kind: str = 'thread'):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f'Unknown executor kind: {kind}, expected one of {EXECUTOR_KINDS}')
+        self.kind = kind
+        self.workers = 1 if kind == 'serial' else workers or os.cpu_count() or 1
+        self._pool = None
+
+    @classmethod
+    def serial(cls) -> 'ChannelExecutor':
+        return cls(kind='serial')
+
+    def map(self, function, items) -> list:
+        items = list(items)
+        if self.workers == 1 or len(items) < 2:
+            return [function(item) for item in items]
+        return list(self._get_pool().map(function, items))
+
+    def map_rows(self, function, buffer: np.ndarray):
+        """Replace every row (channel) of a (channels x samples) buffer with ``function(row)``."""
+        for row, result in zip(buffer, self.map(function, buffer)):
+            if result is not row:  # thread workers may have modified the row in place
+                row[:] = result
+
+    def _get_pool(self):
+        if self._pool is None:
+            pool_type = ThreadPoolExecutor if self.kind == 'thread' else ProcessPoolExecutor
+            self._pool = pool_type(max_workers=self.workers)
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
@@ -0,0 +1,175 @@
+import json
+import struct
+import zlib
+from bisect import bisect_right
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+class ChunkedDataset:
+    """
+    A recording stored as fixed-size chunks of samples, with an index of the chunks in the header.
+
+    File layout:
+      - preamble: magic, offset and length of the header (``PREAMBLE``, little-endian)
+      - the chunks, one after another
+      - the header: JSON with the dtype, the column labels, the sample count, the codec, free-form attributes
+        (e.g. the content hash of the data) and for every chunk its first sample, sample count, byte offset
+        and the byte sizes of its parts
+
+    Codecs:
+      - ``raw`` (the default): the (samples x channels) rows of a chunk, uncompressed - the chunks together
+        are the whole recording in one row-major block, which is memory-mapped rather than read (see ``memmap``).
+        Loading is a copy out of the page cache at most, opening a recording doesn't depend on its length
+      - ``zlib``: the columns of a chunk one after another (channel-major, each channel a contiguous typed
+        block), compressed as a single zlib stream. 8-bit samples are only Huffman coded: EMG is noise-like,
+        string matching barely finds anything in it, and without it the chunks are smaller and decompress faster.
+        About half the size of ``raw`` on disk, e.g. for archiving, but every read decompresses
+
+    The header goes after the chunks so a recording is written in one pass, chunk by chunk.
+    Any part of the recording is read by decoding only the chunks that cover it, and of a zlib chunk only
+    up to the last channel asked for - reading a range takes as long whatever the length of the recording.
+    """
+    FORMAT = '.emg'
+    MAGIC = b'EMGCHNK1'
+    PREAMBLE = struct.Struct('<8sQQ')
+    VERSION = 1
+    CODECS = ('zlib', 'raw')
+    DEFAULT_CODEC = 'raw'
+    DEFAULT_CHUNK_SAMPLES = 1 << 14
+    COMPRESSION_LEVEL = 6
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            magic, header_offset, header_length = self.PREAMBLE.unpack(f.read(self.PREAMBLE.size))
+            if magic != self.MAGIC:
+                raise ValueError(f'{self.path} is not a chunked EMG dataset')
+            f.seek(header_offset)
+            self.header = json.loads(f.read(header_length))
+
+        if self.header['version'] > self.VERSION:
+            raise ValueError(f'{self.path} has format version {self.header["version"]}, '
+                             f'only up to {self.VERSION} is supported')
+        self.dtype = np.dtype(self.header['dtype'])
+        self.columns = pd.Index(self.header['columns'])
+        self.codec = self.header['codec']
+        self.chunks = self.header['chunks']
+        self.attributes = self.header.get('attributes', {})
+        self._chunk_starts = [chunk['start'] for chunk in self.chunks]
+
+    def __len__(self) -> int:
+        return self.header['samples']
+
+    @staticmethod
+    def supports(data: pd.DataFrame) -> bool:
+        """Whether the frame can be stored: numeric columns and a range index (a recording, sample by sample)."""
+        return isinstance(data.index, pd.RangeIndex) and all(dtype.kind in 'biuf' for dtype in data.dtypes)
+
+    @classmethod
+    def write(cls, path: Path, data: pd.DataFrame, codec: str = DEFAULT_CODEC,
+              chunk_samples: int = DEFAULT_CHUNK_SAMPLES, attributes: dict = None) -> 'ChunkedDataset':
+        if codec not in cls.CODECS:
+            raise ValueError(f'Unknown codec: {codec}, expected one of {cls.CODECS}')
+        if not cls.supports(data):
+            raise ValueError('Only numeric frames with a range index can be stored as chunked datasets')
+
+        values = data.to_numpy()
+        strategy = zlib.Z_HUFFMAN_ONLY if values.dtype.itemsize == 1 else zlib.Z_DEFAULT_STRATEGY
+        chunks = []
+        with open(path, 'wb') as f:
+            f.write(bytes(cls.PREAMBLE.size))  # filled in once the header is written
+            for start in range(0, len(values), chunk_samples):
+                block = values[start:start + chunk_samples]
+                if codec == 'zlib':
+                    # Without a copy for frames of a SignalStore, they're channel-major already
+                    compressor = zlib.compressobj(cls.COMPRESSION_LEVEL, strategy=strategy)
+                    parts = [compressor.compress(np.ascontiguousarray(block.T)) + compressor.flush()]
+                else:
+                    parts = [np.ascontiguousarray(block).tobytes()]
+                chunks.append({'start': start, 'samples': len(block), 'offset': f.tell(),
+                               'sizes': [len(part) for part in parts]})
+                for part in parts:
+                    f.write(part)
+
+            header = json.dumps({
+                'version': cls.VERSION,
+                'dtype': values.dtype.str,
+                'columns': data.columns.tolist(),
+                'samples': len(values),
+                'index': {'start': data.index.start, 'step': data.index.step},
+                'codec': codec,
+                'chunk_samples': chunk_samples,
+                'attributes': attributes if attributes is not None else {},
+                'chunks': chunks,
+            }).encode()
+            header_offset = f.tell()
+            f.write(header)
+            f.seek(0)
+            f.write(cls.PREAMBLE.pack(cls.MAGIC, header_offset, len(header)))
+        return cls(path)
+
+    def read(self, start: int = 0, stop: int = None, channels: list = None) -> np.ndarray:
+        """
+        Samples [start, stop) of ``channels`` (column labels, all by default) as a (samples x channels) array.
+        Only the chunks that overlap the range are read.
+        """
+        start, stop, _ = slice(start, stop).indices(len(self))
+        stop = max(start, stop)
+        positions = self._positions(channels)
+        if self.codec == 'raw':
+            # Only the pages of the range are read from the file
+            rows = self.memmap()[start:stop]
+            return np.array(rows if channels is None else rows[:, positions])
+
+        # Channel-major, so a decompressed channel is copied into contiguous memory
+        values = np.empty((len(positions), stop - start), dtype=self.dtype)
+        decoded_channels = positions.max() + 1 if len(positions) else 0
+        first = bisect_right(self._chunk_starts, start) - 1
+        with open(self.path, 'rb') as f:
+            for chunk in self.chunks[max(first, 0):]:
+                chunk_start = chunk['start']
+                if chunk_start >= stop:
+                    break
+                f.seek(chunk['offset'])
+                data = f.read(sum(chunk['sizes']))
+                # The stream holds the channels one after another, it's decompressed up to the last one needed
+                block = zlib.decompressobj().decompress(data, decoded_channels * chunk['samples'] * self.dtype.itemsize)
+                block = np.frombuffer(block, dtype=self.dtype).reshape(-1, chunk['samples'])
+
+                low, high = max(start, chunk_start), min(stop, chunk_start + chunk['samples'])
+                values[:, low - start:high - start] = block[positions, low - chunk_start:high - chunk_start]
+        return values.T
+
+    def _positions(self, channels: list) -> np.ndarray:
+        if channels is None:
+            return np.arange(len(self.columns))
+        positions = self.columns.get_indexer(channels)
+        if (positions < 0).any():
+            raise KeyError(f'Unknown channels: {[c for c, p in zip(channels, positions) if p < 0]}')
+        return positions
+
+    def memmap(self) -> np.ndarray:
+        """
+        The whole recording as a read-only (samples x channels) array mapped from the file, only possible
+        with the raw codec. Nothing is read until it's accessed, then only the pages that are touched.
+        """
+        if self.codec != 'raw':
+            raise ValueError(f'Only raw datasets can be memory-mapped, {self.path} is {self.codec} compressed')
+        if len(self) == 0:
+            return np.empty((0, len(self.columns)), dtype=self.dtype)
+        return np.memmap(self.path, dtype=self.dtype, mode='r', offset=self.chunks[0]['offset'],
+                         shape=(len(self), len(self.columns)))
+
+    def index(self) -> pd.RangeIndex:
+        index = self.header['index']
+        return pd.RangeIndex(index['start'], index['start'] + len(self) * index['step'], index['step'])
+
+    def to_frame(self, start: int = 0, stop: int = None, channels: list = None) -> pd.DataFrame:
+        """DataFrame of ``read``, indexed by the positions of the samples in the whole recording."""
+        values = self.read(start, stop, channels)
+        start = slice(start, stop).indices(len(self))[0]
+        columns = self.columns if channels is None else self.columns[self._positions(channels)]
+        return pd.DataFrame(values, index=self.index()[start:start + len(values)], columns=columns, copy=False)
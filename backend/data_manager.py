@@ -5,18 +5,34 @@ from pathlib import Path
 import pandas as pd
 import yaml
 
-from backend.emg_signal import EMGSignal
+from backend.chunked_dataset import ChunkedDataset
+from backend.dataset_catalog import DatasetCatalog
+from backend.emg_signal import EMGSignal, narrow_raw_data
+from backend.feature_cache import FeatureCache
+from backend.signal_store import SignalStore
 
 
 class DataManager:
     """
     A class that manages the storage and retrieval of EMG data and metadata.
 
-    It uses pickle and gzip for data serialization and compression, and yaml for metadata serialization.
-    This way, the data can be stored in a compact and efficient way.
+    The data is stored as a chunked dataset (chunks of typed samples and an index of the chunks, uncompressed
+    so it can be memory-mapped, see ChunkedDataset), and yaml is used for metadata serialization.
+    This way, the data can be stored in a compact and efficient way, and any part of it read without the rest.
+    Datasets stored before, as a pickled DataFrame in a single gzip stream, are still read.
+    Raw samples are stored and loaded in the narrowest integer dtype of the band's resolution (see narrow_raw_data).
+
+    A dataset can also be loaded lazily, as a signal over its memory-mapped samples, so opening it doesn't
+    depend on its size. Datasets of the older format are mapped from an uncompressed copy, made once next
+    to the data file.
+
+    The datasets are listed from a catalog (see DatasetCatalog) - a dataset's files are only read again
+    after they've changed.
     """
     DATA_DEFAULT_NAME = 'emg_raw_data'
     METADATA_DEFAULT_NAME = 'metadata'
+    FEATURE_CACHE_FOLDER = 'feature_cache'
+    CATALOG_NAME = '.catalog.sqlite'
 
     def __init__(self):
         self.PROJECT_PATH = Path(__file__).parent.parent
@@ -25,21 +41,114 @@ class DataManager:
         self.ASSETS_PATH = self.PROJECT_PATH / 'assets'
         self.BAND_ASSETS_PATH = self.ASSETS_PATH / 'band'
 
-        self.DATA_FORMAT = '.pkl.gz'
+        self.DATA_FORMAT = ChunkedDataset.FORMAT
+        self.LEGACY_DATA_FORMAT = '.pkl.gz'
+        self.MAPPED_DATA_FORMAT = '.mapped'  # uncompressed chunked dataset, not named *.emg so it isn't listed twice
         self.METADATA_FORMAT = '.yaml'
 
         self.BAND_ASSETS_PATH.mkdir(parents=True, exist_ok=True)
 
+        tracked_files = (f'{self.METADATA_DEFAULT_NAME}{self.METADATA_FORMAT}',
+                         f'{self.DATA_DEFAULT_NAME}{self.DATA_FORMAT}',
+                         f'{self.DATA_DEFAULT_NAME}{self.LEGACY_DATA_FORMAT}')
+        self.catalog = DatasetCatalog(self.BAND_ASSETS_PATH / self.CATALOG_NAME, self.BAND_ASSETS_PATH,
+                                      tracked_files, self._describe_dataset)
+
     def list_datasets(self):
-        return [d.name for d in self.BAND_ASSETS_PATH.iterdir() if d.is_dir()]
+        return [entry['dataset_id'] for entry in self.list_dataset_entries()]
+
+    def list_dataset_entries(self, gender: str = None) -> list:
+        """Catalog entries of the datasets (see DatasetCatalog.COLUMNS), refreshed with the datasets changed since."""
+        self.catalog.refresh()
+        return self.catalog.entries(gender)
+
+    def dataset_entry(self, dataset_id: str) -> dict:
+        entry = self.catalog.entry(dataset_id)
+        if entry is None:  # e.g. stored by another DataManager since the last refresh
+            self.catalog.refresh()
+            entry = self.catalog.entry(dataset_id)
+        if entry is None:
+            raise ValueError(f'Dataset {dataset_id} does not exist')
+        return entry
+
+    def _describe_dataset(self, dataset_folder: Path) -> dict:
+        """Catalog entry of a dataset, from its files. Only a dataset of the older format has to be read whole."""
+        metadata_path = dataset_folder / f'{self.METADATA_DEFAULT_NAME}{self.METADATA_FORMAT}'
+        metadata = {}
+        if metadata_path.exists():
+            with open(metadata_path, 'r') as f:
+                metadata = yaml.safe_load(f) or {}
+        # A bare 'subject:' key is loaded as None
+        subject, band = metadata.get('subject') or {}, metadata.get('band') or {}
+        entry = {'metadata': metadata, 'subject': subject, 'band': band, 'gender': subject.get('gender'),
+                 'sampling_rate': band.get('sampling_rate'), 'resolution': band.get('resolution'),
+                 'metadata_size': metadata_path.stat().st_size if metadata_path.exists() else None}
+
+        data_path = dataset_folder / f'{self.DATA_DEFAULT_NAME}{self.DATA_FORMAT}'
+        if not data_path.exists():
+            data_path = dataset_folder / f'{self.DATA_DEFAULT_NAME}{self.LEGACY_DATA_FORMAT}'
+        if data_path.exists():
+            if data_path.name.endswith(self.DATA_FORMAT):
+                dataset = ChunkedDataset(data_path)
+                samples, channels = len(dataset), len(dataset.columns)
+                content_hash = dataset.attributes.get('content_hash')
+            else:
+                data = self.read_data_file(data_path)
+                (samples, channels), content_hash = data.shape, FeatureCache.content_hash(data)
+            entry.update(data_file=data_path.name, data_size=data_path.stat().st_size, samples=samples,
+                         channels=channels, content_hash=content_hash,
+                         # Unknown for datasets of the older format, their metadata has no sampling rate
+                         duration=samples / entry['sampling_rate'] if entry['sampling_rate'] else None)
+        return entry
 
     def _DATASET_FOLDER(self, dataset_id: str) -> Path:
         return self.BAND_ASSETS_PATH / dataset_id
 
-    def load_dataset(self, dataset_id: str) -> EMGSignal:
-        data = self.load_data(dataset_id)
+    def load_dataset(self, dataset_id: str, lazy: bool = False) -> EMGSignal:
+        """
+        The dataset as a signal. With ``lazy`` its samples are memory-mapped rather than read, pages of the file
+        are only loaded when they're touched - e.g. for the metadata, one channel or a preview of a long recording.
+        Datasets are stored uncompressed, so they're mapped as they are. The first lazy open of a dataset of
+        the older format decodes it once to write an uncompressed copy (as long as a full load), later opens
+        map the copy. A dataset written with the zlib codec on purpose can't be mapped, it's read.
+        """
         metadata = self.load_metadata(dataset_id)
-        return EMGSignal(data, metadata)
+        feature_cache = self.feature_cache(dataset_id)
+        mapped = self._mapped_data(dataset_id) if lazy else None
+        if mapped is not None:
+            store = SignalStore.from_array(mapped.memmap().T, mapped.columns)
+            return EMGSignal.from_store(store, metadata, mapped.attributes.get('content_hash'),
+                                        feature_cache=feature_cache)
+
+        data = self.load_data(dataset_id)
+        return EMGSignal(data, metadata, feature_cache=feature_cache)
+
+    def _mapped_data(self, dataset_id: str, file_name: str = DATA_DEFAULT_NAME):
+        """
+        Uncompressed chunked dataset of the data: the data file itself, or for the older format a copy made
+        on first use. None if the data can't be mapped.
+        """
+        dataset_folder = self._DATASET_FOLDER(dataset_id)
+        data_path = dataset_folder / (file_name + self.DATA_FORMAT)
+        if data_path.exists():
+            dataset = ChunkedDataset(data_path)
+            return dataset if dataset.codec == 'raw' else None
+        data_path = dataset_folder / (file_name + self.LEGACY_DATA_FORMAT)
+        mapped_path = dataset_folder / (file_name + self.MAPPED_DATA_FORMAT)
+        if mapped_path.exists() and mapped_path.stat().st_mtime >= data_path.stat().st_mtime:
+            return ChunkedDataset(mapped_path)
+
+        data = self.load_data(dataset_id, file_name)
+        if not ChunkedDataset.supports(data):
+            return None
+        temporary_path = mapped_path.with_suffix('.tmp')
+        ChunkedDataset.write(temporary_path, data, 'raw', attributes={'content_hash': FeatureCache.content_hash(data)})
+        temporary_path.replace(mapped_path)  # a concurrent reader never maps a partially written file
+        return ChunkedDataset(mapped_path)
+
+    def feature_cache(self, dataset_id: str, max_bytes: int = FeatureCache.DEFAULT_MAX_BYTES) -> FeatureCache:
+        """Memo of the features extracted from the dataset, in a folder of the dataset."""
+        return FeatureCache(self._DATASET_FOLDER(dataset_id) / self.FEATURE_CACHE_FOLDER, max_bytes)
 
     def load_data(self, dataset_id: str, file_name: str = DATA_DEFAULT_NAME) -> pd.DataFrame:
         dataset_folder = self._DATASET_FOLDER(dataset_id)
@@ -47,8 +156,50 @@ class DataManager:
             raise ValueError(f'Dataset {dataset_id} does not exist')
 
         else:
-            with gzip.open(dataset_folder / (file_name + self.DATA_FORMAT), 'rb') as f:
-                return pickle.load(f)
+            data_path = dataset_folder / (file_name + self.DATA_FORMAT)
+            if not data_path.exists():
+                data_path = dataset_folder / (file_name + self.LEGACY_DATA_FORMAT)
+            return self.read_data_file(data_path)
+
+    def read_range(self, dataset_id: str, start: float, stop: float, channels: list = None,
+                   sampling_rate: float = None, file_name: str = DATA_DEFAULT_NAME) -> pd.DataFrame:
+        """
+        Seconds [start, stop) of ``channels`` (column labels, all by default) of a dataset,
+        e.g. ``read_range('3', 30, 60, channels=[2, 5])``. The rows keep their sample positions as the index.
+
+        Only the chunks of the data that overlap the range are decompressed, so it takes as long for
+        a short recording as for a long one. Datasets of the older format are read from their uncompressed
+        copy (see ``load_dataset(lazy=True)``), made at the first read.
+        ``sampling_rate`` is the one in the metadata unless given, e.g. for older datasets without it.
+        """
+        if start < 0 or stop < 0:
+            raise ValueError(f'Negative time in [{start}, {stop}), times are seconds from the start of the recording')
+        if sampling_rate is None:
+            sampling_rate = self.load_metadata(dataset_id).get('band', {}).get('sampling_rate')
+            if sampling_rate is None:
+                raise ValueError(f'The metadata of dataset {dataset_id} has no sampling rate, pass it explicitly')
+        first, last = int(round(start * sampling_rate)), int(round(stop * sampling_rate))
+
+        dataset_folder = self._DATASET_FOLDER(dataset_id)
+        if not dataset_folder.exists():
+            raise ValueError(f'Dataset {dataset_id} does not exist')
+        data_path = dataset_folder / (file_name + self.DATA_FORMAT)
+        dataset = ChunkedDataset(data_path) if data_path.exists() else self._mapped_data(dataset_id, file_name)
+        if dataset is None:
+            data = self.load_data(dataset_id, file_name).iloc[first:last]
+            return data if channels is None else data[channels]
+        return dataset.to_frame(first, last, channels)
+
+    @staticmethod
+    def read_data_file(data_path: Path) -> pd.DataFrame:
+        """Data of a dataset file of either format, e.g. one picked in the file browser."""
+        data_path = Path(data_path)
+        if data_path.name.endswith(ChunkedDataset.FORMAT):
+            return ChunkedDataset(data_path).to_frame()
+
+        with gzip.open(data_path, 'rb') as f:
+            # Datasets stored before were int64, or even object columns of Python ints
+            return narrow_raw_data(pickle.load(f))
 
     def load_metadata(self, dataset_id: str) -> dict:
         metadata_path = self._DATASET_FOLDER(dataset_id) / f'{self.METADATA_DEFAULT_NAME}{self.METADATA_FORMAT}'
@@ -64,12 +215,18 @@ class DataManager:
     def store_dataset(self, data: pd.DataFrame, metadata: dict, data_name: str = DATA_DEFAULT_NAME, metadata_name: str = METADATA_DEFAULT_NAME):
         dataset_folder = self._create_new_dataset_folder()
 
-        self._store_data(data, dataset_folder, data_name)
+        self._store_data(narrow_raw_data(data, metadata.get('band', {}).get('resolution')), dataset_folder, data_name)
         self._store_metadata(metadata, dataset_folder, metadata_name)
 
     def _store_data(self, data: pd.DataFrame, dataset_folder: Path, file_name: str):
-        with gzip.open(dataset_folder / f'{file_name}{self.DATA_FORMAT}', 'wb') as f:
-            pickle.dump(data, f)
+        if ChunkedDataset.supports(data):
+            # The content hash keys the feature cache, kept in the header it's known without reading the samples
+            ChunkedDataset.write(dataset_folder / f'{file_name}{self.DATA_FORMAT}', data,
+                                 attributes={'content_hash': FeatureCache.content_hash(data)})
+        else:
+            # e.g. a time index, the chunked format only keeps the position of the samples
+            with gzip.open(dataset_folder / f'{file_name}{self.LEGACY_DATA_FORMAT}', 'wb') as f:
+                pickle.dump(data, f)
 
     def _store_metadata(self, metadata: dict, dataset_folder: Path, file_name: str):
         with open(dataset_folder / f'{file_name}{self.METADATA_FORMAT}', 'w') as f:
@@ -0,0 +1,120 @@
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class DatasetCatalog:
+    """
+    SQLite index of the datasets in a folder (a subfolder per dataset): subject metadata, band configuration,
+    sample count, duration, file sizes and content hash of every dataset.
+
+    Listing and describing datasets is a query instead of reading every metadata file. ``refresh`` keeps the
+    index up to date incrementally: a dataset is only described again (with ``describe``, which reads its
+    files) when the modification time or size of one of its ``tracked_files`` has changed, or it's new.
+    The catalog is a cache, created on first use and rebuilt from the datasets when its schema changes.
+    """
+    SCHEMA_VERSION = 1
+    COLUMNS = {'gender': 'TEXT', 'sampling_rate': 'REAL', 'resolution': 'INTEGER', 'channels': 'INTEGER',
+               'samples': 'INTEGER', 'duration': 'REAL', 'data_file': 'TEXT', 'data_size': 'INTEGER',
+               'metadata_size': 'INTEGER', 'content_hash': 'TEXT',
+               'subject': 'TEXT', 'band': 'TEXT', 'metadata': 'TEXT'}
+    JSON_COLUMNS = ('subject', 'band', 'metadata')  # dicts, stored as JSON
+
+    def __init__(self, database_path: Path, datasets_path: Path, tracked_files: tuple, describe):
+        self.database_path = Path(database_path)
+        self.datasets_path = Path(datasets_path)
+        self.tracked_files = tracked_files
+        self.describe = describe  # dataset folder -> {column: value}
+        self._created = False
+
+    @contextmanager
+    def _connection(self):
+        connection = sqlite3.connect(self.database_path)
+        connection.row_factory = sqlite3.Row
+        try:
+            with connection:  # one transaction, committed unless an exception is raised
+                if not self._created:
+                    self._create(connection)
+                    self._created = True
+                yield connection
+        finally:
+            connection.close()
+
+    def _create(self, connection):
+        if connection.execute('PRAGMA user_version').fetchone()[0] != self.SCHEMA_VERSION:
+            connection.execute('DROP TABLE IF EXISTS datasets')
+        columns = ', '.join(f'{column} {column_type}' for column, column_type in self.COLUMNS.items())
+        connection.execute(f'CREATE TABLE IF NOT EXISTS datasets '
+                           f'(dataset_id TEXT PRIMARY KEY, signature TEXT NOT NULL, {columns})')
+        connection.execute('CREATE INDEX IF NOT EXISTS datasets_by_gender ON datasets (gender)')
+        connection.execute(f'PRAGMA user_version = {self.SCHEMA_VERSION}')
+
+    def _signature(self, dataset_folder: str) -> str:
+        files = []
+        for name in self.tracked_files:
+            try:
+                stat = os.stat(os.path.join(dataset_folder, name))
+            except FileNotFoundError:
+                continue
+            files.append((name, stat.st_mtime_ns, stat.st_size))
+        return json.dumps(files)
+
+    def refresh(self) -> int:
+        """Describe the new and modified datasets again, forget the removed ones. Returns how many changed."""
+        with self._connection() as connection:
+            stored = dict(connection.execute('SELECT dataset_id, signature FROM datasets').fetchall())
+
+        # Describing a dataset may read it whole, that's done before the write transaction rather than in it
+        changed = {}
+        present = set()
+        for dataset_folder in os.scandir(self.datasets_path):
+            if not dataset_folder.is_dir():
+                continue
+            present.add(dataset_folder.name)
+            signature = self._signature(dataset_folder.path)
+            if stored.get(dataset_folder.name) != signature:
+                changed[dataset_folder.name] = (signature, self.describe(Path(dataset_folder.path)))
+
+        removed = [(dataset_id,) for dataset_id in stored.keys() - present]
+        if changed or removed:
+            with self._connection() as connection:
+                for dataset_id, (signature, entry) in changed.items():
+                    self._store(connection, dataset_id, signature, entry)
+                connection.executemany('DELETE FROM datasets WHERE dataset_id = ?', removed)
+        return len(changed) + len(removed)
+
+    def _store(self, connection, dataset_id: str, signature: str, entry: dict):
+        values = {column: entry.get(column) for column in self.COLUMNS}
+        for column in self.JSON_COLUMNS:
+            values[column] = json.dumps(values[column], default=str)  # yaml may give e.g. dates
+        columns = ('dataset_id', 'signature') + tuple(self.COLUMNS)
+        connection.execute(f'INSERT OR REPLACE INTO datasets ({", ".join(columns)}) '
+                           f'VALUES ({", ".join(":" + column for column in columns)})',
+                           dict(values, dataset_id=dataset_id, signature=signature))
+
+    def entries(self, gender: str = None) -> list:
+        """Entries of all the datasets (or of a subject ``gender``), numbered datasets in numeric order."""
+        query = 'SELECT * FROM datasets'
+        parameters = ()
+        if gender is not None:
+            query += ' WHERE gender = ?'
+            parameters = (gender,)
+        with self._connection() as connection:
+            rows = connection.execute(query + ' ORDER BY length(dataset_id), dataset_id', parameters).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def entry(self, dataset_id: str):
+        """Entry of a dataset, None if it isn't in the catalog."""
+        with self._connection() as connection:
+            row = connection.execute('SELECT * FROM datasets WHERE dataset_id = ?', (dataset_id,)).fetchone()
+        return self._entry(row) if row is not None else None
+
+    def _entry(self, row: sqlite3.Row) -> dict:
+        entry = dict(row)
+        del entry['signature']
+        for column in self.JSON_COLUMNS:
+            entry[column] = json.loads(entry[column])
+        entry['folder'] = self.datasets_path / entry['dataset_id']
+        return entry
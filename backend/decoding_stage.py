@@ -0,0 +1,111 @@
+import threading
+import time
+
+import numpy as np
+
+from backend.emg_decoder import EmgPacketDecoder
+
+
+class DecodingStage:
+    """
+    Pipeline stage between the Bluetooth notification callback and an EMGSignal.
+
+    ``push`` runs on the Bluetooth I/O thread and only copies the raw packet payload into a preallocated
+    staging buffer, so notifications are not lost while the GUI or a classifier holds the GIL.
+    A background worker decodes the staged packets in batches of up to ``batch_packets`` and publishes
+    every decoded block to the signal (and ``on_block``, e.g. a Qt signal emit).
+
+    There is exactly one producer (the I/O thread) and one consumer (the worker): the producer only
+    advances ``_written`` and the consumer only advances ``_read``, so the buffer itself needs no lock.
+    When the worker falls more than ``capacity`` packets behind, new packets are dropped and counted.
+    """
+    FLUSH_INTERVAL = 0.05  # s, a partial batch waits at most this long
+
+    def __init__(self, decoder: EmgPacketDecoder, emg_signal, batch_packets: int = 8, capacity: int = 1024,
+                 on_block=None, metrics=None):
+        self.decoder = decoder
+        self.emg_signal = emg_signal
+        self.batch_packets = batch_packets
+        self.capacity = capacity
+        self.on_block = on_block
+        self.metrics = metrics
+
+        self._staging = np.empty((capacity, decoder.payload_length), dtype=np.uint8)
+        self._arrivals = np.empty(capacity)
+        self._written = 0
+        self._read = 0
+        self.dropped_packets = 0
+
+        self._ready = threading.Event()
+        self._running = False
+        self._worker = None
+
+    def push(self, payload, received_at: float = None) -> bool:
+        """Stage one packet payload (without the type byte). False when the staging buffer is full."""
+        written = self._written
+        if written - self._read >= self.capacity:
+            self.dropped_packets += 1
+            return False
+
+        slot = written % self.capacity
+        self._staging[slot] = np.frombuffer(payload, dtype=np.uint8)
+        self._arrivals[slot] = received_at if received_at is not None else time.perf_counter()
+        # Publish the slot only once it's filled
+        self._written = written + 1
+
+        if written + 1 - self._read >= self.batch_packets:
+            self._ready.set()
+        return True
+
+    def pending(self) -> int:
+        return self._written - self._read
+
+    def start(self):
+        self._running = True
+        self._worker = threading.Thread(target=self._run, name='DecodingStage', daemon=True)
+        self._worker.start()
+
+    def stop(self, timeout: float = None):
+        """
+        Stop the worker once it has published everything staged so far, waits for it (by default as long as
+        it takes). Raises TimeoutError if the worker is still draining after ``timeout`` seconds.
+        """
+        self._running = False
+        self._ready.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+            if self._worker.is_alive():
+                raise TimeoutError(f'The decoding stage still had {self.pending()} packets to publish')
+            self._worker = None
+        self.flush()
+
+    def flush(self):
+        while self.pending():
+            self._publish_batch()
+
+    def _run(self):
+        while self._running:
+            self._ready.wait(self.FLUSH_INTERVAL)
+            self._ready.clear()
+            while self.pending():
+                self._publish_batch()
+
+    def _publish_batch(self):
+        read = self._read
+        count = min(self._written - read, self.batch_packets)
+        first = read % self.capacity
+        # A batch never wraps around the end of the buffer, so it is always one contiguous slice
+        count = min(count, self.capacity - first)
+
+        block = self.decoder.decode_many(self._staging[first:first + count])
+        arrivals = self._arrivals[first:first + count].copy()
+        # Decoding copied the payloads, the slots can be reused now
+        self._read = read + count
+
+        self.emg_signal.add_data_block(block)
+        if self.on_block is not None:
+            self.on_block(block)
+        if self.metrics is not None:
+            published_at = time.perf_counter()
+            for arrival in arrivals:
+                self.metrics.record_latency(published_at - arrival)
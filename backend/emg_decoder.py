@@ -0,0 +1,79 @@
+import numpy as np
+
+RESOLUTIONS = (8, 12)
+
+
+def channel_ids(channel_mask: int) -> list:
+    """Indices of the channels enabled in the band's channel mask, in the order they appear in a packet."""
+    return [channel for channel in range(channel_mask.bit_length()) if channel_mask >> channel & 1]
+
+
+def sample_dtype(resolution: int) -> np.dtype:
+    """Narrowest dtype holding the band's samples of ``resolution`` bits: uint8 for 8-bit, uint16 for 12-bit."""
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f'Unsupported resolution: {resolution} bits')
+    return np.dtype(np.uint8) if resolution <= 8 else np.dtype(np.uint16)
+
+
+class EmgPacketDecoder:
+    """
+    Decodes the payload of NTF_EMG_ADC_DATA packets into (samples x channels) integer arrays.
+
+    A packet holds ``channels`` bytes (the band's "data length", 128 by default) of samples interleaved
+    across the channels enabled in ``channel_mask``: ch0, ch1, ..., chN, ch0, ch1, ...
+    8-bit samples take one byte each; 12-bit samples are packed in pairs into three bytes
+    (low byte of the first sample, its high nibble plus the low nibble of the second one, then
+    the high byte of the second sample). Trailing bytes that do not make a full sample frame are padding.
+    Decoding is done with numpy on the whole packet - no Python object is created per sample.
+    """
+
+    def __init__(self, channel_mask: int = 0xFF, channels: int = 128, resolution: int = 8):
+        self.dtype = sample_dtype(resolution)
+        self.channel_ids = channel_ids(channel_mask)
+        if not self.channel_ids:
+            raise ValueError('Channel mask does not enable any channel')
+
+        self.channel_count = len(self.channel_ids)
+        self.payload_length = channels
+        self.resolution = resolution
+
+        sample_slots = channels if resolution == 8 else channels // 3 * 2
+        self.samples_per_packet = sample_slots // self.channel_count
+        if self.samples_per_packet == 0:
+            raise ValueError(f'A {channels} byte packet can not hold a sample of every channel')
+        self._values_per_packet = self.samples_per_packet * self.channel_count
+
+    @classmethod
+    def from_metadata(cls, metadata: dict) -> 'EmgPacketDecoder':
+        """Decoder for the band section of a ``build_metadata`` dict."""
+        band = metadata['band']
+        return cls(channel_mask=band['channel_mask'], channels=band['channels'], resolution=band['resolution'])
+
+    def decode(self, payload) -> np.ndarray:
+        """(samples_per_packet x channel_count) array of a single packet payload (without the type byte)."""
+        return self.decode_many(payload)
+
+    def decode_many(self, payloads) -> np.ndarray:
+        """
+        Decode any number of concatenated payloads (a bytes-like object or an (n, payload_length) uint8 array)
+        into one (n * samples_per_packet x channel_count) array. The result never shares memory with the input,
+        so it stays valid when the packet buffer gets reused.
+        """
+        raw = np.frombuffer(payloads, dtype=np.uint8) if not isinstance(payloads, np.ndarray) else payloads
+        if raw.size % self.payload_length:
+            raise ValueError(f'Payload of {raw.size} bytes is not a multiple of {self.payload_length} bytes')
+        raw = raw.reshape(-1, self.payload_length)
+
+        if self.resolution == 8:
+            values = raw[:, :self._values_per_packet].copy()
+        else:
+            values = self._unpack12(raw[:, :(self._values_per_packet + 1) // 2 * 3])
+
+        return values.reshape(-1, self.channel_count)
+
+    def _unpack12(self, raw: np.ndarray) -> np.ndarray:
+        triplets = raw.reshape(raw.shape[0], -1, 3).astype(np.uint16)
+        values = np.empty((raw.shape[0], triplets.shape[1], 2), dtype=np.uint16)
+        values[..., 0] = triplets[..., 0] | (triplets[..., 1] & 0x0F) << 8
+        values[..., 1] = triplets[..., 1] >> 4 | triplets[..., 2] << 4
+        return values.reshape(raw.shape[0], -1)[:, :self._values_per_packet]
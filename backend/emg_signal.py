@@ -1,9 +1,21 @@
 import asyncio
+import copy
+import threading
+import time
 
+import numpy as np
 import pandas as pd
 
+from backend.channel_executor import ChannelExecutor
+from backend.emg_decoder import sample_dtype
+from backend.feature_cache import FeatureCache
 from backend.feature_extractor import FeatureExtractor
-from backend.filter import Filter
+from backend.filter import Filter, StreamingFilter
+from backend.filter_plan import FilterPlan
+from backend.ring_buffer import RingBuffer
+from backend.signal_store import SignalStore
+from backend.subscription import Subscription
+from backend.windowing import sliding_windows
 
 
 class EMGSignal:
@@ -16,12 +28,53 @@ class EMGSignal:
 
     The signal is a time series of EMG data, where each row represents a moment in time
     and each column represents the signal value for a specific channel.
+
+    New samples are written by the acquisition thread into a lock-free single-producer/single-consumer
+    ring buffer and published into a growable column store by whoever reads first. The DataFrame is a view
+    of the store, only rebuilt when the store has changed since. Live consumers subscribe and read the store
+    through their own cursor (see Subscription), so they don't take samples away from each other.
+
+    Raw samples are kept in the narrowest integer dtype of the band's ADC resolution (uint8 for 8-bit
+    samples), they're only converted to float (FilterPlan.DTYPE) when filtered.
+    Filters applied to a signal that is fed sample by sample stay attached to it, the samples that come
+    after are filtered the same way before they're published.
+
+    Past ``spill_bytes`` of samples the store moves to a memory-mapped file (see SignalStore), and the buffer
+    is published by the producer itself once half full, so a recording of any length, read or not,
+    keeps a bounded memory footprint.
     """
-    def __init__(self, data: pd.DataFrame = None, metadata: dict = None):
-        self._signal = data if data is not None else pd.DataFrame()
-        self._signal_queue = asyncio.Queue()
+    DEFAULT_BUFFER_SAMPLES = 1 << 16
+    DEFAULT_BUFFER_SECONDS = 1800  # how long the band can record before the buffer has to be read
+    DEFAULT_SPILL_BYTES = 256 * 2**20
+    STREAM_POLL_INTERVAL = 0.01  # s
 
+    def __init__(self, data: pd.DataFrame = None, metadata: dict = None, buffer_capacity: int = None,
+                 overflow: str = 'drop_newest', executor: ChannelExecutor = None, feature_cache: FeatureCache = None,
+                 spill_bytes: int = DEFAULT_SPILL_BYTES, spill_folder=None):
+        if data is not None and len(data.columns) == 0:
+            data = None  # no channels yet, they come with the first samples
         self._metadata = metadata if metadata is not None else {}
+        if data is not None:
+            data = narrow_raw_data(data, self._metadata.get('band', {}).get('resolution'))
+        # Every store of the signal (raw and filtered) spills to disk past the same size
+        self._store_options = {'spill_bytes': spill_bytes, 'spill_folder': spill_folder}
+        self._store = SignalStore.from_frame(data, **self._store_options) if data is not None else None
+        self._index = data.index if data is not None else None
+        # A view of the store, the caller's frame isn't kept alongside it
+        self._signal = self._store.to_frame(self._index) if self._store is not None else pd.DataFrame()
+        self._signal_version = self._store.version if self._store is not None else 0
+        self._buffer = None  # created with the first samples, once the channel count and dtype are known
+        self._buffer_capacity = buffer_capacity
+        self._overflow = overflow
+
+        # Only the holder of the publish lock drains the ring buffer, so it keeps a single consumer
+        self._publish_lock = threading.Lock()
+        self._published = threading.Condition()
+        self._subscriptions = []
+        self._last_batch_start = 0
+
+        # Runs per-channel filtering and feature extraction, serially unless configured otherwise
+        self.executor = executor if executor is not None else ChannelExecutor.serial()
 
         self._filters_scheduled_queue = []
         self._features_scheduled = []
@@ -29,59 +82,349 @@ class EMGSignal:
         self._filters_applied = []
         self._features_extracted = {}
 
+        # Extracted features are memoized when the signal has a cache (a stored dataset), keyed by the hash
+        # of the data it was created with and the filters applied since
+        self.feature_cache = feature_cache
+        self._content_hash = FeatureCache.content_hash(data) if feature_cache is not None and data is not None else None
+
+        # Leading streaming filters of the scheduled queue run on every published block
+        self._online_filters = []
+        self._channel_streams = None  # per-channel copies of the online filters, with a pool of threads
+        self._filtered_store = None
+        # The applied online filters of a live signal, [(filters, per-channel streams)], in the order applied
+        self._attached_filters = []
+
+    @classmethod
+    def from_store(cls, store: SignalStore, metadata: dict = None, content_hash: str = None,
+                   **options) -> 'EMGSignal':
+        """
+        Signal of the samples of a store, which is adopted as it is - e.g. one over a memory-mapped dataset,
+        whose samples are only read when they're used. ``content_hash`` is the FeatureCache.content_hash
+        of the samples, for the feature cache (known from the dataset, hashing the samples would read them).
+        """
+        emg_signal = cls(metadata=metadata, **options)
+        emg_signal._store = store
+        emg_signal._index = pd.RangeIndex(len(store))
+        if emg_signal.feature_cache is not None:
+            emg_signal._content_hash = content_hash
+        return emg_signal
+
     def add_data_row(self, channels_values: list):
-        self._signal_queue.put_nowait(channels_values)
+        self.add_data_block(np.asarray(channels_values)[np.newaxis])
+
+    def add_data_block(self, samples: np.ndarray):
+        """Append a (samples x channels) array, e.g. a decoded EMG packet, as that many rows."""
+        buffer = self._buffer
+        if buffer is None:
+            if self._filters_applied:
+                raise RuntimeError('Samples can only be added to a signal filtered online, see apply_filters')
+            dtype = self.raw_dtype if self.raw_dtype is not None else samples.dtype
+            buffer = self._buffer = RingBuffer(self._buffer_size(), samples.shape[1], dtype, self._overflow)
+        buffer.write(samples)
+        if len(buffer) >= buffer.capacity // 2:
+            self.publish()  # nobody reads, the samples go to the store before the buffer overflows
+
+    def _buffer_size(self) -> int:
+        if self._buffer_capacity is not None:
+            return self._buffer_capacity
+        sampling_rate = self._metadata.get('band', {}).get('sampling_rate')
+        if sampling_rate:
+            return sampling_rate * self.DEFAULT_BUFFER_SECONDS
+        return self.DEFAULT_BUFFER_SAMPLES
+
+    @property
+    def raw_dtype(self):
+        """dtype of the band's samples, from the ADC resolution in the metadata (None if it isn't known)."""
+        resolution = self._metadata.get('band', {}).get('resolution')
+        return sample_dtype(resolution) if resolution is not None else None
+
+    @property
+    def buffer(self) -> RingBuffer:
+        """The ingestion ring buffer (None before the first samples), e.g. for its overflow counters."""
+        return self._buffer
+
+    def buffered_samples(self) -> int:
+        return len(self._buffer) if self._buffer is not None else 0
 
     @property
     def signal(self) -> pd.DataFrame:
-        if self._is_signal_outdated:
+        if self._is_signal_outdated():
             self._sync_signal()
         return self._signal
 
     def _is_signal_outdated(self) -> bool:
-        return not self._signal_queue.empty()
+        return self.buffered_samples() > 0 or (self._store is not None and self._store.version != self._signal_version)
 
-    def _sync_signal(self):  # DataFrame concatenation is costly (according to chatgpt), so not syncing all the time
-        signal_latest_rows = []
-        while not self._signal_queue.empty():
-            signal_latest_rows.append(self._signal_queue.get_nowait())
-        self._signal = pd.concat([self._signal, pd.DataFrame(signal_latest_rows)])
+    def _sync_signal(self):
+        self.publish()
+
+        if self._store is not None and self._store.version != self._signal_version:
+            self._signal = self._store.to_frame(self._frame_index(self._store))
+            self._signal_version = self._store.version
+
+    def _frame_index(self, store: SignalStore):
+        # The index of the initial data only fits as long as no samples were added to it
+        return self._index if self._index is not None and len(self._index) == len(store) else None
+
+    def _replace_signal(self, data: pd.DataFrame):
+        with self._published:
+            self._store = SignalStore.from_frame(data, **self._store_options)
+        self._index = data.index
+        self._signal = self._store.to_frame(self._index)
+        self._signal_version = self._store.version
+
+    def _replace_store(self, store: SignalStore):
+        with self._published:
+            self._signal = store.to_frame(self._frame_index(store))
+            self._store = store
+        self._signal_version = store.version
+
+    def publish(self) -> int:
+        """
+        Move the buffered samples into the store and wake up the subscribers, returns how many were published.
+        Returns 0 right away when another thread is publishing at the moment.
+        """
+        if not self._publish_lock.acquire(blocking=False):
+            return 0
+        try:
+            if self.buffered_samples() == 0:
+                return 0
+            samples = self._buffer.read_block()
+
+            with self._published:
+                self._wait_for_blocking_subscribers(len(samples))
+                if self._store is None:
+                    self._store = SignalStore(samples.shape[1], samples.dtype, self._buffer.capacity,
+                                              **self._store_options)
+                for filters, channel_streams in self._attached_filters:
+                    samples = self._process_online(samples, filters, channel_streams).astype(FilterPlan.DTYPE)
+                self._last_batch_start = len(self._store)
+                self._store.append(samples)
+                self._filter_online()
+                self._published.notify_all()
+            return len(samples)
+        finally:
+            self._publish_lock.release()
+
+    def _wait_for_blocking_subscribers(self, incoming: int):
+        # Called with the _published condition held, subscribers notify it when they take samples
+        for subscription in list(self._subscriptions):
+            deadline = time.monotonic() + subscription.block_timeout
+            while subscription._must_block(incoming) and not subscription.closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._published.wait(remaining)
+
+    def published_samples(self) -> int:
+        return len(self._store) if self._store is not None else 0
+
+    def _published_values(self, start: int, stop: int) -> np.ndarray:
+        if self._store is None:
+            return np.empty((0, 0))
+        return self._store.values()[start:stop]
+
+    def subscribe(self, name: str = None, policy: str = 'drop_oldest', max_lag: int = None, max_batch: int = None,
+                  from_start: bool = False, block_timeout: float = 1.0) -> Subscription:
+        """New consumer of the samples published from now on (or of the whole signal, with ``from_start``)."""
+        with self._published:
+            subscription = Subscription(self, name, policy, max_lag, max_batch, from_start, block_timeout)
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._published:
+            subscription.closed = True
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+            self._published.notify_all()
+
+    @property
+    def subscriptions(self) -> list:
+        return list(self._subscriptions)
 
     @property
     def metadata(self) -> dict:
         return self._metadata
 
-    async def stream(self):
-        # TODO: streaming should be done with asyncio, nice framework for dealing with IO-bound tasks
-        # https://docs.python.org/3/library/asyncio.html
-        # https://realpython.com/async-io-python/
-        # note: threading could also be used, but it has more complex API
-        # note: multiprocessing could also be used, but it has a lot more complex API; it's more for CPU-bound tasks
+    async def stream(self, **subscription_options):
+        """
+        Yield (samples x channels) blocks of the samples published since the previous one.
+        Every stream is a separate subscription, see ``subscribe`` for the options.
+        """
+        subscription = self.subscribe(**subscription_options)
+        try:
+            while True:
+                samples = subscription.poll()
+                if len(samples):
+                    yield samples
+                else:
+                    await asyncio.sleep(self.STREAM_POLL_INTERVAL)
+        finally:
+            subscription.close()
+
+    def windows(self, size: int, hop: int, channels: list = None, live: bool = False):
+        """
+        Yield overlapping (size x channels) windows of the signal, ``hop`` samples apart, as read-only views.
+
+        ``channels`` selects columns by label (all by default); a contiguous range of columns stays zero-copy,
+        any other selection copies those channels once per batch of windows, never per window.
+        With ``live`` the generator doesn't stop at the end of the signal but waits for new samples
+        and yields windows as soon as they are complete - until the caller stops iterating.
+        """
+        position = 0
         while True:
-            yield await self._signal_queue.get()
+            if self._is_signal_outdated():
+                self._sync_signal()
+            windows = sliding_windows(self._window_values(position, channels), size, hop)
+            yield from windows
+            position += len(windows) * hop
+
+            if not live:
+                return
+            if len(windows) == 0:
+                time.sleep(self.STREAM_POLL_INTERVAL)
+
+    def _window_values(self, start: int, channels: list) -> np.ndarray:
+        if self._store is None:
+            return np.empty((0, 0 if channels is None else len(channels)))
+
+        values = self._store.values()[start:]
+        if channels is None:
+            return values
+
+        positions = self._store.columns.get_indexer(channels)
+        if (positions < 0).any():
+            raise KeyError(f'Unknown channels: {[c for c, p in zip(channels, positions) if p < 0]}')
+        if len(positions) and (np.diff(positions) == 1).all():
+            return values[:, positions[0]:positions[-1] + 1]
+        return values[:, positions]
 
     def schedule_filter(self, emg_filter: Filter):
         self._filters_scheduled_queue.append(emg_filter)
+        with self._published:
+            self._update_online_filters()
+
+    def _update_online_filters(self):
+        online_filters = []
+        for emg_filter in self._filters_scheduled_queue:
+            if not isinstance(emg_filter, StreamingFilter):
+                break
+            online_filters.append(emg_filter)
+
+        if online_filters != self._online_filters:
+            self._online_filters = online_filters
+            self._filtered_store = None  # filtered from the first sample again at the next publish
+
+    def _filter_online(self):
+        # Called with the _published condition held, after new samples were appended to the store
+        if not self._online_filters or self._store is None:
+            return
+
+        if self._filtered_store is None:
+            self._start_online_streams()
+            self._filtered_store = SignalStore(self._store.channels, FilterPlan.DTYPE, self._store.capacity,
+                                               self._store.columns, **self._store_options)
+
+        block = self._store.values()[len(self._filtered_store):]
+        if len(block) == 0:
+            return
+        block = self._process_online(block, self._online_filters, self._channel_streams)
+        self._filtered_store.append(block.astype(FilterPlan.DTYPE))
+
+    def _start_online_streams(self):
+        for emg_filter in self._online_filters:
+            emg_filter.reset()
+        # On a pool of threads every channel runs through its own copy of the chain, with its own state, so
+        # the channels are filtered in parallel. Worker processes couldn't keep the state from block to block
+        self._channel_streams = None
+        if self._store is not None and self.executor.kind == 'thread' and self.executor.workers > 1:
+            self._channel_streams = [copy.deepcopy(self._online_filters) for _ in range(self._store.channels)]
+
+    def _process_online(self, block: np.ndarray, filters: list, channel_streams: list) -> np.ndarray:
+        if channel_streams is None:
+            for emg_filter in filters:
+                block = emg_filter.process(block)
+            return block
+        return np.column_stack(self.executor.map(_process_channel_stream, zip(channel_streams, block.T)))
 
     def apply_filters(self):
+        """
+        Apply the scheduled filters to the signal.
+
+        A signal fed sample by sample (see ``add_data_block``) is filtered online: the filters stay attached
+        and filter every sample published afterwards, so only streaming filters can be applied to it.
+        Otherwise the queue runs as one compiled FilterPlan.
+        """
         assert self._filters_scheduled_queue, "No filters scheduled"
-        assert self._is_signal_outdated(), "Signal dataframe is not up-to-date"
 
-        while self._filters_scheduled_queue:
-            emg_filter = self._filters_scheduled_queue.pop(0)
-            self._signal = emg_filter.filter(self._signal)
-            self._filters_applied.append(emg_filter)
+        if self._buffer is not None:
+            self._apply_online()
+            return
+
+        # The whole queue runs as one compiled plan, in place on a single float32 copy of the signal
+        filters, self._filters_scheduled_queue = self._filters_scheduled_queue, []
+        with self._published:
+            self._update_online_filters()
+        signal = self.signal
+        plan = FilterPlan.compile(filters)
+        filtered = plan.run(plan.prepare(signal), signal.columns, signal.index, self.executor)
+        self._replace_store(SignalStore.from_array(filtered, signal.columns))
+        self._filters_applied.extend(filters)
+
+    def _apply_online(self):
+        offline = [f for f in self._filters_scheduled_queue if not isinstance(f, StreamingFilter)]
+        if offline:
+            raise RuntimeError(f'Only streaming filters can be applied to a live signal, not {offline}')
+
+        self.publish()
+        with self._published:
+            if self._store is None:
+                self._start_online_streams()  # nothing published yet, the streams start with the first samples
+            # Catches up on the samples that arrived before the filters were scheduled, if any
+            self._filter_online()
+            filters, channel_streams = self._online_filters, self._channel_streams
+            filtered_store = self._filtered_store
+            self._online_filters, self._channel_streams, self._filtered_store = [], None, None
+            self._attached_filters.append((filters, channel_streams))
+            self._filters_scheduled_queue = []
+            if filtered_store is not None:
+                self._replace_store(filtered_store)
+        self._filters_applied.extend(filters)
 
     def schedule_feature_extraction(self, feature_extractor: FeatureExtractor):
         self._features_scheduled.append(feature_extractor)
 
     def extract_features(self):
-        assert self._is_signal_outdated(), "Signal dataframe is not up-to-date"
+        signal = self.signal
 
         for feature_extractor in self._features_scheduled:
-            feature_dataframe = feature_extractor.extract(self._signal)
+            cache_key = self._feature_cache_key(feature_extractor)
+            feature_dataframe = self.feature_cache.get(cache_key) if cache_key is not None else None
+
+            if feature_dataframe is None:
+                feature_dataframe = self._extract(feature_extractor, signal)
+                if cache_key is not None:
+                    self.feature_cache.put(cache_key, feature_dataframe)
             self._features_extracted[feature_extractor] = feature_dataframe
 
+    def _extract(self, feature_extractor: FeatureExtractor, signal: pd.DataFrame) -> pd.DataFrame:
+        if feature_extractor.per_channel and self.executor.workers > 1:
+            channels = [signal[[column]] for column in signal.columns]
+            return pd.concat(self.executor.map(feature_extractor.extract, channels), axis=1)
+        return feature_extractor.extract(signal)
+
+    def _feature_cache_key(self, feature_extractor: FeatureExtractor):
+        # Samples acquired after the signal was created aren't covered by the content hash
+        if self._content_hash is None or self.published_samples() != len(self._index):
+            return None
+        return FeatureCache.key(self._content_hash, self._filters_applied, feature_extractor)
+
+    @property
+    def features(self) -> dict:
+        """{feature extractor: its feature DataFrame} of the extractors run so far."""
+        return dict(self._features_extracted)
+
     def __str__(self):
         return f'{__class__.__name__}(data=\n{self.signal}, \nmetadata={self.metadata})'
 
@@ -103,6 +446,14 @@ if __name__ == '__main__':
     asyncio.run(main())
 
 
+def _process_channel_stream(stream_and_channel) -> np.ndarray:
+    filters, channel = stream_and_channel
+    block = channel[:, np.newaxis]
+    for emg_filter in filters:
+        block = emg_filter.process(block)
+    return block[:, 0]
+
+
 def build_metadata(sampling_rate, channel_mask, channels, resolution, age, gender, height, weight):
     """ A centralized way of enforcing dict keys for the EMG metadata representation.
         Not the best for sure, but best what came to my mind now, better than defining the dict in some wild place of code.
@@ -132,3 +483,25 @@ def build_metadata(sampling_rate, channel_mask, channels, resolution, age, gende
             {'sampling_rate': sampling_rate, 'channel_mask': channel_mask, 'channels': channels,
              'resolution': resolution}
     }
+
+
+def narrow_raw_data(data: pd.DataFrame, resolution: int = None) -> pd.DataFrame:
+    """
+    Raw (non-negative integer) samples in the narrowest dtype of their ADC resolution, e.g. uint8
+    instead of int64 for the 8-bit band samples - 8 times less memory. Without a known resolution
+    (datasets recorded before it was stored), the narrowest unsigned dtype holding the values is used.
+    Anything else (filtered float data, out of range values) is returned as it is.
+    """
+    if any(dtype == object for dtype in data.dtypes):
+        data = data.infer_objects()  # object columns of Python ints become int64 first
+    if data.empty or not all(np.issubdtype(dtype, np.integer) for dtype in data.dtypes):
+        return data
+
+    values = data.to_numpy()
+    low, high = values.min(), values.max()
+    dtype = sample_dtype(resolution) if resolution is not None else np.min_scalar_type(high)
+    if low < 0 or high > np.iinfo(dtype).max:
+        return data
+    if all(current.kind == 'u' and current.itemsize <= dtype.itemsize for current in data.dtypes):
+        return data  # already as narrow
+    return data.astype(dtype)
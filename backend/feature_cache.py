@@ -0,0 +1,101 @@
+import gzip
+import hashlib
+import os
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+class FeatureCache:
+    """
+    Persistent memo of extracted features, stored in a folder next to the dataset.
+
+    An entry is keyed by the hash of the dataset content, the chain of filters applied to it and the
+    feature extractor (class and parameters), so it's never served for different inputs - changing any of
+    them changes the key, and the outdated entries are evicted eventually.
+    The folder is bounded to ``max_bytes``; the least recently used entries are evicted first.
+    """
+    DEFAULT_MAX_BYTES = 64 * 2**20
+    FORMAT = '.features'  # gzipped pickles, not named *.gz so they aren't mistaken for recordings
+
+    def __init__(self, folder: Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.folder = Path(folder)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def content_hash(data: pd.DataFrame) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        values = np.ascontiguousarray(data.to_numpy())
+        digest.update(repr((values.dtype.str, values.shape, list(data.columns))).encode())
+        digest.update(values.data)
+        return digest.hexdigest()
+
+    @classmethod
+    def key(cls, content_hash: str, filters: list, feature_extractor) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(content_hash.encode())
+        for part in filters + [feature_extractor]:
+            digest.update(_fingerprint(part).encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.folder / f'{key}{self.FORMAT}'
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with gzip.open(path, 'rb') as f:
+                features = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+
+        os.utime(path)  # most recently used
+        self.hits += 1
+        return features
+
+    def put(self, key: str, features: pd.DataFrame):
+        self.folder.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        temporary_path = path.with_suffix('.tmp')
+        with gzip.open(temporary_path, 'wb') as f:
+            pickle.dump(features, f)
+        temporary_path.replace(path)  # readers never see a partially written entry
+        self._evict()
+
+    def size(self) -> int:
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def clear(self):
+        for entry in self._entries():
+            entry.unlink()
+
+    def _entries(self) -> list:
+        return list(self.folder.glob(f'*{self.FORMAT}')) if self.folder.exists() else []
+
+    def _evict(self):
+        entries = sorted(((entry.stat(), entry) for entry in self._entries()), key=lambda e: e[0].st_mtime)
+        total = sum(stat.st_size for stat, _ in entries)
+        for stat, entry in entries:
+            if total <= self.max_bytes:
+                break
+            entry.unlink(missing_ok=True)
+            total -= stat.st_size
+
+
+def _fingerprint(obj) -> str:
+    """Class and parameters of a filter or feature extractor. Private attributes (runtime state) are left out."""
+    if isinstance(obj, np.ndarray):
+        return f'ndarray({obj.dtype.str},{obj.shape},{hashlib.blake2b(np.ascontiguousarray(obj).data).hexdigest()})'
+    if isinstance(obj, (list, tuple)):
+        return '[' + ','.join(_fingerprint(item) for item in obj) + ']'
+    if isinstance(obj, dict):
+        return '{' + ','.join(f'{key!r}:{_fingerprint(value)}' for key, value in sorted(obj.items())) + '}'
+    if hasattr(obj, '__dict__') and not isinstance(obj, type):
+        parameters = {key: value for key, value in vars(obj).items() if not key.startswith('_')}
+        return f'{type(obj).__module__}.{type(obj).__qualname__}{_fingerprint(parameters)}'
+    return repr(obj)
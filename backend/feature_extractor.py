@@ -4,6 +4,10 @@ import pandas as pd
 
 
 class FeatureExtractor(ABC):
+    # True when every channel's features only depend on that channel's samples. EMGSignal can then
+    # extract the channels in parallel and concatenate the per-channel results column-wise.
+    per_channel = False
+
     @abstractmethod
     def extract(self, data: pd.DataFrame) -> pd.DataFrame:
         pass
@@ -1,17 +1,107 @@
-    # TODO implement signal-to-noise ratio (SNR) feature extractor
-    # similar to this one
-
-    # Define the noise segment (for simplicity, using the first 100 samples as noise)
-    noise_segment = emg_flattened_signal[:100]
-    signal_segment = emg_flattened_signal
-
-    # Function to calculate SNR
-    def calculate_snr(signal, noise):
-        signal_power = np.mean(signal**2)
-        noise_power = np.mean(noise**2)
-        snr = 10 * np.log10(signal_power / noise_power)
-        return snr
-
-    # Calculate SNR
-    snr = calculate_snr(signal_segment, noise_segment)
-    print(f'SNR: {snr:.2f} dB')
\ No newline at end of file
+import copy
+from collections import deque
+
+import numpy as np
+import pandas as pd
+from scipy import signal
+
+from backend.feature_extractor import FeatureExtractor
+
+
+class StreamingSNR(FeatureExtractor):
+    """
+    Signal-to-noise ratio of every channel, updated incrementally as samples arrive.
+
+    The noise floor comes from minimum statistics: the power of the (DC-free) signal is smoothed and its
+    minimum is tracked over the last ``history`` sub-windows of ``subwindow`` seconds. Noise is always there,
+    while muscle activity comes and goes, so that minimum follows the noise even during contractions
+    and without marking a rest segment by hand. The SNR is the mean power over the noise floor, in dB.
+
+    Every update costs O(1) per sample (two first-order recursive filters, a running sum and a running
+    minimum), so it can run live during acquisition and its result be stored with the dataset.
+    """
+    per_channel = True
+
+    def __init__(self, sampling_rate: float = 500, smoothing: float = 0.05, subwindow: float = 0.5,
+                 history: int = 8, dc_time_constant: float = 1.0, noise_bias: float = 1.5,
+                 min_noise_power: float = 1 / 12):
+        self.sampling_rate = sampling_rate
+        self.smoothing = smoothing
+        self.subwindow = subwindow
+        self.history = history
+        self.dc_time_constant = dc_time_constant
+        # The minimum of the smoothed power lies below the mean noise power, this scales it back up
+        self.noise_bias = noise_bias
+        # The band's samples are integers, the noise can't be lower than their quantization noise (LSB^2 / 12)
+        self.min_noise_power = min_noise_power
+        self.reset()
+
+    def reset(self):
+        self._dc_state = None
+        self._smoothing_state = None
+        self._power_sum = 0.0
+        self._samples = 0
+        self._subwindow_length = max(int(round(self.subwindow * self.sampling_rate)), 1)
+        self._subwindow_fill = 0
+        self._subwindow_minimum = None
+        self._minima = deque(maxlen=self.history)
+
+    def update(self, block: np.ndarray):
+        """Feed the next (samples x channels) block."""
+        block = np.asarray(block, dtype=np.float64)
+        if len(block) == 0:
+            return
+
+        dc_alpha = 1 - np.exp(-1 / (self.dc_time_constant * self.sampling_rate))
+        if self._dc_state is None:
+            # Start the DC estimate at the first sample rather than at 0
+            self._dc_state = (1 - dc_alpha) * block[:1]
+        dc, self._dc_state = signal.lfilter([dc_alpha], [1, dc_alpha - 1], block, axis=0, zi=self._dc_state)
+        power = np.square(block - dc)
+
+        self._power_sum = self._power_sum + power.sum(axis=0)
+        self._samples += len(block)
+
+        smoothing_alpha = 1 - np.exp(-1 / max(self.smoothing * self.sampling_rate, 1))
+        if self._smoothing_state is None:
+            self._smoothing_state = (1 - smoothing_alpha) * power[:1]
+        smoothed, self._smoothing_state = signal.lfilter([smoothing_alpha], [1, smoothing_alpha - 1], power,
+                                                         axis=0, zi=self._smoothing_state)
+        self._track_minimum(smoothed)
+
+    def _track_minimum(self, smoothed: np.ndarray):
+        position = 0
+        while position < len(smoothed):
+            take = min(self._subwindow_length - self._subwindow_fill, len(smoothed) - position)
+            minimum = smoothed[position:position + take].min(axis=0)
+            self._subwindow_minimum = minimum if self._subwindow_minimum is None else \
+                np.minimum(self._subwindow_minimum, minimum)
+            self._subwindow_fill += take
+            position += take
+
+            if self._subwindow_fill == self._subwindow_length:
+                self._minima.append(self._subwindow_minimum)
+                self._subwindow_minimum = None
+                self._subwindow_fill = 0
+
+    def signal_power(self) -> np.ndarray:
+        return self._power_sum / self._samples if self._samples else np.array([np.nan])
+
+    def noise_power(self) -> np.ndarray:
+        minima = list(self._minima) + ([self._subwindow_minimum] if self._subwindow_minimum is not None else [])
+        if not minima:
+            return np.array([np.nan])
+        return np.maximum(self.noise_bias * np.min(minima, axis=0), self.min_noise_power)
+
+    def snr(self) -> np.ndarray:
+        """SNR of every channel in dB (inf for a noiseless channel, nan before any sample)."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return 10 * np.log10(self.signal_power() / self.noise_power())
+
+    def extract(self, data: pd.DataFrame) -> pd.DataFrame:
+        # A fresh copy, so extracting from a recording doesn't disturb a live estimate
+        estimator = copy.deepcopy(self)
+        estimator.reset()
+        estimator.update(data.to_numpy())
+        return pd.DataFrame([estimator.snr(), estimator.signal_power(), estimator.noise_power()],
+                            index=['snr_db', 'signal_power', 'noise_power'], columns=data.columns)
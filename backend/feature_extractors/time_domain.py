@@ -0,0 +1,102 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from backend.feature_extractor import FeatureExtractor
+from backend.windowing import window_length
+
+TIME_DOMAIN_FEATURES = ('mav', 'rms', 'zc', 'ssc', 'wl', 'var')
+
+
+class TimeDomainFeatures(FeatureExtractor):
+    """
+    Classic time-domain EMG features of every channel over sliding windows.
+
+    - mav: mean absolute value
+    - rms: root mean square
+    - zc:  zero crossings (sign changes between consecutive samples)
+    - ssc: slope sign changes
+    - wl:  waveform length (sum of absolute differences of consecutive samples)
+    - var: variance
+
+    Every feature is a sum over the window, so all windows of all channels come from prefix sums:
+    one pass over the signal per feature, whatever the overlap of the windows.
+    The result is tidy - one row per (window, channel), with the window's first sample and a column per feature.
+    """
+
+    def __init__(self, window: int, hop: int, features=TIME_DOMAIN_FEATURES):
+        unknown = set(features) - set(TIME_DOMAIN_FEATURES)
+        if unknown:
+            raise ValueError(f'Unknown features: {sorted(unknown)}, expected some of {TIME_DOMAIN_FEATURES}')
+        if window < 3 or hop <= 0:
+            raise ValueError('The window must have at least 3 samples and the hop must be positive')
+        self.window = window
+        self.hop = hop
+        self.features = tuple(features)
+
+    @classmethod
+    def for_duration(cls, window: float, hop: float, sampling_rate: float, features=TIME_DOMAIN_FEATURES):
+        """Windows given in seconds, e.g. 0.2 s windows every 0.05 s."""
+        return cls(window_length(window, sampling_rate), window_length(hop, sampling_rate), features)
+
+    def extract(self, data: pd.DataFrame) -> pd.DataFrame:
+        # Channel-major, so every reduction runs over contiguous memory
+        values = np.ascontiguousarray(data.to_numpy(dtype=np.float64).T)
+        starts = np.arange(0, values.shape[1] - self.window + 1, self.hop)
+        # Windows and hops are whole numbers of blocks of this many samples
+        block = math.gcd(self.window, self.hop)
+        used = starts[-1] + self.window if len(starts) else 0
+        first_block, window_blocks = starts // block, self.window // block
+
+        def window_sums(per_sample: np.ndarray, dtype=np.float64) -> np.ndarray:
+            # Sum of per_sample[:, start:start + window] for every window start, for all channels at once:
+            # sums of the blocks, then differences of the prefix sums of the blocks
+            per_sample = per_sample[:, :used]
+            if per_sample.shape[1] < used:
+                per_sample = np.pad(per_sample, ((0, 0), (0, used - per_sample.shape[1])))
+            block_sums = per_sample.reshape(len(per_sample), -1, block).sum(axis=2, dtype=dtype)
+            prefix = np.zeros((len(per_sample), block_sums.shape[1] + 1), dtype=dtype)
+            np.cumsum(block_sums, axis=1, out=prefix[:, 1:])
+            return (prefix[:, first_block + window_blocks] - prefix[:, first_block]).T
+
+        def pair_counts(changes: np.ndarray, pairs: int) -> np.ndarray:
+            # changes[:, i] is about samples i and i + 1 (and i + 2), only count those within the window
+            counts = window_sums(changes, np.int64)
+            for outside in range(self.window - pairs):
+                position = starts + pairs + outside
+                inside = position < changes.shape[1]
+                counts[inside] -= changes[:, position[inside]].T
+            return counts
+
+        columns = {}
+        if 'mav' in self.features:
+            columns['mav'] = window_sums(np.abs(values)) / self.window
+        if 'rms' in self.features:
+            columns['rms'] = np.sqrt(window_sums(np.square(values)) / self.window)
+        differences = np.diff(values, axis=1) if {'ssc', 'wl'} & set(self.features) else None
+        if 'zc' in self.features:
+            columns['zc'] = pair_counts(np.diff(np.signbit(values), axis=1), self.window - 1)
+        if 'ssc' in self.features:
+            columns['ssc'] = pair_counts(np.diff(np.signbit(differences), axis=1), self.window - 2)
+        if 'wl' in self.features:
+            wl = window_sums(np.abs(differences))
+            last = starts + self.window - 1
+            inside = last < differences.shape[1]
+            wl[inside] -= np.abs(differences[:, last[inside]]).T
+            columns['wl'] = wl
+        if 'var' in self.features:
+            # Centered per channel first, the sum of squares then loses much less precision
+            centered = values - values.mean(axis=1, keepdims=True) if values.size else values
+            mean = window_sums(centered) / self.window
+            columns['var'] = np.maximum(window_sums(np.square(centered)) / self.window - np.square(mean), 0)
+
+        channels = len(data.columns)
+        tidy = pd.DataFrame({
+            'window': np.repeat(np.arange(len(starts)), channels),
+            'start': np.repeat(starts, channels),
+            'channel': np.tile(np.asarray(data.columns), len(starts)),
+        })
+        for feature in self.features:
+            tidy[feature] = columns[feature].ravel()
+        return tidy
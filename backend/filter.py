@@ -1,5 +1,7 @@
+import copy
 from abc import ABC, abstractmethod
 
+import numpy as np
 import pandas as pd
 
 
@@ -7,3 +9,27 @@ class Filter(ABC):
     @abstractmethod
     def filter(self, data: pd.DataFrame) -> pd.DataFrame:
         pass
+
+
+class StreamingFilter(Filter):
+    """
+    A filter that can also run incrementally, on consecutive (samples x channels) blocks of a signal.
+
+    The filter carries its state (e.g. IIR delay lines) from one block to the next, so filtering a signal
+    block by block gives the same output as filtering it at once. EMGSignal uses that to filter samples
+    online, as they are acquired.
+    """
+
+    @abstractmethod
+    def reset(self):
+        """Forget the state, the next block is the start of a new signal."""
+
+    @abstractmethod
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """Filter the next (samples x channels) block of the signal, returns an array of the same shape."""
+
+    def filter(self, data: pd.DataFrame) -> pd.DataFrame:
+        # A fresh copy, so the batch path doesn't disturb the state of an online stream
+        stream = copy.deepcopy(self)
+        stream.reset()
+        return pd.DataFrame(stream.process(data.to_numpy()), index=data.index, columns=data.columns)
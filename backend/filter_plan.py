@@ -0,0 +1,121 @@
+from functools import partial
+
+import numpy as np
+import pandas as pd
+from scipy import signal
+
+from backend.channel_executor import ChannelExecutor
+from backend.filter import Filter
+from backend.filters.elementwise import ElementwiseFilter
+from backend.filters.iir import IIRFilter
+
+
+class FilterPlan:
+    """
+    A chain of filters compiled into as few passes over the signal as possible.
+
+    - adjacent IIR filters are merged into one cascade of second-order sections (a single sosfilt call),
+    - adjacent elementwise filters are fused: they all run on one cache-sized chunk before moving to the next,
+    - both run in place on a single float32 (channels x samples) buffer, one contiguous row per channel.
+
+    Any other Filter is run through its DataFrame ``filter`` as usual, only those stages copy the signal.
+    IIR and elementwise stages work channel by channel, spread over the workers of a ChannelExecutor.
+    """
+    CHUNK_SAMPLES = 1 << 14  # per channel, a fused elementwise pass works on chunks of this many samples
+    DTYPE = np.float32  # of a filtered signal
+
+    def __init__(self, stages: list):
+        self.stages = stages
+
+    @classmethod
+    def compile(cls, filters: list) -> 'FilterPlan':
+        stages = []
+        for emg_filter in filters:
+            last = stages[-1] if stages else None
+            if isinstance(emg_filter, IIRFilter):
+                if isinstance(last, _SosStage):
+                    last.add(emg_filter)
+                else:
+                    stages.append(_SosStage(emg_filter))
+            elif isinstance(emg_filter, ElementwiseFilter):
+                if isinstance(last, _ElementwiseStage):
+                    last.add(emg_filter)
+                else:
+                    stages.append(_ElementwiseStage(emg_filter, cls.CHUNK_SAMPLES))
+            else:
+                stages.append(_FrameStage(emg_filter))
+        return cls(stages)
+
+    @staticmethod
+    def prepare(data: pd.DataFrame) -> np.ndarray:
+        """The float32 (channels x samples) buffer the plan runs on - the only full copy of the signal."""
+        buffer = np.empty(data.shape[::-1], dtype=FilterPlan.DTYPE)
+        buffer[:] = data.to_numpy().T
+        return buffer
+
+    def run(self, buffer: np.ndarray, columns=None, index=None, executor: ChannelExecutor = None) -> np.ndarray:
+        """Filter a buffer from ``prepare`` in place. Returns the filtered buffer (a new one after a DataFrame stage)."""
+        executor = executor if executor is not None else ChannelExecutor.serial()
+        for stage in self.stages:
+            buffer = stage.run(buffer, columns, index, executor)
+        return buffer
+
+    def filter(self, data: pd.DataFrame, executor: ChannelExecutor = None) -> pd.DataFrame:
+        buffer = self.run(self.prepare(data), data.columns, data.index, executor)
+        return pd.DataFrame(buffer.T, index=data.index, columns=data.columns, copy=False)
+
+    def __repr__(self):
+        return f'{__class__.__name__}({self.stages})'
+
+
+class _SosStage:
+    def __init__(self, iir_filter: IIRFilter):
+        self.filters = [iir_filter]
+
+    def add(self, iir_filter: IIRFilter):
+        self.filters.append(iir_filter)
+
+    def run(self, buffer, columns, index, executor):
+        # Cascading the sections of consecutive filters is exactly applying them one after another
+        sos = np.vstack([iir_filter.sos for iir_filter in self.filters]).astype(buffer.dtype)
+        executor.map_rows(partial(signal.sosfilt, sos), buffer)
+        return buffer
+
+    def __repr__(self):
+        return f'sos({sum(len(iir_filter.sos) for iir_filter in self.filters)} sections)'
+
+
+class _ElementwiseStage:
+    def __init__(self, elementwise_filter: ElementwiseFilter, chunk_samples: int):
+        self.filters = [elementwise_filter]
+        self.chunk_samples = chunk_samples
+
+    def add(self, elementwise_filter: ElementwiseFilter):
+        self.filters.append(elementwise_filter)
+
+    def run(self, buffer, columns, index, executor):
+        executor.map_rows(partial(_apply_fused, self.filters, self.chunk_samples), buffer)
+        return buffer
+
+    def __repr__(self):
+        return f'fused({", ".join(type(f).__name__ for f in self.filters)})'
+
+
+class _FrameStage:
+    def __init__(self, emg_filter: Filter):
+        self.filter = emg_filter
+
+    def run(self, buffer, columns, index, executor):
+        frame = pd.DataFrame(buffer.T, index=index, columns=columns, copy=False)
+        return FilterPlan.prepare(self.filter.filter(frame))
+
+    def __repr__(self):
+        return type(self.filter).__name__
+
+
+def _apply_fused(filters: list, chunk_samples: int, channel: np.ndarray) -> np.ndarray:
+    for start in range(0, len(channel), chunk_samples):
+        chunk = channel[start:start + chunk_samples]
+        for elementwise_filter in filters:
+            elementwise_filter.apply_inplace(chunk)
+    return channel
@@ -0,0 +1,60 @@
+from abc import abstractmethod
+
+import numpy as np
+
+from backend.filter import StreamingFilter
+
+
+class ElementwiseFilter(StreamingFilter):
+    """
+    A stateless filter that maps every sample independently (offset, gain, rectification, ...).
+
+    ``apply_inplace`` overwrites a float array with the result, which lets a FilterPlan fuse consecutive
+    elementwise filters into one pass over the signal without temporary arrays.
+    """
+
+    @abstractmethod
+    def apply_inplace(self, values: np.ndarray):
+        pass
+
+    def reset(self):
+        pass  # nothing to forget
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        values = np.array(block, dtype=np.float64)
+        self.apply_inplace(values)
+        return values
+
+
+class Offset(ElementwiseFilter):
+    """Subtract a constant baseline, e.g. the 120 mid-scale level of the 8-bit band samples."""
+
+    def __init__(self, offset: float):
+        self.offset = offset
+
+    def apply_inplace(self, values: np.ndarray):
+        np.subtract(values, self.offset, out=values, casting='unsafe')
+
+
+class Gain(ElementwiseFilter):
+    def __init__(self, factor: float):
+        self.factor = factor
+
+    def apply_inplace(self, values: np.ndarray):
+        np.multiply(values, self.factor, out=values, casting='unsafe')
+
+
+class Rectify(ElementwiseFilter):
+    """Full-wave rectification, the absolute value of every sample."""
+
+    def apply_inplace(self, values: np.ndarray):
+        np.abs(values, out=values)
+
+
+class Clip(ElementwiseFilter):
+    def __init__(self, low: float = None, high: float = None):
+        self.low = low
+        self.high = high
+
+    def apply_inplace(self, values: np.ndarray):
+        np.clip(values, self.low, self.high, out=values)
@@ -0,0 +1,38 @@
+import numpy as np
+from scipy import signal
+
+from backend.filter import StreamingFilter
+
+
+class IIRFilter(StreamingFilter):
+    """
+    IIR filter given as second-order sections, applied to every channel independently.
+
+    The sosfilt delay lines of every channel are kept between blocks, which makes online filtering
+    exact: the output doesn't depend on how the signal was split into blocks.
+    """
+
+    def __init__(self, sos: np.ndarray):
+        self.sos = np.atleast_2d(np.asarray(sos, dtype=np.float64))
+        self._zi = None
+
+    @classmethod
+    def butterworth(cls, order: int, cutoff, btype: str, sampling_rate: float) -> 'IIRFilter':
+        """Butterworth filter, ``btype`` is one of 'lowpass', 'highpass', 'bandpass', 'bandstop' (cutoff in Hz)."""
+        return cls(signal.butter(order, cutoff, btype=btype, fs=sampling_rate, output='sos'))
+
+    @classmethod
+    def notch(cls, frequency: float, quality: float, sampling_rate: float) -> 'IIRFilter':
+        """Narrow band-stop filter, e.g. for the 50 Hz power line interference."""
+        return cls(signal.tf2sos(*signal.iirnotch(frequency, quality, fs=sampling_rate)))
+
+    def reset(self):
+        self._zi = None
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        block = np.asarray(block, dtype=np.float64)
+        if self._zi is None:
+            # Zero initial conditions, like filtering the whole signal with sosfilt
+            self._zi = np.zeros((len(self.sos), 2) + block.shape[1:])
+        output, self._zi = signal.sosfilt(self.sos, block, axis=0, zi=self._zi)
+        return output
@@ -0,0 +1,116 @@
+import threading
+
+import numpy as np
+
+OVERFLOW_POLICIES = ('drop_newest', 'drop_oldest', 'block')
+
+
+class RingBuffer:
+    """
+    Fixed-capacity single-producer/single-consumer ring buffer of (samples x channels) numpy rows.
+
+    One thread writes and one thread reads, without locks: the producer only advances ``written``
+    and the consumer only advances ``read``, both are monotonic sample counts and a slot is only
+    published (``written`` moved past it) once its data is copied in. Blocks go in and out as whole arrays,
+    there is no Python object per sample.
+
+    When the consumer falls behind and a write doesn't fit, the overflow policy decides:
+      - ``drop_newest``: keep what's buffered, drop the samples that don't fit
+      - ``drop_oldest``: overwrite the oldest unread samples, the consumer skips them
+      - ``block``: wait (up to ``block_timeout`` seconds) for the consumer, then drop the newest
+    Every lost sample is counted in ``dropped_samples``, every write that lost some in ``overflows``.
+    """
+
+    def __init__(self, capacity: int, channels: int, dtype=np.float64, overflow: str = 'drop_newest',
+                 block_timeout: float = 1.0):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f'Unknown overflow policy: {overflow}, expected one of {OVERFLOW_POLICIES}')
+
+        self.capacity = capacity
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+
+        self._data = np.empty((capacity, channels), dtype=self.dtype)
+        self.written = 0
+        self.read = 0
+        self._reserved = 0  # written + the samples being copied in right now
+
+        self.dropped_samples = 0
+        self.overflows = 0
+        self._space = threading.Event()
+
+    def __len__(self) -> int:
+        """Samples available to the consumer."""
+        return min(self.written - self.read, self.capacity)
+
+    def free(self) -> int:
+        return self.capacity - len(self)
+
+    # Producer side
+
+    def write(self, samples: np.ndarray) -> int:
+        """Append a (samples x channels) block, returns how many samples made it into the buffer."""
+        samples = np.asarray(samples).reshape(-1, self.channels)
+        count = len(samples)
+
+        if self.overflow == 'drop_oldest':
+            free = self.free()
+            if count > free:
+                # Unread samples that get overwritten, and new ones that don't fit at all
+                self._dropped(count - free)
+                samples = samples[-self.capacity:]
+        else:
+            if self.overflow == 'block':
+                self._wait_for_space(count)
+            free = self.free()
+            if count > free:
+                self._dropped(count - free)
+                samples = samples[:free]
+
+        self._reserved = self.written + len(samples)
+        self._copy_in(self.written, samples)
+        self.written = self._reserved
+        return len(samples)
+
+    def _copy_in(self, position: int, samples: np.ndarray):
+        start = position % self.capacity
+        first = min(len(samples), self.capacity - start)
+        self._data[start:start + first] = samples[:first]
+        self._data[:len(samples) - first] = samples[first:]
+
+    def _wait_for_space(self, count: int):
+        needed = min(count, self.capacity)
+        while self.free() < needed:
+            self._space.clear()
+            # The consumer may have read in between, check again before sleeping
+            if self.free() >= needed or not self._space.wait(self.block_timeout):
+                return
+
+    def _dropped(self, count: int):
+        self.dropped_samples += count
+        self.overflows += 1
+
+    # Consumer side
+
+    def read_block(self, max_samples: int = None) -> np.ndarray:
+        """Remove and return up to ``max_samples`` (by default all) of the oldest samples as a new array."""
+        written = self.written
+        read = max(self.read, written - self.capacity)  # drop_oldest may have overwritten unread samples
+        count = written - read if max_samples is None else min(written - read, max_samples)
+
+        start = read % self.capacity
+        first = min(count, self.capacity - start)
+        block = np.concatenate([self._data[start:start + first], self._data[:count - first]])
+
+        # With drop_oldest the producer may have overwritten part of the block while it was copied
+        overwritten = self._reserved - self.capacity - read
+        if overwritten > 0:
+            block = block[overwritten:]
+            read += overwritten
+            count -= overwritten
+
+        self.read = read + count
+        self._space.set()
+        return block
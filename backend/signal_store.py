@@ -0,0 +1,111 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+class SignalStore:
+    """
+    Growable columnar storage of a multichannel signal.
+
+    Samples live in one (channels x capacity) numpy array, so every channel is contiguous in memory.
+    When an append doesn't fit, the capacity doubles - appending n samples costs O(n) amortized,
+    instead of copying the whole recording on every append like pd.concat does.
+
+    ``version`` changes on every modification, so readers can cache anything derived from the data
+    (e.g. the DataFrame of EMGSignal) and only rebuild it when it's outdated.
+
+    With ``spill_bytes`` the storage moves to a memory-mapped temporary file (in ``spill_folder``) once it
+    would take more than that many bytes of RAM. It's still one (channels x capacity) array, so readers don't
+    notice, but the samples live in the page cache - the OS writes them out and drops them from memory
+    as needed, a recording of any length runs with a bounded footprint. The file is unlinked right away,
+    it disappears with the store.
+    """
+    MIN_CAPACITY = 1024
+
+    def __init__(self, channels: int, dtype=np.float64, capacity: int = MIN_CAPACITY, columns=None,
+                 spill_bytes: int = None, spill_folder=None):
+        self.spill_bytes = spill_bytes
+        self.spill_folder = spill_folder
+        self._data = self._allocate(channels, max(capacity, 1), np.dtype(dtype))
+        self._length = 0
+        self.columns = pd.Index(columns) if columns is not None else pd.RangeIndex(channels)
+        self.version = 0
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, **options) -> 'SignalStore':
+        """Store of a copy of the frame, ``options`` are the spilling ones of the constructor."""
+        values = frame.to_numpy()
+        store = cls(values.shape[1], values.dtype, max(len(values), cls.MIN_CAPACITY), frame.columns, **options)
+        store.append(values)
+        return store
+
+    @classmethod
+    def from_array(cls, values: np.ndarray, columns=None) -> 'SignalStore':
+        """Store adopting a (channels x samples) array, without copying it."""
+        store = cls(values.shape[0], values.dtype, capacity=1, columns=columns)
+        store._data = values
+        store._length = values.shape[1]
+        store.version += 1
+        return store
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def channels(self) -> int:
+        return self._data.shape[0]
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._data.dtype
+
+    @property
+    def capacity(self) -> int:
+        return self._data.shape[1]
+
+    @property
+    def spilled(self) -> bool:
+        """Whether the samples are in a memory-mapped file rather than in RAM."""
+        return isinstance(self._data, np.memmap)
+
+    def append(self, samples: np.ndarray):
+        """Append a (samples x channels) block."""
+        samples = np.asarray(samples)
+        if samples.ndim != 2 or samples.shape[1] != self.channels:
+            raise ValueError(f'Expected a (samples x {self.channels}) block, got {samples.shape}')
+
+        dtype = np.result_type(self.dtype, samples.dtype)
+        end = self._length + len(samples)
+        if end > self.capacity or dtype != self.dtype:
+            self._reallocate(max(end, self.capacity * 2 if end > self.capacity else self.capacity), dtype)
+
+        self._data[:, self._length:end] = samples.T
+        self._length = end
+        self.version += 1
+
+    def _reallocate(self, capacity: int, dtype):
+        data = self._allocate(self.channels, capacity, np.dtype(dtype))
+        data[:, :self._length] = self._data[:, :self._length]
+        self._data = data
+
+    def _allocate(self, channels: int, capacity: int, dtype: np.dtype) -> np.ndarray:
+        if self.spill_bytes is None or channels * capacity * dtype.itemsize <= self.spill_bytes:
+            return np.empty((channels, capacity), dtype=dtype)
+
+        descriptor, path = tempfile.mkstemp(prefix='emg-signal-', suffix='.bin', dir=self.spill_folder)
+        try:
+            # A sparse file, the unused capacity takes no disk space
+            return np.memmap(path, dtype=dtype, mode='w+', shape=(channels, capacity))
+        finally:
+            os.close(descriptor)
+            os.unlink(path)  # the mapping stays valid, the space is freed when it's closed
+
+    def values(self) -> np.ndarray:
+        """(samples x channels) view of the stored samples, without copying them."""
+        return self._data[:, :self._length].T
+
+    def to_frame(self, index: pd.Index = None) -> pd.DataFrame:
+        """DataFrame backed by the store memory (no copy). Later appends never touch the rows it covers."""
+        return pd.DataFrame(self.values(), index=index, columns=self.columns, copy=False)
@@ -0,0 +1,90 @@
+import time
+
+import numpy as np
+
+SLOW_CONSUMER_POLICIES = ('drop_oldest', 'skip_to_latest', 'block')
+
+
+class Subscription:
+    """
+    One consumer of an EMGSignal (UI plot, dataset writer, online classifier, ...) with its own cursor.
+
+    All subscriptions read the same append-only sample store, so a consumer never takes samples away from
+    another one or from ``EMGSignal.signal``. Every read returns everything published since the previous one
+    as a single (samples x channels) view - delivery is batched, the cost per subscriber doesn't depend on
+    the sample rate.
+
+    A consumer that falls more than ``max_lag`` samples behind is handled according to ``policy``:
+      - ``drop_oldest``: skip the oldest samples, keep reading the newest ``max_lag`` ones
+      - ``skip_to_latest``: skip the whole backlog, continue with the most recently published batch
+      - ``block``: make the publisher wait (up to ``block_timeout``) until this consumer catches up
+    With the default ``max_lag=None`` nothing is ever skipped.
+    """
+
+    def __init__(self, emg_signal, name: str = None, policy: str = 'drop_oldest', max_lag: int = None,
+                 max_batch: int = None, from_start: bool = False, block_timeout: float = 1.0):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f'Unknown slow consumer policy: {policy}, expected one of {SLOW_CONSUMER_POLICIES}')
+
+        self.name = name
+        self.policy = policy
+        self.max_lag = max_lag
+        self.max_batch = max_batch
+        self.block_timeout = block_timeout
+        self._signal = emg_signal
+        self.cursor = 0 if from_start else emg_signal.published_samples()
+
+        self.delivered_samples = 0
+        self.skipped_samples = 0
+        self.closed = False
+
+    def lag(self) -> int:
+        return self._signal.published_samples() - self.cursor
+
+    def poll(self) -> np.ndarray:
+        """Samples published since the previous read, without waiting (possibly an empty array)."""
+        self._signal.publish()
+        with self._signal._published:
+            return self._take()
+
+    def get(self, timeout: float = None) -> np.ndarray:
+        """Wait until there are new samples (or ``timeout`` seconds pass) and return them."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            self._signal.publish()
+            with self._signal._published:
+                if self.lag() > 0 or self.closed:
+                    return self._take()
+                remaining = deadline - time.monotonic() if deadline is not None else self._signal.STREAM_POLL_INTERVAL
+                if remaining <= 0:
+                    return self._take()
+                # Also wakes up regularly to publish by itself, when nobody else does
+                self._signal._published.wait(min(remaining, self._signal.STREAM_POLL_INTERVAL))
+
+    def close(self):
+        self._signal.unsubscribe(self)
+
+    def _take(self) -> np.ndarray:
+        # Called with the signal's _published condition held
+        end = self._signal.published_samples()
+        lag = end - self.cursor
+
+        if self.max_lag is not None and lag > self.max_lag and self.policy != 'block':
+            if self.policy == 'drop_oldest':
+                skip_to = end - self.max_lag
+            else:
+                skip_to = max(self.cursor, self._signal._last_batch_start)
+            self.skipped_samples += skip_to - self.cursor
+            self.cursor = skip_to
+
+        stop = end if self.max_batch is None else min(end, self.cursor + self.max_batch)
+        batch = self._signal._published_values(self.cursor, stop)
+        self.cursor = stop
+        self.delivered_samples += len(batch)
+
+        if self.policy == 'block':
+            self._signal._published.notify_all()  # the publisher may wait for this consumer
+        return batch
+
+    def _must_block(self, incoming: int) -> bool:
+        return self.policy == 'block' and self.max_lag is not None and self.lag() + incoming > self.max_lag
@@ -0,0 +1,22 @@
+import numpy as np
+
+
+def sliding_windows(values: np.ndarray, size: int, hop: int) -> np.ndarray:
+    """
+    Overlapping windows of a (samples x channels) array as a read-only (windows x size x channels) view.
+
+    Window i covers samples [i * hop, i * hop + size). Nothing is copied, the windows are strides over
+    ``values`` - write into a copy if a window has to be modified. Trailing samples that don't fill
+    a whole window are left out.
+    """
+    if size <= 0 or hop <= 0:
+        raise ValueError(f'Window size and hop must be positive, got {size} and {hop}')
+
+    count = (len(values) - size) // hop + 1 if len(values) >= size else 0
+    return np.lib.stride_tricks.as_strided(values, shape=(count, size) + values.shape[1:],
+                                           strides=(values.strides[0] * hop,) + values.strides, writeable=False)
+
+
+def window_length(seconds: float, sampling_rate: float) -> int:
+    """Number of samples in ``seconds`` of a signal sampled at ``sampling_rate``, e.g. for 200 ms windows."""
+    return max(int(round(seconds * sampling_rate)), 1)
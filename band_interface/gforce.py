@@ -1,11 +1,15 @@
 # !/usr/bin/python
 # -*- coding:utf-8 -*-
 
+import concurrent.futures
+import heapq
+import itertools
 import queue
+import selectors
+import socket
 import struct
 import threading
 import time
-from datetime import datetime, timedelta
 from enum import Enum
 
 from bluepy import btle
@@ -109,7 +113,7 @@ CommandType = dict(
 
     CMD_SET_DATA_NOTIF_SWITCH=0x4F,
     # Partial command packet, format: [CMD_PARTIAL_DATA, packet number in reverse order, packet content]
-    MD_PARTIAL_DATA=0xFF
+    CMD_PARTIAL_DATA=0xFF
 )
 
 # Response from remote device
@@ -223,22 +227,311 @@ class CommandCallbackTableEntry:
         self._cmd = _cmd
         self._timeoutTime = _timeoutTime
         self._cb = _cb
+        self._timeoutHandle = None
 
 
-class MyDelegate(btle.DefaultDelegate):
+class TimeoutScheduler:
+    """
+    Fires command timeouts from a single long-lived thread instead of one threading.Timer per refresh.
+
+    Pending timeouts live in a min-heap ordered by deadline, so schedule() is O(log n).
+    cancel() only marks the entry; cancelled entries are popped lazily (amortized O(log n))
+    and the heap is compacted when they make up most of it.
+    The thread is started by the first schedule() and ends with shutdown(), a later schedule() starts a new one.
+    """
+
+    # Heap entry layout: [deadline, sequence, callback, args]
+    _CALLBACK = 2
+
+    def __init__(self):
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._cancelled = 0
+        self._thread = None
+
+    def schedule(self, delay, callback, *args):
+        entry = [time.monotonic() + delay, next(self._sequence), callback, args]
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            heapq.heappush(self._heap, entry)
+            if self._heap[0] is entry:
+                # New earliest deadline, the thread has to shorten its wait
+                self._condition.notify()
+        return entry
+
+    def cancel(self, entry):
+        with self._condition:
+            if entry[self._CALLBACK] is None:
+                return
+            entry[self._CALLBACK] = None
+            self._cancelled += 1
+            if self._cancelled > 64 and self._cancelled > len(self._heap) // 2:
+                self._heap = [e for e in self._heap if e[self._CALLBACK] is not None]
+                heapq.heapify(self._heap)
+                self._cancelled = 0
+
+    def __len__(self):
+        return len(self._heap) - self._cancelled
+
+    def shutdown(self):
+        """Drop the pending timeouts and wait for the thread to exit."""
+        with self._condition:
+            thread, self._thread = self._thread, None
+            self._heap = []
+            self._cancelled = 0
+            self._condition.notify()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if self._thread is not threading.current_thread():
+                        return  # shut down
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+                    entry = self._heap[0]
+                    if entry[self._CALLBACK] is None:
+                        heapq.heappop(self._heap)
+                        self._cancelled -= 1
+                        continue
+                    delay = entry[0] - time.monotonic()
+                    if delay > 0:
+                        self._condition.wait(delay)
+                        continue
+                    heapq.heappop(self._heap)
+                    callback, args = entry[self._CALLBACK], entry[3]
+                    entry[self._CALLBACK] = None
+                    break
+
+            # Run outside of the lock, so callbacks can schedule further timeouts
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"Timeout callback failed: {e}")
+
+
+class PacketReassembler:
+    """
+    Reassembles partial packets ([PARTIAL_DATA, packet number in reverse order, packet content])
+    into a preallocated buffer, so no intermediate lists are built per fragment.
+
+    The completed packet is handed out as a read-only memoryview over the internal buffer.
+    It stays valid only until the next fragment is fed - copy it if it has to outlive the callback.
+    """
+
+    def __init__(self, capacity=512):
+        self._buffer = bytearray(capacity)
+        self._view = memoryview(self._buffer)
+        self._length = 0
+        # Packet number expected in the next fragment, None when no packet is in progress
+        self._expectedId = None
+        self._discarding = False
+
+        self.completedPackets = 0
+        self.droppedPackets = 0
+        self.outOfOrderFragments = 0
+        self.lostFragments = 0
+
+    def feed(self, data):
+        """Consume one partial fragment, return the full packet once its last fragment arrived."""
+        packetId = data[1]
+
+        if self._expectedId is not None and packetId != self._expectedId:
+            if packetId < self._expectedId:
+                # Fragments in between never arrived, the packet can't be trusted anymore
+                self.lostFragments += self._expectedId - packetId
+                self._dropPacket()
+                self._discarding = True
+            else:
+                # A new packet started before the previous one was finished
+                self.outOfOrderFragments += 1
+                self.lostFragments += self._expectedId + 1
+                self._dropPacket()
+
+        if self._expectedId is None:
+            self._length = 0
+
+        if not self._discarding:
+            self._append(data, 2)
+
+        if packetId == 0:
+            self._expectedId = None
+            if self._discarding:
+                self._discarding = False
+                return None
+            self.completedPackets += 1
+            return self._view[: self._length].toreadonly()
+
+        self._expectedId = packetId - 1
+        return None
+
+    def reset(self):
+        self._length = 0
+        self._expectedId = None
+        self._discarding = False
+
+    def _dropPacket(self):
+        if not self._discarding:
+            self.droppedPackets += 1
+        self._length = 0
+        self._expectedId = None
+        self._discarding = False
+
+    def _append(self, data, offset):
+        end = self._length + len(data) - offset
+        if end > len(self._buffer):
+            # Grow rarely (packets are bounded by the MTU), never shrink
+            newBuffer = bytearray(max(end, 2 * len(self._buffer)))
+            newBuffer[: self._length] = self._view[: self._length]
+            self._buffer = newBuffer
+            self._view = memoryview(newBuffer)
+        self._view[self._length : end] = data[offset:]
+        self._length = end
+
+
+class BluetoothIoLoop:
+    """
+    Runs all bluepy I/O on one thread (bluepy is not thread-safe).
+
+    The thread sleeps in select() on the bluepy helper output and on a wakeup socket,
+    so it reacts at once both to incoming notifications and to newly queued commands.
+    Every pending command is written on each wakeup, not one per loop pass.
+    Other writes to the device (e.g. enabling notifications) are handed to the thread with call().
+    """
+
+    # Used only when the peripheral exposes nothing to select() on
+    POLL_INTERVAL = 0.05
+
     def __init__(self, gforce):
-        super().__init__()
         self.gforce = gforce
-        self.bluepy_thread = threading.Thread(target=self.bluepy_handler)
-        self.bluepy_thread.setDaemon(True)
-        self.bluepy_thread.start()
+        self._stopEvent = threading.Event()
+        self._wakeupReader, self._wakeupWriter = socket.socketpair()
+        self._wakeupReader.setblocking(False)
+        self._wakeupWriter.setblocking(False)
+        self._calls = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def wakeup(self):
+        try:
+            self._wakeupWriter.send(b"\x00")
+        except (BlockingIOError, OSError):
+            pass  # a wakeup is already pending or the loop is closed
+
+    def stop(self, timeout=2.0):
+        self._stopEvent.set()
+        self.wakeup()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._wakeupReader.close()
+        self._wakeupWriter.close()
+
+    def isRunning(self):
+        return self._thread.is_alive() and not self._stopEvent.is_set()
+
+    def call(self, function, *args):
+        """Run function(*args) on the I/O thread, wait for it and return its result (or raise its exception)."""
+        if self._thread is threading.current_thread() or not self.isRunning():
+            return function(*args)
+
+        future = concurrent.futures.Future()
+        self._calls.put((future, function, args))
+        self.wakeup()
+        while True:
+            try:
+                return future.result(self.POLL_INTERVAL)
+            except concurrent.futures.TimeoutError:
+                if not self._thread.is_alive():
+                    self._cancelCalls()  # stopped before it got to the call
+
+    def _run(self):
+        device = self.gforce.device
+        notifSource = self._notificationSource(device)
+
+        selector = selectors.DefaultSelector()
+        selector.register(self._wakeupReader, selectors.EVENT_READ)
+        if notifSource is not None:
+            selector.register(notifSource, selectors.EVENT_READ)
 
-    def bluepy_handler(self):
+        try:
+            while not self._stopEvent.is_set():
+                self._flushSendQueue()
+                self._runCalls()
+
+                if notifSource is None:
+                    device.waitForNotifications(self.POLL_INTERVAL)
+                    continue
+
+                for key, _ in selector.select():
+                    if key.fileobj is self._wakeupReader:
+                        self._clearWakeup()
+                    elif not self._stopEvent.is_set():
+                        # Data is ready, so this reads a single notification without blocking
+                        device.waitForNotifications(self.POLL_INTERVAL)
+        except (btle.BTLEException, OSError, ValueError) as e:
+            if not self._stopEvent.is_set():
+                print(f"Bluetooth I/O loop stopped: {e}")
+        finally:
+            selector.close()
+            self._cancelCalls()
+
+    def _flushSendQueue(self):
         while True:
-            if not self.gforce.send_queue.empty():
+            try:
                 cmd = self.gforce.send_queue.get_nowait()
-                self.gforce.cmdCharacteristic.write(cmd)
-            self.gforce.device.waitForNotifications(1)
+            except queue.Empty:
+                return
+            self.gforce.cmdCharacteristic.write(cmd)
+
+    def _runCalls(self):
+        while True:
+            try:
+                future, function, args = self._calls.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                future.set_result(function(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+    def _cancelCalls(self):
+        while True:
+            try:
+                future, _, _ = self._calls.get_nowait()
+            except queue.Empty:
+                return
+            future.set_exception(RuntimeError("Bluetooth I/O loop stopped"))
+
+    def _clearWakeup(self):
+        try:
+            while self._wakeupReader.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    @staticmethod
+    def _notificationSource(device):
+        # bluepy talks to its helper process over a pipe, notifications arrive on its stdout
+        helper = getattr(device, "_helper", None)
+        if helper is not None and helper.stdout is not None:
+            return helper.stdout
+        if hasattr(device, "fileno"):
+            return device
+        return None
+
+
+class MyDelegate(btle.DefaultDelegate):
+    def __init__(self, gforce):
+        super().__init__()
+        self.gforce = gforce
 
     def handleNotification(self, cHandle, data):
         # check cHandle
@@ -253,22 +546,20 @@ class MyDelegate(btle.DefaultDelegate):
 
 
 class GForceProfile:
-    def __init__(self):
-        self.device = Peripheral()
+    def __init__(self, device=None):
+        self.device = device if device is not None else Peripheral()
         self.state = BluetoothDeviceState.disconnected
         self.cmdCharacteristic = None
         self.notifyCharacteristic = None
-        self.timer = None
         self.cmdMap = {}
+        self.timeoutScheduler = TimeoutScheduler()
         self.mtu = None
-        self.cmdForTimeout = -1
-        self.incompleteCmdRespPacket = []
-        self.lastIncompleteCmdRespPacketId = 0
-        self.incompleteNotifPacket = []
-        self.lastIncompleteNotifPacketId = 0
+        self.cmdRespReassembler = PacketReassembler()
+        self.notifReassembler = PacketReassembler()
         self.onData = None
         self.lock = threading.Lock()
         self.send_queue = queue.Queue(maxsize=20)
+        self.ioLoop = None
 
     def getCharacteristic(self, device, uuid):
         ches = device.getCharacteristics()
@@ -302,7 +593,7 @@ class GForceProfile:
         self.setNotify(self.cmdCharacteristic, True)
 
         # Open the listening thread
-        self.device.setDelegate(MyDelegate(self))
+        self._startIoLoop()
 
     # Connect the bracelet with the strongest signal
 
@@ -344,7 +635,7 @@ class GForceProfile:
         self.setNotify(self.cmdCharacteristic, True)
 
         # Open the listening thread
-        self.device.setDelegate(MyDelegate(self))
+        self._startIoLoop()
 
     # Enable a characteristic's notification
     def setNotify(self, Chara, swich):
@@ -354,7 +645,11 @@ class GForceProfile:
             setup_data = b"\x00\x00"
 
         setup_handle = Chara.getHandle() + 1
-        self.device.writeCharacteristic(setup_handle, setup_data, withResponse=False)
+        # bluepy is not thread-safe, once the I/O loop runs only its thread writes to the device
+        if self.ioLoop is not None:
+            self.ioLoop.call(lambda: self.device.writeCharacteristic(setup_handle, setup_data, withResponse=False))
+        else:
+            self.device.writeCharacteristic(setup_handle, setup_data, withResponse=False)
 
     def scan(self, timeout):
         scanner = Scanner()
@@ -377,18 +672,32 @@ class GForceProfile:
                     i += 1
         return gforce_scan
 
+    def _startIoLoop(self):
+        if self.ioLoop is not None:
+            self.ioLoop.stop()
+        self.device.setDelegate(MyDelegate(self))
+        self.ioLoop = BluetoothIoLoop(self)
+        self.ioLoop.start()
+
     # Disconnect from device
     def disconnect(self):
-        if self.timer != None:
-            self.timer.cancel()
-        self.timer = None
-        # Close the listenThread
+        # Pending commands will never be answered
+        with self.lock:
+            for entry in self.cmdMap.values():
+                self.timeoutScheduler.cancel(entry._timeoutHandle)
+            self.cmdMap.clear()
+        self.timeoutScheduler.shutdown()
+
+        # Close the listenThread before the helper goes away
+        if self.ioLoop is not None:
+            self.ioLoop.stop()
+            self.ioLoop = None
 
         if self.state == BluetoothDeviceState.disconnected:
             return True
         else:
             self.device.disconnect()
-            self.state == BluetoothDeviceState.disconnected
+            self.state = BluetoothDeviceState.disconnected
 
     # Set data notification flag
     def setDataNotifSwitch(self, flags, cb, timeout):
@@ -537,7 +846,9 @@ class GForceProfile:
                     sampRate, channelMask, dataLen, resolution = struct.unpack_from(
                         "@HHBB", respData
                     )
-                cb(resp, sampRate, channelMask, dataLen, resolution)
+                    cb(resp, sampRate, channelMask, dataLen, resolution)
+                else:
+                    cb(ResponseResult["RSP_CODE_FAILED"], None, None, None, None)
 
         return self.sendCommand(
             ProfileCharType.PROF_DATA_CMD, data, True, temp, timeout
@@ -556,6 +867,8 @@ class GForceProfile:
                 elif len(respData) == 4:
                     featureMap = struct.unpack("@I", respData)[0]
                     cb(resp, featureMap)
+                else:
+                    cb(ResponseResult["RSP_CODE_FAILED"], None)
 
         return self.sendCommand(
             ProfileCharType.PROF_DATA_CMD, data, True, temp, timeout
@@ -595,10 +908,13 @@ class GForceProfile:
             if cmd in self.cmdMap.keys():
                 self.lock.release()
                 return GF_RET_CODE.GF_ERROR_DEVICE_BUSY
-            self.cmdMap[cmd] = CommandCallbackTableEntry(
-                cmd, datetime.now() + timedelta(milliseconds=timeout), cb
+            entry = CommandCallbackTableEntry(
+                cmd, time.monotonic() + timeout / 1000, cb
+            )
+            entry._timeoutHandle = self.timeoutScheduler.schedule(
+                timeout / 1000, self._onTimeOut, cmd, entry
             )
-            self._refreshTimer()
+            self.cmdMap[cmd] = entry
             self.lock.release()
 
         if profileCharType == ProfileCharType.PROF_DATA_CMD:
@@ -609,73 +925,26 @@ class GForceProfile:
                     contentLen = self.mtu - 2
                     packetCount = (len(data) + contentLen - 1) // contentLen
                     startIndex = 0
-                    buf = []
 
                     for i in range(packetCount - 1, 0, -1):
-                        buf.append(CommandType["CMD_PARTIAL_DATA"])
-                        buf.append(i)
+                        buf = bytes([CommandType["CMD_PARTIAL_DATA"], i])
                         buf += data[startIndex : startIndex + contentLen]
                         startIndex += contentLen
                         self.send_queue.put_nowait(buf)
-                        buf.clear()
                     # Packet end
-                    buf.append(CommandType["CMD_PARTIAL_DATA"])
-                    buf.append(0)
+                    buf = bytes([CommandType["CMD_PARTIAL_DATA"], 0])
                     buf += data[startIndex:]
                     self.send_queue.put_nowait(buf)
                 else:
                     self.send_queue.put_nowait(data)
 
+                if self.ioLoop is not None:
+                    self.ioLoop.wakeup()
+
                 return GF_RET_CODE.GF_SUCCESS
         else:
             return GF_RET_CODE.GF_ERROR_BAD_PARAM
 
-    # Refresh time,need external self.lock
-    def _refreshTimer(self):
-        def cmp_time(cb):
-            return cb._timeoutTime
-
-        if self.timer != None:
-            self.timer.cancel()
-
-        self.timer = None
-        cmdlist = self.cmdMap.values()
-
-        if len(cmdlist) > 0:
-            cmdlist = sorted(cmdlist, key=cmp_time)
-
-        # Process timeout entries
-        timeoutTime = None
-        listlen = len(cmdlist)
-
-        for i in range(listlen):
-            timeoutTime = cmdlist[0]._timeoutTime
-            print("_" * 40)
-            print("system time : ", datetime.now())
-            print("timeout time: ", timeoutTime)
-            print(
-                "\ncmd: {0}, timeout: {1}".format(
-                    hex(cmdlist[0]._cmd), timeoutTime < datetime.now()
-                )
-            )
-            print("_" * 40)
-
-            if timeoutTime > datetime.now():
-                self.cmdForTimeout = cmdlist[0]._cmd
-                ms = int((timeoutTime.timestamp() - datetime.now().timestamp()) * 1000)
-
-                if ms <= 0:
-                    ms = 1
-                self.timer = threading.Timer(ms / 1000, self._onTimeOut)
-                self.timer.start()
-
-                break
-
-            cmd = cmdlist.pop(0)
-
-            if cmd._cb != None:
-                cmd._cb(ResponseResult["RSP_CODE_TIMEOUT"], None)
-
     def startDataNotification(self, onData):
         self.onData = onData
 
@@ -703,69 +972,27 @@ class GForceProfile:
             return GF_RET_CODE.GF_ERROR_BAD_STATE
 
     def handleDataNotification(self, data, onData):
-        fullPacket = []
+        fullPacket = None
 
         if len(data) >= 2:
             if data[0] == NotifDataType["NTF_PARTIAL_DATA"]:
-                if (
-                    self.lastIncompleteNotifPacketId != 0
-                    and self.lastIncompleteNotifPacketId != data[1] + 1
-                ):
-                    print(
-                        "Error:lastIncompleteNotifPacketId:{0},current packet id:{1}".format(
-                            self.lastIncompleteNotifPacketId, data[1]
-                        )
-                    )
-                    # How to do with packet loss?
-                    # Must validate packet len in onData callback!
-
-                if (
-                    self.lastIncompleteNotifPacketId == 0
-                    or self.lastIncompleteNotifPacketId > data[1]
-                ):
-                    # Only accept packet with smaller packet num
-                    self.lastIncompleteNotifPacketId = data[1]
-                    self.incompleteNotifPacket += data[2:]
-
-                    if self.lastIncompleteNotifPacketId == 0:
-                        fullPacket = self.incompleteNotifPacket
-                        self.incompleteNotifPacket = []
-
+                # Lost fragments are counted by the reassembler and the broken packet is dropped
+                fullPacket = self.notifReassembler.feed(data)
             else:
                 fullPacket = data
 
-        if len(fullPacket) > 0:
+        if fullPacket is not None and len(fullPacket) > 0:
             onData(fullPacket)
 
     # Command notification callback
     def _onResponse(self, data):
         print("_onResponse: data=", data)
 
-        fullPacket = []
+        fullPacket = None
 
         if len(data) >= 2:
             if data[0] == ResponseResult["RSP_CODE_PARTIAL_PACKET"]:
-                if (
-                    self.lastIncompleteCmdRespPacketId != 0
-                    and self.lastIncompleteCmdRespPacketId != data[1] + 1
-                ):
-                    print(
-                        "Error: _lastIncompletePacketId:{0}, current packet id:{1}".format(
-                            self.lastIncompleteCmdRespPacketId, data[1]
-                        )
-                    )
-
-                if (
-                    self.lastIncompleteCmdRespPacketId == 0
-                    or self.lastIncompleteCmdRespPacketId > data[1]
-                ):
-                    self.lastIncompleteCmdRespPacketId = data[1]
-                    self.incompleteCmdRespPacket += data[2:]
-                    print("_incompleteCmdRespPacket 等于 ", self.incompleteCmdRespPacket)
-
-                    if self.lastIncompleteCmdRespPacketId == 0:
-                        fullPacket = self.incompleteCmdRespPacket
-                        self.incompleteCmdRespPacket = []
+                fullPacket = self.cmdRespReassembler.feed(data)
             else:
                 fullPacket = data
 
@@ -773,40 +1000,34 @@ class GForceProfile:
             resp = fullPacket[0]
             cmd = fullPacket[1]
 
-            # Delete command callback table entry & refresh timer's timeout
+            # Delete command callback table entry & cancel its timeout
+            cb = None
 
             self.lock.acquire()
 
             if cmd > 0 and self.cmdMap.__contains__(cmd):
-                cb = self.cmdMap[cmd]._cb
-
-                del self.cmdMap[cmd]
-
-                self._refreshTimer()
-
-                if cb != None:
-                    cb(resp, fullPacket[2:])
+                entry = self.cmdMap.pop(cmd)
+                self.timeoutScheduler.cancel(entry._timeoutHandle)
+                cb = entry._cb
 
             self.lock.release()
 
-    # Timeout callback function
-    def _onTimeOut(self):
-        print(
-            "_onTimeOut: _cmdForTimeout={0}, time={1}".format(
-                self.cmdForTimeout, datetime.now()
-            )
-        )
+            # Called outside of the lock, so the callback is free to send the next command
+            if cb != None:
+                # Responses are rare, hand out an owned copy instead of the reassembly view
+                cb(resp, bytes(fullPacket[2:]))
 
-        # Delete command callback table entry & refresh timer's timeout
+    # Timeout callback function, runs on the timeout scheduler thread
+    def _onTimeOut(self, cmd, entry):
+        print("_onTimeOut: cmd={0}".format(hex(cmd)))
 
+        # Delete command callback table entry, unless it was answered in the meantime
         cb = None
         self.lock.acquire()
 
-        if self.cmdForTimeout > 0 and self.cmdMap.__contains__(self.cmdForTimeout):
-            cb = self.cmdMap[self.cmdForTimeout]._cb
-            del self.cmdMap[self.cmdForTimeout]
-
-        self._refreshTimer()
+        if self.cmdMap.get(cmd) is entry:
+            cb = entry._cb
+            del self.cmdMap[cmd]
 
         self.lock.release()
 
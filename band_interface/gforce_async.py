@@ -0,0 +1,108 @@
+import asyncio
+
+from band_interface.gforce import CommandType, GF_RET_CODE, GForceProfile, ResponseResult
+
+
+class GForceCommandError(Exception):
+    """Raised when the band rejects a command, does not answer in time or the command can't be sent."""
+
+    def __init__(self, command: int, resp):
+        self.command = command
+        self.resp = resp
+        super().__init__(f'Command {hex(command)} failed with {resp}')
+
+
+class AsyncGForceProfile:
+    """
+    An asyncio facade over GForceProfile, where every command returns an awaitable result.
+
+    Commands with different ids are pipelined: they are all written to the band at once and their
+    responses are matched by id, so e.g. interrogating the device takes one round-trip of wall time.
+    The band can only have one command of each id in flight, so a second call with the same id waits
+    for the first one instead of failing with GF_ERROR_DEVICE_BUSY.
+    """
+    DEFAULT_TIMEOUT = 1000  # ms
+
+    def __init__(self, gforce: GForceProfile, timeout: int = DEFAULT_TIMEOUT):
+        self.gforce = gforce
+        self.timeout = timeout
+        self._command_locks = {}
+
+    async def get_firmware_version(self) -> str:
+        return await self._call('CMD_GET_FW_REVISION', self.gforce.getControllerFirmwareVersion)
+
+    async def get_feature_map(self) -> int:
+        return await self._call('CMD_GET_FEATURE_MAP', self.gforce.getFeatureMap)
+
+    async def get_emg_raw_data_config(self) -> dict:
+        sampling_rate, channel_mask, data_length, resolution = await self._call(
+            'CMD_GET_EMG_RAWDATA_CONFIG', self.gforce.getEmgRawDataConfig)
+        return {'sampling_rate': sampling_rate, 'channel_mask': channel_mask, 'channels': data_length,
+                'resolution': resolution}
+
+    async def set_emg_raw_data_config(self, sampling_rate: int, channel_mask: int, data_length: int, resolution: int):
+        await self._call('CMD_SET_EMG_RAWDATA_CONFIG', self.gforce.setEmgRawDataConfig,
+                         sampling_rate, channel_mask, data_length, resolution)
+
+    async def set_data_notif_switch(self, flags: int):
+        await self._call('CMD_SET_DATA_NOTIF_SWITCH', self.gforce.setDataNotifSwitch, flags)
+
+    async def set_led(self, on: bool):
+        await self._call('CMD_LED_CONTROL_TEST', self.gforce.setLED, on)
+
+    async def set_motor(self, on: bool):
+        await self._call('CMD_MOTOR_CONTROL', self.gforce.setMotor, on)
+
+    async def set_log_level(self, log_level: int):
+        await self._call('CMD_SET_LOG_LEVEL', self.gforce.setLogLevel, log_level)
+
+    async def interrogate(self) -> dict:
+        """Query firmware version, feature map and EMG config concurrently."""
+        firmware_version, feature_map, emg_config = await asyncio.gather(
+            self.get_firmware_version(), self.get_feature_map(), self.get_emg_raw_data_config())
+        return {'firmware_version': firmware_version, 'feature_map': feature_map, 'emg_config': emg_config}
+
+    async def setup_emg(self, sampling_rate: int, channel_mask: int, data_length: int, resolution: int,
+                        notif_flags: int):
+        """Configure EMG raw data and switch the notifications on, both commands in flight at once."""
+        await asyncio.gather(self.set_emg_raw_data_config(sampling_rate, channel_mask, data_length, resolution),
+                             self.set_data_notif_switch(notif_flags))
+
+    async def blink_led(self, off_time: float = 1.0):
+        await self.set_led(False)
+        await asyncio.sleep(off_time)
+        await self.set_led(True)
+
+    async def _call(self, command_name: str, method, *args):
+        command = CommandType[command_name]
+        lock = self._command_locks.setdefault(command, asyncio.Lock())
+
+        async with lock:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+
+            def on_response(resp, *values):
+                # Runs on the Bluetooth I/O or timeout thread
+                try:
+                    loop.call_soon_threadsafe(_resolve, future, command, resp, values)
+                except RuntimeError:
+                    pass  # the event loop is already closed, nobody waits for the result
+
+            ret = method(*args, on_response, self.timeout)
+            if ret != GF_RET_CODE.GF_SUCCESS:
+                raise GForceCommandError(command, ret)
+
+            return await future
+
+
+def _resolve(future: asyncio.Future, command: int, resp, values: tuple):
+    if future.done():
+        return
+    if resp != ResponseResult['RSP_CODE_SUCCESS']:
+        future.set_exception(GForceCommandError(command, resp))
+    elif len(values) == 0:
+        future.set_result(None)
+    elif len(values) == 1:
+        future.set_result(values[0])
+    else:
+        future.set_result(values)
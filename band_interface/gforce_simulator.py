@@ -0,0 +1,322 @@
+import collections
+import math
+import os
+import random
+import select
+import struct
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from backend.chunked_dataset import ChunkedDataset
+from backend.data_manager import DataManager
+from band_interface.gforce import (CMD_NOTIFY_CHAR_UUID, DATA_NOTIFY_CHAR_UUID, CommandType, DataNotifFlags,
+                                   NotifDataType, PacketReassembler, ResponseResult)
+
+BAND_ASSETS_PATH = Path(__file__).parent.parent / 'assets' / 'band'
+
+CMD_HANDLE = 0x0F
+DATA_HANDLE = 0x12
+
+
+class SimulatedCharacteristic:
+    def __init__(self, uuid, handle, device):
+        self.uuid = uuid
+        self._handle = handle
+        self._device = device
+
+    def getHandle(self):
+        return self._handle
+
+    def write(self, data, withResponse=False):
+        self._device._onCommandWrite(bytes(data))
+
+
+class SimulatedGForce:
+    """
+    A drop-in replacement for the bluepy ``Peripheral`` behind GForceProfile, simulating a gForce band.
+
+    EMG packets are replayed from the recorded ``assets/band/*/emg_raw_data.pkl.gz`` datasets at
+    ``packet_rate`` packets per second (0 means as fast as the consumer keeps up), quaternions and gestures
+    are synthesized. Packets larger than ``fragment_size`` are split into partial packets like the band does,
+    and ``loss_rate`` drops that fraction of notifications on the air.
+    Commands are answered like the real device, so GForceProfile and Connector work unchanged:
+
+        GForceProfile(device=SimulatedGForce(packet_rate=2000, fragment_size=40, loss_rate=0.01))
+
+    Like bluepy, notifications are delivered from ``waitForNotifications``; ``fileno()`` becomes readable
+    when one is pending, so BluetoothIoLoop can select() on it.
+    """
+    FIRMWARE_VERSION = 'SIM-1.0.0'
+    FEATURE_MAP = 0x000FFFFF
+    # Notifications pending beyond this are lost, like on an overloaded BLE link
+    MAX_PENDING = 4096
+
+    def __init__(self, datasets=None, packet_rate=None, fragment_size=None, loss_rate=0.0, seed=None,
+                 quaternion_rate=50.0, gesture_interval=2.0):
+        self.packet_rate = packet_rate
+        self.fragment_size = fragment_size
+        self.loss_rate = loss_rate
+        self.quaternion_rate = quaternion_rate
+        self.gesture_interval = gesture_interval
+        self._random = random.Random(seed)
+
+        self._samples = _load_samples(datasets)
+        self._samplePosition = 0
+
+        self.mtu = 23
+        self.sampRate = 500
+        self.channelMask = 0xFF
+        self.dataLen = 128
+        self.resolution = 8
+        self.notifFlags = DataNotifFlags['DNF_OFF']
+        self.notificationsEnabled = False
+
+        self.delegate = None
+        self.cmdCharacteristic = SimulatedCharacteristic(CMD_NOTIFY_CHAR_UUID, CMD_HANDLE, self)
+        self.notifyCharacteristic = SimulatedCharacteristic(DATA_NOTIFY_CHAR_UUID, DATA_HANDLE, self)
+        self._cmdReassembler = PacketReassembler()
+
+        self._pending = collections.deque()
+        self._pendingLock = threading.Lock()
+        self._readyReader = None
+        self._readyWriter = None
+        self._stopEvent = threading.Event()
+        self._thread = None
+
+        self.sentNotifications = 0
+        self.lostNotifications = 0
+        self.overflowNotifications = 0
+
+    # --- bluepy Peripheral interface ---
+
+    def connect(self, addr, *args):
+        self._readyReader, self._readyWriter = os.pipe()
+        os.set_blocking(self._readyWriter, False)
+        self._stopEvent.clear()
+        self._thread = threading.Thread(target=self._produce, daemon=True)
+        self._thread.start()
+
+    def disconnect(self):
+        self._stopEvent.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._readyReader is not None:
+            os.close(self._readyReader)
+            os.close(self._readyWriter)
+            self._readyReader = self._readyWriter = None
+        self._pending.clear()
+
+    def setMTU(self, mtu):
+        self.mtu = mtu
+        return {'mtu': [mtu]}
+
+    def getCharacteristics(self, *args, **kwargs):
+        return [self.cmdCharacteristic, self.notifyCharacteristic]
+
+    def writeCharacteristic(self, handle, val, withResponse=False):
+        # The client characteristic configuration descriptor sits right after the characteristic
+        if handle == DATA_HANDLE + 1:
+            self.notificationsEnabled = val == b'\x01\x00'
+
+    def setDelegate(self, delegate):
+        self.delegate = delegate
+        return self
+
+    withDelegate = setDelegate
+
+    def fileno(self):
+        return self._readyReader
+
+    def waitForNotifications(self, timeout):
+        reader = self._readyReader
+        if reader is None:
+            time.sleep(timeout)
+            return False
+        ready, _, _ = select.select([reader], [], [], timeout)
+        if not ready:
+            return False
+        # One readiness byte is written per pending notification
+        os.read(reader, 1)
+        handle, data = self._pending.popleft()
+        if self.delegate is not None:
+            self.delegate.handleNotification(handle, data)
+        return True
+
+    # --- device side ---
+
+    def _onCommandWrite(self, data):
+        if data[0] == CommandType['CMD_PARTIAL_DATA']:
+            data = self._cmdReassembler.feed(data)
+            if data is None:
+                return
+            data = bytes(data)
+
+        cmd = data[0]
+        resp, payload = self._execute(cmd, data[1:])
+        self._send(CMD_HANDLE, bytes([resp, cmd]) + payload, ResponseResult['RSP_CODE_PARTIAL_PACKET'], lossy=False)
+
+    def _execute(self, cmd, params):
+        success = ResponseResult['RSP_CODE_SUCCESS']
+
+        if cmd == CommandType['CMD_GET_FW_REVISION']:
+            return success, self.FIRMWARE_VERSION.encode('ascii')
+        if cmd == CommandType['CMD_GET_FEATURE_MAP']:
+            return success, struct.pack('<I', self.FEATURE_MAP)
+        if cmd == CommandType['CMD_GET_EMG_RAWDATA_CONFIG']:
+            return success, struct.pack('<HHBB', self.sampRate, self.channelMask, self.dataLen, self.resolution)
+        if cmd == CommandType['CMD_GET_BATTERY_LEVEL']:
+            return success, bytes([100])
+        if cmd == CommandType['CMD_GET_DEVICE_NAME']:
+            return success, b'gForce simulator'
+        if cmd == CommandType['CMD_SET_EMG_RAWDATA_CONFIG']:
+            if len(params) != 6 or params[5] not in (8, 12):
+                return ResponseResult['RSP_CODE_BAD_PARAM'], b''
+            self.sampRate, self.channelMask, self.dataLen, self.resolution = struct.unpack('<HHBB', params)
+            return success, b''
+        if cmd == CommandType['CMD_SET_DATA_NOTIF_SWITCH']:
+            if len(params) != 4:
+                return ResponseResult['RSP_CODE_BAD_PARAM'], b''
+            self.notifFlags = struct.unpack('<I', params)[0]
+            return success, b''
+        if cmd in (CommandType['CMD_LED_CONTROL_TEST'], CommandType['CMD_MOTOR_CONTROL'],
+                   CommandType['CMD_SET_LOG_LEVEL'], CommandType['CMD_POWEROFF'],
+                   CommandType['CMD_SYSTEM_RESET']):
+            return success, b''
+        return ResponseResult['RSP_CODE_NOT_SUPPORT'], b''
+
+    def _produce(self):
+        startTime = time.perf_counter()
+        emgSent = quatSent = gestSent = 0
+
+        while not self._stopEvent.is_set():
+            elapsed = time.perf_counter() - startTime
+            streaming = self.notificationsEnabled
+
+            if streaming and self.notifFlags & DataNotifFlags['DNF_EMG_RAW']:
+                if self.packet_rate == 0:
+                    # Unthrottled, only keep the link busy
+                    due = emgSent + max(0, self.MAX_PENDING // 2 - len(self._pending))
+                else:
+                    due = int(elapsed * self._emgPacketRate())
+                while emgSent < due:
+                    self._sendData(bytes([NotifDataType['NTF_EMG_ADC_DATA']]) + self._emgPayload())
+                    emgSent += 1
+            else:
+                emgSent = int(elapsed * self._emgPacketRate()) if self.packet_rate != 0 else emgSent
+
+            if streaming and self.notifFlags & DataNotifFlags['DNF_QUATERNION']:
+                while quatSent < int(elapsed * self.quaternion_rate):
+                    self._sendData(bytes([NotifDataType['NTF_QUAT_FLOAT_DATA']]) + _quaternion(elapsed))
+                    quatSent += 1
+            else:
+                quatSent = int(elapsed * self.quaternion_rate)
+
+            gestureFlags = DataNotifFlags['DNF_EMG_GESTURE'] | DataNotifFlags['DNF_EMG_GESTURE_STRENGTH']
+            if streaming and self.notifFlags & gestureFlags:
+                while gestSent < int(elapsed / self.gesture_interval):
+                    self._sendData(self._gesturePacket(gestSent))
+                    gestSent += 1
+            else:
+                gestSent = int(elapsed / self.gesture_interval)
+
+            time.sleep(0.0005 if self.packet_rate == 0 else 0.001)
+
+    def _samplesPerPacket(self):
+        # 12-bit samples are packed in pairs into three bytes, and a packet only holds whole sample frames
+        sampleSlots = self.dataLen // 3 * 2 if self.resolution == 12 else self.dataLen
+        channels = bin(self.channelMask).count('1')
+        return sampleSlots // channels * channels
+
+    def _emgPacketRate(self):
+        if self.packet_rate is not None:
+            return self.packet_rate
+        # What the band sends for the configured sampling rate and channels
+        return self.sampRate * bin(self.channelMask).count('1') / self._samplesPerPacket()
+
+    def _emgPayload(self):
+        samplesPerPacket = self._samplesPerPacket()
+        end = self._samplePosition + samplesPerPacket
+        if end > len(self._samples):
+            self._samplePosition, end = 0, samplesPerPacket
+        samples = self._samples[self._samplePosition:end]
+        self._samplePosition = end
+
+        if self.resolution == 8:
+            payload = samples.tobytes()
+        else:
+            payload = _pack12(samples.astype(np.uint16) << 4)
+        return payload.ljust(self.dataLen, b'\x00')
+
+    def _gesturePacket(self, index):
+        gesture = index % 6
+        if self.notifFlags & DataNotifFlags['DNF_EMG_GESTURE_STRENGTH']:
+            return struct.pack('<BBH', NotifDataType['NTF_EMG_GEST_DATA'], gesture, 50 + 10 * gesture)
+        return struct.pack('<BB', NotifDataType['NTF_EMG_GEST_DATA'], gesture)
+
+    def _sendData(self, packet):
+        self._send(DATA_HANDLE, packet, NotifDataType['NTF_PARTIAL_DATA'], lossy=True)
+
+    def _send(self, handle, packet, partialFlag, lossy):
+        fragmentSize = self.fragment_size if self.fragment_size is not None else self.mtu - 3
+        if len(packet) <= fragmentSize:
+            fragments = [packet]
+        else:
+            contentLen = fragmentSize - 2
+            count = (len(packet) + contentLen - 1) // contentLen
+            fragments = [bytes([partialFlag, count - 1 - i]) + packet[i * contentLen:(i + 1) * contentLen]
+                         for i in range(count)]
+
+        for fragment in fragments:
+            if lossy and self.loss_rate and self._random.random() < self.loss_rate:
+                self.lostNotifications += 1
+                continue
+            self._notify(handle, fragment)
+
+    def _notify(self, handle, data):
+        with self._pendingLock:
+            writer = self._readyWriter
+            if writer is None or len(self._pending) >= self.MAX_PENDING:
+                self.overflowNotifications += 1
+                return
+            self._pending.append((handle, data))
+            try:
+                os.write(writer, b'\x00')
+            except OSError:
+                self._pending.pop()
+                self.overflowNotifications += 1
+                return
+            self.sentNotifications += 1
+
+
+def _load_samples(datasets):
+    """Concatenate the recorded packets into one stream of 8-bit samples."""
+    if datasets is None:
+        datasets = sorted(path for path in BAND_ASSETS_PATH.glob(f'*/{DataManager.DATA_DEFAULT_NAME}.*')
+                          if path.name.endswith(('.pkl.gz', ChunkedDataset.FORMAT)))
+    frames = [DataManager.read_data_file(dataset) for dataset in datasets]
+    if not frames:
+        raise ValueError('No recorded datasets to replay')
+    values = np.concatenate([frame.to_numpy().ravel() for frame in frames])
+    return np.clip(values, 0, 255).astype(np.uint8)
+
+
+def _pack12(samples):
+    """Pack pairs of 12-bit samples into three bytes, low nibble of the second byte first."""
+    if len(samples) % 2:
+        samples = np.append(samples, 0)
+    first, second = samples[0::2], samples[1::2]
+    packed = np.empty((len(first), 3), dtype=np.uint8)
+    packed[:, 0] = first & 0xFF
+    packed[:, 1] = (first >> 8) | ((second & 0x0F) << 4)
+    packed[:, 2] = second >> 4
+    return packed.tobytes()
+
+
+def _quaternion(t):
+    # Slow rotation around the forearm axis
+    half_angle = 0.5 * math.sin(0.5 * t)
+    return struct.pack('<4f', math.cos(half_angle), math.sin(half_angle), 0.0, 0.0)
@@ -0,0 +1,229 @@
+import asyncio
+import time
+
+import numpy as np
+import pandas as pd
+
+from backend.acquisition_metrics import AcquisitionMetrics
+from backend.emg_decoder import EmgPacketDecoder
+from backend.emg_signal import EMGSignal
+from band_interface.gforce import DataNotifFlags, GForceProfile, NotifDataType
+from band_interface.gforce_async import AsyncGForceProfile
+
+
+class BandStream:
+    """
+    Acquisition state of a single band in a MultiBandSession.
+
+    The notification callback only stamps the packet with the host clock and appends it,
+    so every band's I/O thread spends as little time as possible holding the GIL.
+    """
+
+    def __init__(self, name: str, gforce: GForceProfile):
+        self.name = name
+        self.gforce = gforce
+        self.band_config = None
+        self._packets = []
+        self.decoder = None
+        self.metrics = AcquisitionMetrics(name)
+
+    def configure(self, band_config: dict):
+        self.band_config = band_config
+        self.decoder = EmgPacketDecoder(band_config['channel_mask'], band_config['channels'], band_config['resolution'])
+
+    def on_data(self, data):
+        if self.band_config is None:
+            return  # not configured yet, e.g. still streaming from before the session, nothing to decode with
+        if data[0] == NotifDataType['NTF_EMG_ADC_DATA'] and len(data) == self.band_config['channels'] + 1:
+            # The reassembler reuses its buffer, keep an owned copy
+            self._packets.append((time.monotonic(), bytes(data[1:])))
+            self.metrics.on_packet(len(data), self.decoder.samples_per_packet)
+        else:
+            self.metrics.on_invalid_packet()
+
+    def clear(self):
+        self._packets = []
+        self.metrics = AcquisitionMetrics(self.name)
+        self.metrics.attach_reassembler(self.gforce.notifReassembler)
+        self.metrics.add_gauge('send_queue', self.gforce.send_queue.qsize)
+
+    @property
+    def channels(self) -> int:
+        return self.decoder.channel_count
+
+    def samples(self) -> tuple:
+        """Decoded samples (samples x channels) and the host arrival time of the packet each one came in."""
+        packets = self._packets
+        if not packets:
+            return np.empty((0, self.channels), dtype=self.decoder.dtype), np.empty(0)
+
+        samples = self.decoder.decode_many(b''.join(payload for _, payload in packets))
+        arrivals = np.repeat(np.array([arrival for arrival, _ in packets]), self.decoder.samples_per_packet)
+        return samples, arrivals
+
+    def sample_times(self, arrivals: np.ndarray) -> np.ndarray:
+        """
+        Host time of every sample.
+
+        BLE delivers packets in bursts, so single arrival times jitter by a connection interval or more.
+        The band samples at a fixed rate though, so the timeline is anchored on the packet that arrived
+        with the smallest delay and extended at the sampling rate.
+        A lost packet takes its samples with it while the band's clock moves on: every packet after it
+        arrives at least a packet duration later than the timeline predicts. The timeline is split there,
+        each segment anchored on its own packets, so the samples after a loss keep their real time - exactly
+        as long as the jitter stays under half a packet duration.
+        """
+        sampling_rate = self.band_config['sampling_rate']
+        samples_per_packet = self.decoder.samples_per_packet
+        packet_duration = samples_per_packet / sampling_rate
+        # A packet is sent once its last sample has been taken
+        packet_arrivals = arrivals[::samples_per_packet]
+        delays = packet_arrivals - np.arange(1, len(packet_arrivals) + 1) * packet_duration
+
+        # The delays after a loss are a whole packet duration longer or more: a segment ends where even the
+        # smallest delay of every packet to come is half a packet duration above the anchor of the segment
+        later_delays = np.minimum.accumulate(delays[::-1])[::-1]
+        anchors = np.empty(len(delays))
+        first, anchor = 0, delays[0]
+        for packet in range(1, len(delays)):
+            if later_delays[packet] - anchor >= packet_duration / 2:
+                anchors[first:packet] = anchor
+                first, anchor = packet, delays[packet]
+            anchor = min(anchor, delays[packet])
+        anchors[first:] = anchor
+        return np.repeat(anchors, samples_per_packet)[:len(arrivals)] + np.arange(len(arrivals)) / sampling_rate
+
+    def stats(self) -> dict:
+        return self.metrics.snapshot()
+
+
+class MultiBandSession:
+    """
+    Acquires EMG from several bands at once and merges them into one signal.
+
+    Each band has its own GForceProfile, so its own Bluetooth I/O thread - a busy band can't
+    delay the notifications of another one. The streams are merged on host timestamps.
+    """
+
+    def __init__(self, gforce_factory=GForceProfile):
+        self._gforce_factory = gforce_factory
+        self.bands = {}
+        self._started_at = None
+        self._stopped_at = None
+
+    def connect(self, addresses: dict):
+        """Connect bands given as {name: address}."""
+        for name, address in addresses.items():
+            gforce = self._gforce_factory()
+            gforce.connect(address)
+            self.bands[name] = BandStream(name, gforce)
+
+    def configure_emg(self, sampling_rate: int, channel_mask: int, data_length: int, resolution: int):
+        async def configure_all():
+            await asyncio.gather(*[
+                AsyncGForceProfile(band.gforce).set_emg_raw_data_config(sampling_rate, channel_mask, data_length,
+                                                                        resolution)
+                for band in self.bands.values()])
+
+        asyncio.run(configure_all())
+        for band in self.bands.values():
+            band.configure({'sampling_rate': sampling_rate, 'channel_mask': channel_mask,
+                            'channels': data_length, 'resolution': resolution})
+
+    def start(self):
+        async def switch_on_all():
+            await asyncio.gather(*[
+                AsyncGForceProfile(band.gforce).set_data_notif_switch(DataNotifFlags['DNF_EMG_RAW'])
+                for band in self.bands.values()])
+
+        for band in self.bands.values():
+            band.clear()
+        asyncio.run(switch_on_all())
+
+        self._started_at = time.monotonic()
+        self._stopped_at = None
+        for band in self.bands.values():
+            band.gforce.startDataNotification(band.on_data)
+
+    def stop(self):
+        for band in self.bands.values():
+            band.gforce.stopDataNotification()
+        self._stopped_at = time.monotonic()
+
+        async def switch_off_all():
+            await asyncio.gather(*[
+                AsyncGForceProfile(band.gforce).set_data_notif_switch(DataNotifFlags['DNF_OFF'])
+                for band in self.bands.values()], return_exceptions=True)
+
+        asyncio.run(switch_off_all())
+
+    def disconnect(self):
+        for band in self.bands.values():
+            band.gforce.disconnect()
+        self.bands = {}
+
+    @property
+    def duration(self) -> float:
+        if self._started_at is None:
+            return 0.0
+        end = self._stopped_at if self._stopped_at is not None else time.monotonic()
+        return end - self._started_at
+
+    def stats(self) -> dict:
+        """Per-band AcquisitionMetrics snapshots (throughput, reassembly errors, dropped fragments, ...)."""
+        return {name: band.stats() for name, band in self.bands.items()}
+
+    def merged_signal(self, sampling_rate: int = None) -> pd.DataFrame:
+        """
+        One DataFrame with a (band, channel) column for every channel of every band.
+
+        Rows are a common time grid (seconds since the session started) over the span covered by all bands,
+        at ``sampling_rate`` (by default the highest band rate). Every band contributes its nearest sample -
+        also where its packets were lost, see ``lost_samples`` for the rows that aren't real samples of a band.
+        """
+        return self._merge(sampling_rate)[0]
+
+    def lost_samples(self, sampling_rate: int = None) -> pd.DataFrame:
+        """
+        Rows of ``merged_signal`` by band, True where the band lost its packets: it has no sample of its own
+        there (the nearest one is a sample period away or more), the row only repeats a neighbouring one.
+        """
+        return self._merge(sampling_rate)[1]
+
+    def _merge(self, sampling_rate: int = None) -> tuple:
+        timelines = {}
+        for name, band in self.bands.items():
+            samples, arrivals = band.samples()
+            if len(samples) == 0:
+                raise ValueError(f'Band {name} has not delivered any EMG data')
+            timelines[name] = (samples, band.sample_times(arrivals), band.band_config['sampling_rate'])
+
+        if sampling_rate is None:
+            sampling_rate = max(rate for _, _, rate in timelines.values())
+        start = max(times[0] for _, times, _ in timelines.values())
+        stop = min(times[-1] for _, times, _ in timelines.values())
+        grid = start + np.arange(int(np.floor((stop - start) * sampling_rate)) + 1) / sampling_rate
+        index = pd.Index(grid - self._started_at, name='time')
+
+        columns = {}
+        lost = {}
+        for name, (samples, times, rate) in timelines.items():
+            # The timeline of a band jumps ahead where packets were lost, the nearest sample is looked up
+            after = np.clip(np.searchsorted(times, grid), 1, len(samples) - 1)
+            before = after - 1
+            nearest = np.where(grid - times[before] <= times[after] - grid, before, after)
+            # Within a stretch without losses, the nearest sample is at most half a sample period away
+            lost[name] = np.abs(times[nearest] - grid) > 0.75 / rate
+            for channel in range(samples.shape[1]):
+                columns[(name, channel)] = samples[nearest, channel]
+
+        merged = pd.DataFrame(columns, index=index)
+        merged.columns = pd.MultiIndex.from_tuples(merged.columns, names=['band', 'channel'])
+        return merged, pd.DataFrame(lost, index=index)
+
+    def to_emg_signal(self, metadata: dict = None) -> EMGSignal:
+        metadata = dict(metadata) if metadata is not None else {}
+        merged, lost = self._merge()
+        metadata['bands'] = {name: dict(band.band_config, lost_samples=int(lost[name].sum()))
+                             for name, band in self.bands.items()}
+        return EMGSignal(merged, metadata)
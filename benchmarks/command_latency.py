@@ -0,0 +1,169 @@
+"""
+Command round-trip latency of the gForce I/O loop.
+
+Compares the old polling handler (one command per pass, then a blocking 1 s ``waitForNotifications``)
+with the event-driven ``BluetoothIoLoop``. No band is needed: a fake peripheral answers every command
+after a fixed link latency, the way the band does over BLE.
+
+Run from the project root:
+    python -m benchmarks.command_latency --rounds 50 --burst 8
+"""
+import argparse
+import contextlib
+import io
+import random
+import select
+import socket
+import statistics
+import struct
+import threading
+import time
+
+from band_interface.gforce import (CMD_NOTIFY_CHAR_UUID, DATA_NOTIFY_CHAR_UUID, GForceProfile, ProfileCharType,
+                                   ResponseResult)
+
+CMD_HANDLE = 0x10
+NOTIFY_HANDLE = 0x20
+
+
+class FakeCharacteristic:
+    def __init__(self, uuid, handle, peripheral):
+        self.uuid = uuid
+        self._handle = handle
+        self._peripheral = peripheral
+
+    def getHandle(self):
+        return self._handle
+
+    def write(self, data):
+        self._peripheral.on_command(bytes(data))
+
+
+class FakePeripheral:
+    """A bluepy ``Peripheral`` look-alike that acknowledges every command after ``link_latency`` seconds."""
+
+    def __init__(self, link_latency=0.0075):
+        self.link_latency = link_latency
+        self.delegate = None
+        self._reader, self._writer = socket.socketpair()
+        self._write_lock = threading.Lock()
+
+    def connect(self, addr):
+        pass
+
+    def disconnect(self):
+        self._reader.close()
+        self._writer.close()
+
+    def setMTU(self, mtu):
+        return {'mtu': [mtu]}
+
+    def getCharacteristics(self):
+        return [FakeCharacteristic(CMD_NOTIFY_CHAR_UUID, CMD_HANDLE, self),
+                FakeCharacteristic(DATA_NOTIFY_CHAR_UUID, NOTIFY_HANDLE, self)]
+
+    def writeCharacteristic(self, handle, data, withResponse=False):
+        pass
+
+    def setDelegate(self, delegate):
+        self.delegate = delegate
+
+    def fileno(self):
+        return self._reader.fileno()
+
+    def on_command(self, data):
+        response = bytes([ResponseResult['RSP_CODE_SUCCESS'], data[0]])
+        threading.Timer(self.link_latency, self._notify, args=(CMD_HANDLE, response)).start()
+
+    def _notify(self, handle, data):
+        with self._write_lock:
+            self._writer.sendall(struct.pack('<HH', handle, len(data)) + data)
+
+    def waitForNotifications(self, timeout):
+        ready, _, _ = select.select([self._reader], [], [], timeout)
+        if not ready:
+            return False
+        handle, length = struct.unpack('<HH', self._recv_exactly(4))
+        self.delegate.handleNotification(handle, self._recv_exactly(length))
+        return True
+
+    def _recv_exactly(self, size):
+        data = b''
+        while len(data) < size:
+            data += self._reader.recv(size - len(data))
+        return data
+
+
+def legacy_polling_handler(gforce, stop_event):
+    """The handler ``MyDelegate`` used to run: at most one command per pass, then block for up to 1 s."""
+    while not stop_event.is_set():
+        if not gforce.send_queue.empty():
+            cmd = gforce.send_queue.get_nowait()
+            gforce.cmdCharacteristic.write(cmd)
+        gforce.device.waitForNotifications(1)
+
+
+def measure(gforce, rounds, burst):
+    round_trips = []
+    done = threading.Semaphore(0)
+
+    for _ in range(rounds):
+        # Random idle time, so commands land at a random phase of the polling loop
+        time.sleep(random.uniform(0.0, 0.2))
+        for cmd in range(1, burst + 1):
+            sent_at = time.perf_counter()
+
+            def on_response(resp, resp_data, sent_at=sent_at):
+                round_trips.append(time.perf_counter() - sent_at)
+                done.release()
+
+            gforce.sendCommand(ProfileCharType.PROF_DATA_CMD, bytes([cmd]), True, on_response, 5000)
+        for _ in range(burst):
+            done.acquire()
+
+    return round_trips
+
+
+def run(loop_kind, rounds, burst, link_latency):
+    gforce = GForceProfile(device=FakePeripheral(link_latency))
+    stop_event = threading.Event()
+    legacy_thread = threading.Thread(target=legacy_polling_handler, args=(gforce, stop_event), daemon=True)
+
+    with contextlib.redirect_stdout(io.StringIO()):  # the command callbacks are chatty
+        gforce.connect('fake')
+        if loop_kind == 'legacy':
+            gforce.ioLoop.stop()
+            gforce.ioLoop = None
+            legacy_thread.start()
+
+        round_trips = measure(gforce, rounds, burst)
+
+        stop_event.set()
+        if legacy_thread.is_alive():
+            legacy_thread.join()
+        gforce.disconnect()
+
+    return round_trips
+
+
+def report(name, round_trips):
+    ms = sorted(rt * 1000 for rt in round_trips)
+    p95 = ms[int(0.95 * (len(ms) - 1))]
+    print(f'{name:>14}: n={len(ms)}  mean={statistics.mean(ms):8.2f} ms  median={statistics.median(ms):8.2f} ms  '
+          f'p95={p95:8.2f} ms  max={ms[-1]:8.2f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=30)
+    parser.add_argument('--burst', type=int, default=8, help='commands queued back to back per round')
+    parser.add_argument('--link-latency', type=float, default=0.0075, help='simulated BLE latency in seconds')
+    args = parser.parse_args()
+
+    print(f'{args.rounds} rounds x {args.burst} commands, link latency {args.link_latency * 1000:.1f} ms')
+    report('legacy polling', run('legacy', args.rounds, args.burst, args.link_latency))
+    report('event-driven', run('event', args.rounds, args.burst, args.link_latency))
+
+
+if __name__ == '__main__':
+    main()
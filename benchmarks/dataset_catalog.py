@@ -0,0 +1,76 @@
+"""
+Dataset catalog benchmark: listing datasets with their metadata, by reading every metadata file vs. from the catalog.
+
+Creates ``--datasets`` small synthetic datasets (metadata and a chunked data file) in a temporary folder, then lists
+them the way the UI used to (a yaml parse per dataset) and through a DatasetCatalog: the first refresh
+(every dataset described), a refresh after changing a single dataset, and the listing query itself.
+
+Run from the project root:
+    python -m benchmarks.dataset_catalog --datasets 2000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from backend.chunked_dataset import ChunkedDataset
+from backend.data_manager import DataManager
+from backend.dataset_catalog import DatasetCatalog
+from backend.emg_signal import build_metadata
+
+
+def timed(name, run):
+    started = time.perf_counter()
+    result = run()
+    print(f'{name:>32} {(time.perf_counter() - started) * 1000:9.1f} ms')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--datasets', type=int, default=2000)
+    args = parser.parse_args()
+
+    data_manager = DataManager()
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as folder:
+        folder = Path(folder)
+        for number in range(1, args.datasets + 1):
+            dataset_folder = folder / str(number)
+            dataset_folder.mkdir()
+            metadata = build_metadata(500, 0xFF, 128, 8, int(rng.integers(18, 70)), str(rng.choice(['m', 'f'])),
+                                      170, 70)
+            with open(dataset_folder / 'metadata.yaml', 'w') as f:
+                yaml.dump(metadata, f)
+            data = pd.DataFrame(rng.integers(0, 256, size=(500, 8), dtype=np.uint8))
+            ChunkedDataset.write(dataset_folder / f'emg_raw_data{ChunkedDataset.FORMAT}', data)
+
+        def read_every_metadata():
+            descriptions = []
+            for dataset_folder in folder.iterdir():
+                if dataset_folder.is_dir():
+                    with open(dataset_folder / 'metadata.yaml') as f:
+                        descriptions.append(f'[{dataset_folder.name}] {yaml.safe_load(f)}')
+            return descriptions
+
+        tracked_files = ('metadata.yaml', f'emg_raw_data{ChunkedDataset.FORMAT}')
+        catalog = DatasetCatalog(folder / 'catalog.sqlite', folder, tracked_files, data_manager._describe_dataset)
+
+        print(f'{args.datasets} datasets')
+        timed('yaml parse per dataset', read_every_metadata)
+        timed('catalog, first refresh', catalog.refresh)
+        with open(folder / '1' / 'metadata.yaml', 'a') as f:
+            f.write('# edited\n')
+        timed('catalog, refresh of 1 change', catalog.refresh)
+        timed('catalog, refresh of no change', catalog.refresh)
+        entries = timed('catalog, listing query', catalog.entries)
+        timed('catalog, query by gender', lambda: catalog.entries(gender='f'))
+        assert len(entries) == args.datasets
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Dataset format benchmark: loading pickle+gzip recordings vs. chunked datasets.
+
+Every stored recording is written again as a chunked dataset (zlib and raw codec) in a temporary folder,
+then all of them are loaded in each format. Reports the load time, the decode throughput in samples
+per second (all channels of a sample) and the size on disk. A long synthetic recording, narrowed to
+uint8 in both formats, shows the difference without the int64 overhead of the older pickles.
+
+Run from the project root:
+    python -m benchmarks.dataset_format --minutes 60 --sampling-rate 500
+"""
+import argparse
+import gzip
+import pickle
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from backend.chunked_dataset import ChunkedDataset
+from backend.data_manager import DataManager
+from backend.emg_signal import narrow_raw_data
+
+
+def load_pickle(path):
+    with gzip.open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def measure(name, load, paths, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        samples = sum(len(load(path)) for path in paths)
+    elapsed = (time.perf_counter() - started) / repeat
+    size = sum(path.stat().st_size for path in paths)
+    print(f'{name:>14} {elapsed * 1000:9.1f} ms {samples / elapsed / 1e6:9.2f} M samples/s {size / 2**20:9.2f} MiB')
+
+
+def compare(folder, frames, repeat):
+    paths = {'pickle+gzip': [], 'chunked zlib': [], 'chunked raw': []}
+    for number, frame in enumerate(frames):
+        pickled = folder / f'{number}.pkl.gz'
+        with gzip.open(pickled, 'wb') as f:
+            pickle.dump(frame, f)
+        paths['pickle+gzip'].append(pickled)
+        for codec in ChunkedDataset.CODECS:
+            path = folder / f'{number}.{codec}{ChunkedDataset.FORMAT}'
+            ChunkedDataset.write(path, frame, codec)
+            paths[f'chunked {codec}'].append(path)
+
+    measure('pickle+gzip', load_pickle, paths['pickle+gzip'], repeat)
+    for codec in ChunkedDataset.CODECS:
+        measure(f'chunked {codec}', lambda path: ChunkedDataset(path).to_frame(), paths[f'chunked {codec}'], repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--minutes', type=float, default=60)
+    parser.add_argument('--sampling-rate', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    data_manager = DataManager()
+    stored = [data_manager.BAND_ASSETS_PATH / dataset_id / f'{DataManager.DATA_DEFAULT_NAME}.pkl.gz'
+              for dataset_id in data_manager.list_datasets()]
+    stored = [path for path in stored if path.exists()]
+    samples = int(args.minutes * 60 * args.sampling_rate)
+
+    with tempfile.TemporaryDirectory() as folder:
+        print(f'{len(stored)} stored recordings, as they were pickled and as chunked datasets:')
+        compare(Path(folder), [load_pickle(path) for path in stored], args.repeat)
+
+        print('\nthe same recordings narrowed to uint8, as DataManager stores them now:')
+        compare(Path(folder), [narrow_raw_data(load_pickle(path)) for path in stored], args.repeat)
+
+        print(f'\n{samples} samples x 8 channels, uint8 in every format:')
+        rng = np.random.default_rng(0)
+        emg = np.clip(rng.normal(120, 10, size=(samples, 8)), 0, 255).astype(np.uint8)
+        compare(Path(folder), [pd.DataFrame(emg)], max(args.repeat // 5, 1))
+
+
+if __name__ == '__main__':
+    main()
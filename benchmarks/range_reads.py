@@ -0,0 +1,54 @@
+"""
+Range read benchmark: latency of reading a time range of a few channels from recordings of growing length.
+
+Writes synthetic 8-channel recordings of every length as chunked datasets (zlib and raw codec) in a temporary
+folder, then reads seconds 30-60 of channels 2 and 5 from each and, for comparison, loads the whole recording.
+The range read should take about as long for every length, the full load grows with it.
+
+Run from the project root:
+    python -m benchmarks.range_reads --minutes 1 10 60 480 --sampling-rate 500
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from backend.chunked_dataset import ChunkedDataset
+
+
+def best_time(run, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--minutes', type=float, nargs='+', default=[1, 10, 60, 480])
+    parser.add_argument('--sampling-rate', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    start, stop = 30 * args.sampling_rate, 60 * args.sampling_rate
+    rng = np.random.default_rng(0)
+    print(f'{"minutes":>8} {"codec":>6} {"range read":>12} {"full load":>12}')
+    with tempfile.TemporaryDirectory() as folder:
+        for minutes in args.minutes:
+            samples = int(minutes * 60 * args.sampling_rate)
+            data = pd.DataFrame(np.clip(rng.normal(120, 10, size=(samples, 8)), 0, 255).astype(np.uint8))
+            for codec in ChunkedDataset.CODECS:
+                dataset = ChunkedDataset.write(Path(folder) / f'{minutes}{codec}{ChunkedDataset.FORMAT}', data, codec)
+                range_read = best_time(lambda: ChunkedDataset(dataset.path).to_frame(start, stop, [2, 5]), args.repeat)
+                full_load = best_time(lambda: ChunkedDataset(dataset.path).to_frame(), max(args.repeat // 5, 1))
+                print(f'{minutes:>8g} {codec:>6} {range_read * 1000:9.2f} ms {full_load * 1000:9.1f} ms')
+                dataset.path.unlink()
+
+
+if __name__ == '__main__':
+    main()
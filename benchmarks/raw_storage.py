@@ -0,0 +1,56 @@
+"""
+Raw storage benchmark: memory footprint of the recordings before and after narrowing their dtype.
+
+For every stored dataset, compares the frame as it was pickled (int64, or object columns of Python ints)
+with the one DataManager now keeps (the narrowest dtype of the band's resolution), in memory and gzipped on disk.
+A synthetic recording shows the same for a long session acquired row by row, like ``ondata`` used to store it.
+
+Run from the project root:
+    python -m benchmarks.raw_storage --minutes 60 --sampling-rate 500
+"""
+import argparse
+import gzip
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from backend.data_manager import DataManager
+from backend.emg_signal import narrow_raw_data
+
+
+def footprint(data: pd.DataFrame):
+    """(bytes in memory, bytes pickled and gzipped)"""
+    return data.memory_usage(index=False, deep=True).sum(), len(gzip.compress(pickle.dumps(data)))
+
+
+def report(name, before: pd.DataFrame, after: pd.DataFrame):
+    (memory_before, disk_before), (memory_after, disk_after) = footprint(before), footprint(after)
+    dtypes = lambda data: ','.join(sorted({str(dtype) for dtype in data.dtypes}))
+    print(f'{name:>10} {len(before):>9} {dtypes(before):>8} -> {dtypes(after):<7}'
+          f' {memory_before / 2**20:9.2f} -> {memory_after / 2**20:7.2f} MiB'
+          f' {disk_before / 2**10:9.1f} -> {disk_after / 2**10:7.1f} KiB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--minutes', type=float, default=60)
+    parser.add_argument('--sampling-rate', type=int, default=500)
+    args = parser.parse_args()
+
+    print(f'{"dataset":>10} {"samples":>9} {"dtype":>8}    {"":<7} {"memory":>20} {"gzipped":>24}')
+    data_manager = DataManager()
+    for dataset_id in sorted(data_manager.list_datasets(), key=lambda d: (len(d), d)):
+        with gzip.open(data_manager._DATASET_FOLDER(dataset_id) / f'{DataManager.DATA_DEFAULT_NAME}.pkl.gz') as f:
+            stored = pickle.load(f)
+        resolution = data_manager.load_metadata(dataset_id).get('band', {}).get('resolution')
+        report(dataset_id, stored, narrow_raw_data(stored, resolution))
+
+    samples = int(args.minutes * 60 * args.sampling_rate)
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, 256, size=(samples, 8)).tolist()
+    report('synthetic', pd.DataFrame(rows), narrow_raw_data(pd.DataFrame(rows), resolution=8))
+
+
+if __name__ == '__main__':
+    main()
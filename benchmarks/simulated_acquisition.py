@@ -0,0 +1,66 @@
+"""
+End-to-end acquisition stress test against the simulated band.
+
+Drives Connector.start_emg_notifications -> EMGSignal -> DataManager.store_dataset with a
+SimulatedGForce replaying the recorded datasets, at a packet rate well above the real band.
+The dataset is stored into a temporary folder, not into assets/band.
+
+Run from the project root:
+    python -m benchmarks.simulated_acquisition --packet-rate 2000 --seconds 10 --fragment-size 40 --loss-rate 0.001
+"""
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+from pathlib import Path
+
+from band_interface.gforce import GForceProfile
+from band_interface.gforce_simulator import SimulatedGForce
+from connector import Connector
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--packet-rate', type=float, default=2000, help='EMG packets per second, 0 = unthrottled')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--fragment-size', type=int, default=None, help='split packets larger than this')
+    parser.add_argument('--loss-rate', type=float, default=0.0, help='fraction of notifications lost')
+    args = parser.parse_args()
+
+    band = SimulatedGForce(packet_rate=args.packet_rate, fragment_size=args.fragment_size,
+                           loss_rate=args.loss_rate, seed=0)
+    gforce = GForceProfile(device=band)
+    connector = Connector(gforce=gforce)
+
+    with tempfile.TemporaryDirectory() as assets_path:
+        connector.data_manager.BAND_ASSETS_PATH = Path(assets_path)
+
+        with contextlib.redirect_stdout(io.StringIO()):  # the connector prints command results and a summary
+            connector.connect_device('simulator')
+            connector.configure_emg_raw_data(500, 0xFF, 128, 8, 30, 'Male', 175, 70)
+            connector.start_emg_notifications()
+
+            time.sleep(args.seconds)
+
+            emg_signal = connector.emg_signal
+            emg_stage = connector.emg_stage
+            started = time.perf_counter()
+            connector.stop_notifications()
+            store_time = time.perf_counter() - started
+            gforce.disconnect()
+
+        rows = len(emg_signal.signal)
+        metrics = connector.metrics.snapshot()
+        print(f'sent notifications:    {band.sentNotifications} '
+              f'({band.lostNotifications} lost on air, {band.overflowNotifications} link overflows)')
+        print(f'packets received:      {metrics["packets"]} '
+              f'(reassembly errors {metrics["reassembly_errors"]}, dropped fragments {metrics["dropped_fragments"]})')
+        print(f'staging drops:         {emg_stage.dropped_packets}')
+        print(f'decode latency:        p50 < {metrics["latency_p50"] * 1e3:.3f} ms, '
+              f'p99 < {metrics["latency_p99"] * 1e3:.3f} ms')
+        print(f'samples stored:        {rows} in {args.seconds:.1f} s = {rows / args.seconds:.0f} samples/s')
+        print(f'stop + store_dataset:  {store_time * 1000:.1f} ms')
+
+if __name__ == '__main__':
+    main()
@@ -11,8 +11,13 @@ import classifiers_and_tests.classifier_logistic_regression
 import classifiers_and_tests.classifier_svm
 import classifiers_and_tests.classifier_tree
 import classifiers_and_tests.classifier_tree_with_feature_selection
+from backend.acquisition_metrics import AcquisitionMetrics
+from backend.chunked_dataset import ChunkedDataset
 from backend.data_manager import DataManager
+from backend.decoding_stage import DecodingStage
+from backend.emg_decoder import EmgPacketDecoder
 from backend.emg_signal import EMGSignal, build_metadata
+from backend.feature_extractors.snr import StreamingSNR
 from band_interface.gforce import DataNotifFlags, GForceProfile, NotifDataType
 from cloud_storage.drive_manager import GoogleDriveManager
 from visualizers import draw
@@ -28,14 +33,9 @@ def get_firmware_version_cb(resp, firmware_version):
     print(f"Firmware version: {firmware_version}")
 
 
-# Packet counter and start time for EMG data
-packet_cnt = 0
-start_time = 0
-
-
 # Data handling function
 def ondata(data, connector):
-    global packet_cnt, start_time
+    received_at = time.perf_counter()
 
     if len(data) > 0:
         if data[0] == NotifDataType["NTF_QUAT_FLOAT_DATA"] and len(data) == 17:
@@ -44,24 +44,13 @@ def ondata(data, connector):
             print("quaternion:", quaternion)
             connector.quaternionDataReceived.emit(quaternion)  # Emitting signal for quaternion data
 
-        elif data[0] == NotifDataType["NTF_EMG_ADC_DATA"] and len(data) == 129:
-            if start_time == 0:
-                start_time = time.time()
-
-            packet_cnt += 1
-
-            if packet_cnt % 100 == 0:
-                period = time.time() - start_time
-                sample_rate = 100 * 16 / period  # 16 means repeat times in one packet
-                byte_rate = 100 * len(data) / period
-                print(f"----- sample_rate:{sample_rate}, byte_rate:{byte_rate}")
-                start_time = time.time()
-
-            emg_data = list(data[1:129])
-
-            connector.emg_signal.add_data_row(emg_data)
+        elif data[0] == NotifDataType["NTF_EMG_ADC_DATA"] and len(data) == connector.emg_decoder.payload_length + 1:
+            # Only stage the raw bytes here, decoding and publishing is done in batches by the decoding stage
+            connector.emg_stage.push(data[1:], received_at)
+            connector.metrics.on_packet(len(data), connector.emg_decoder.samples_per_packet)
 
-            connector.emgDataReceived.emit(emg_data)  # Emitting signal for EMG data
+        elif data[0] == NotifDataType["NTF_EMG_ADC_DATA"]:
+            connector.metrics.on_invalid_packet()
 
         elif data[0] == NotifDataType["NTF_EMG_GEST_DATA"]:
             if len(data) == 2:
@@ -75,17 +64,23 @@ def ondata(data, connector):
 
 class Connector(QObject):
     firmwareVersionReceived = Signal(str)
-    emgDataReceived = Signal(list)
+    emgDataReceived = Signal(object)
     quaternionDataReceived = Signal(list)
 
-    def __init__(self):
+    RECORDING_FORMATS = ('.gz', ChunkedDataset.FORMAT)  # pickled DataFrames (older recordings) and chunked datasets
+
+    def __init__(self, gforce: GForceProfile = None):
         super().__init__()
-        self.GF = GForceProfile()
+        self.GF = gforce if gforce is not None else GForceProfile()
 
         self.experiment_metadata = None
 
         self.data_manager = DataManager()
         self.emg_signal = None
+        self.emg_decoder = None
+        self.emg_stage = None
+        self.snr = None
+        self.metrics = self._new_metrics()
 
         self.drive_manager = None  # initialize on demand
 
@@ -125,16 +120,31 @@ class Connector(QObject):
         time.sleep(3)
         self.GF.setMotor(False, set_cmd_cb, 1000)
 
+    def _new_metrics(self):
+        metrics = AcquisitionMetrics()
+        metrics.attach_reassembler(self.GF.notifReassembler)
+        metrics.add_gauge('send_queue', self.GF.send_queue.qsize)
+        return metrics
+
     def start_quaternion_notifications(self):
+        self.metrics = self._new_metrics()
         self.GF.setDataNotifSwitch(DataNotifFlags["DNF_QUATERNION"], set_cmd_cb, 1000)
         self.GF.startDataNotification(lambda data: ondata(data, self))
 
     def stop_notifications(self):
         self.GF.stopDataNotification()
         self.GF.setDataNotifSwitch(DataNotifFlags["DNF_OFF"], set_cmd_cb, 1000)
+        if self.emg_stage is not None:
+            self.emg_stage.stop()  # returns once the worker has published every staged packet and exited
+            self.emg_stage = None
+        snr, self.snr = self.snr, None  # the worker was the only one updating it
+        print(self.metrics.summary())
 
         data = self.emg_signal.signal
-        metadata = self.emg_signal.metadata
+        metadata = dict(self.emg_signal.metadata)
+        if snr is not None:
+            # Estimated live, no pass over the recording needed
+            metadata['snr_db'] = [round(float(value), 2) for value in snr.snr()]
         self.data_manager.store_dataset(data, metadata)
         self.emg_signal = None  # Free the memory
 
@@ -145,6 +155,7 @@ class Connector(QObject):
         self.GF.setEmgRawDataConfig(sampRate, channelMask, dataLen, resolution, cb=set_cmd_cb, timeout=1000)
 
     def start_gesture_notifications(self, gesture_type):
+        self.metrics = self._new_metrics()
         if gesture_type == 0:
             self.GF.setDataNotifSwitch(DataNotifFlags["DNF_EMG_GESTURE"], set_cmd_cb, 1000)
         else:
@@ -164,11 +175,24 @@ class Connector(QObject):
             self.GF.setDataNotifSwitch(DataNotifFlags["DNF_EMG_RAW"], set_cmd_cb, 1000)
 
             self.emg_signal = EMGSignal(metadata=self.experiment_metadata)
+            self.emg_decoder = EmgPacketDecoder.from_metadata(self.experiment_metadata)
+            self.metrics = self._new_metrics()
+            self.snr = StreamingSNR(sampling_rate=self.experiment_metadata['band']['sampling_rate'])
+            self.emg_stage = DecodingStage(self.emg_decoder, self.emg_signal, on_block=self._on_emg_block,
+                                           metrics=self.metrics)
+            self.metrics.add_gauge('decoding_stage', self.emg_stage.pending)
+            self.metrics.add_gauge('emg_signal', self.emg_signal.buffered_samples)
+            self.emg_stage.start()
 
             self.GF.startDataNotification(lambda data: ondata(data, self))
         else:
             print("EMG configuration is not set. Call configure_emg_raw_data first.")
 
+    def _on_emg_block(self, emg_data):
+        # Runs on the decoding stage worker, once per batch of packets
+        self.snr.update(emg_data)
+        self.emgDataReceived.emit(emg_data)  # Emitting signal for EMG data, a (samples x channels) array
+
     def fetch_data(self):
         # Placeholder for data fetching logic
         # Replace with actual data fetching logic
@@ -209,21 +233,30 @@ class Connector(QObject):
     def get_all_csv_files(self):
         base_path = Path("assets/")
 
+        # Genders of the cataloged datasets come from one query, only other files need their metadata read
+        genders = {entry['folder'].resolve(): str(entry['gender'] or 'Unknown').capitalize()
+                   for entry in self.data_manager.list_dataset_entries()}
+
         files_and_genders = []
-        for file in base_path.rglob("*.gz"):  # More efficient to filter directly in rglob
-            gender = self.get_gender_from_metadata(file)
-            files_and_genders.append((file, gender))
+        for file in base_path.rglob("*"):
+            if file.name.endswith(self.RECORDING_FORMATS):
+                gender = genders.get(file.parent.resolve()) or self.get_gender_from_metadata(file)
+                files_and_genders.append((file, gender))
         return files_and_genders
 
     def get_local_datasets_IDs(self):
         return self.data_manager.list_datasets()
 
     def get_local_dataset_description(self, dataset_id):
-        metadata = self.data_manager.load_metadata(dataset_id)
+        metadata = self.data_manager.dataset_entry(dataset_id)['metadata']
         description = f'[{dataset_id}] {metadata}'
 
         return description
 
+    def get_local_dataset_descriptions(self):
+        """Descriptions of all the local datasets, listed from the dataset catalog at once."""
+        return [f'[{entry["dataset_id"]}] {entry["metadata"]}' for entry in self.data_manager.list_dataset_entries()]
+
     def ensure_drive_login(self):
         if self.drive_manager is None:
             self.drive_manager = GoogleDriveManager()
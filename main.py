@@ -186,10 +186,9 @@ class MainWindow(QMainWindow):
             self.ui.data_list.addItem(item)
 
     def load_local_files(self):
-        local_datasets_IDs = self.connector.get_local_datasets_IDs()
+        local_dataset_descriptions = self.connector.get_local_dataset_descriptions()
         self.ui.list_local_files.clear()
-        for dataset_id in local_datasets_IDs:
-            description = self.connector.get_local_dataset_description(dataset_id)
+        for description in local_dataset_descriptions:
             item = QListWidgetItem(description)
             self.ui.list_local_files.addItem(item)
 
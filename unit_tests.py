@@ -180,6 +180,34 @@ class TestConnector(unittest.TestCase):
             1000, 0xFF, 16, 12, cb=set_cmd_cb, timeout=1000
         )
 
+    def test_stop_notifications_stores_the_live_snr(self):
+        self.connector.emg_signal = EMGSignal(pd.DataFrame(np.full((1000, 2), 128, dtype=np.uint8)),
+                                              metadata={'band': {'sampling_rate': 500}})
+        self.connector.snr = StreamingSNR(sampling_rate=500)
+        self.connector.snr.update(np.random.default_rng(0).integers(0, 256, size=(1000, 2)))
+
+        self.connector.stop_notifications()
+
+        data, metadata = self.connector.data_manager.store_dataset.call_args.args
+        self.assertEqual(len(metadata['snr_db']), 2)
+        self.assertIsNone(self.connector.snr)
+
+    def test_stop_notifications_waits_for_the_decoding_stage(self):
+        self.connector.emg_signal = EMGSignal(metadata={'band': {'sampling_rate': 500, 'resolution': 8}})
+        self.connector.snr = StreamingSNR(sampling_rate=500)
+        on_block = self.connector._on_emg_block
+        self.connector.emg_stage = DecodingStage(EmgPacketDecoder(), self.connector.emg_signal, batch_packets=1,
+                                                 on_block=lambda block: (time.sleep(0.005), on_block(block)))
+        for packet in range(300):  # longer to publish than the old one-second stop timeout
+            self.connector.emg_stage.push(bytes([packet % 256]) * 128)
+        self.connector.emg_stage.start()
+
+        self.connector.stop_notifications()
+
+        data, metadata = self.connector.data_manager.store_dataset.call_args.args
+        self.assertEqual(len(data), 300 * 16)
+        self.assertEqual(len(metadata['snr_db']), 8)
+
     @patch('yaml.safe_load', return_value={'subject': {'gender': 'm'}})
     @patch('builtins.open', new_callable=mock_open, read_data="{'subject': {'gender': 'm'}}")
     def test_get_gender_from_metadata(self, mock_open, mock_yaml):
@@ -204,6 +232,1051 @@ class TestConnector(unittest.TestCase):
 
 
 
+import asyncio
+import sqlite3
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from backend.acquisition_metrics import AcquisitionMetrics
+from backend.channel_executor import ChannelExecutor
+from backend.chunked_dataset import ChunkedDataset
+from backend.decoding_stage import DecodingStage
+from backend.emg_decoder import EmgPacketDecoder
+from backend.data_manager import DataManager
+from backend.dataset_catalog import DatasetCatalog
+from backend.emg_signal import EMGSignal, narrow_raw_data
+from backend.feature_cache import FeatureCache
+from backend.feature_extractor import FeatureExtractor
+from backend.feature_extractors.snr import StreamingSNR
+from backend.feature_extractors.time_domain import TimeDomainFeatures
+from backend.filter_plan import FilterPlan
+from backend.filters.elementwise import Gain, Offset, Rectify
+from backend.filters.iir import IIRFilter
+from backend.filters.sample import Sample
+from backend.ring_buffer import RingBuffer
+from backend.signal_store import SignalStore
+from band_interface.gforce import DataNotifFlags, GF_RET_CODE, GForceProfile, PacketReassembler, TimeoutScheduler
+from band_interface.gforce_async import AsyncGForceProfile, GForceCommandError
+from band_interface.gforce_simulator import SimulatedGForce, _pack12
+from band_interface.multi_band_session import BandStream, MultiBandSession
+
+
+def _partial(packet_id, content):
+    return bytes([0xFF, packet_id]) + content
+
+
+class TestPacketReassembler(unittest.TestCase):
+
+    def setUp(self):
+        self.reassembler = PacketReassembler(capacity=4)
+
+    def test_reassembles_fragments_into_read_only_view(self):
+        self.assertIsNone(self.reassembler.feed(_partial(2, b'ab')))
+        self.assertIsNone(self.reassembler.feed(_partial(1, b'cd')))
+        packet = self.reassembler.feed(_partial(0, b'ef'))
+
+        self.assertEqual(bytes(packet), b'abcdef')
+        self.assertTrue(packet.readonly)
+        self.assertEqual(self.reassembler.completedPackets, 1)
+
+    def test_counts_lost_and_out_of_order_fragments(self):
+        self.reassembler.feed(_partial(3, b'a'))
+        self.assertIsNone(self.reassembler.feed(_partial(1, b'c')))
+        self.assertIsNone(self.reassembler.feed(_partial(0, b'd')))
+        self.assertEqual(self.reassembler.lostFragments, 1)
+
+        self.reassembler.feed(_partial(2, b'x'))
+        self.reassembler.feed(_partial(3, b'y'))
+        self.assertEqual(self.reassembler.outOfOrderFragments, 1)
+        self.assertEqual(self.reassembler.droppedPackets, 2)
+
+
+
+class TestTimeoutScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = TimeoutScheduler()
+
+    def tearDown(self):
+        self.scheduler.shutdown()
+
+    def test_fires_in_deadline_order_and_skips_cancelled(self):
+        fired = []
+        done = threading.Event()
+
+        self.scheduler.schedule(0.03, lambda: (fired.append('late'), done.set()))
+        cancelled = self.scheduler.schedule(0.01, fired.append, 'cancelled')
+        self.scheduler.schedule(0.02, fired.append, 'early')
+        self.scheduler.cancel(cancelled)
+
+        self.assertTrue(done.wait(1))
+        self.assertEqual(fired, ['early', 'late'])
+        self.assertEqual(len(self.scheduler), 0)
+
+    def test_shutdown_ends_the_thread(self):
+        self.scheduler.schedule(10, print, 'never fired')
+        thread = self.scheduler._thread
+        self.scheduler.shutdown()
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(self.scheduler), 0)
+
+        fired = threading.Event()
+        self.scheduler.schedule(0.01, fired.set)
+        self.assertTrue(fired.wait(1))
+
+
+
+class _DelayedResponseProfile:
+    """Answers every command from another thread after a fixed delay, like the band does."""
+    LATENCY = 0.1
+
+    def _respond(self, cb, *values):
+        threading.Timer(self.LATENCY, cb, args=values).start()
+        return GF_RET_CODE.GF_SUCCESS
+
+    def getControllerFirmwareVersion(self, cb, timeout):
+        return self._respond(cb, 0, '2.1.0')
+
+    def getFeatureMap(self, cb, timeout):
+        return self._respond(cb, 0, 0xFF)
+
+    def getEmgRawDataConfig(self, cb, timeout):
+        return self._respond(cb, 0, 500, 0xFF, 128, 8)
+
+    def setLED(self, switchStatus, cb, timeout):
+        return self._respond(cb, 4)
+
+
+class TestAsyncGForceProfile(unittest.TestCase):
+
+    def setUp(self):
+        self.gforce = AsyncGForceProfile(_DelayedResponseProfile())
+
+    def test_interrogate_pipelines_commands(self):
+        started = time.perf_counter()
+        info = asyncio.run(self.gforce.interrogate())
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(info['firmware_version'], '2.1.0')
+        self.assertEqual(info['emg_config']['sampling_rate'], 500)
+        self.assertLess(elapsed, 2.5 * _DelayedResponseProfile.LATENCY)
+
+    def test_failed_response_raises(self):
+        with self.assertRaises(GForceCommandError):
+            asyncio.run(self.gforce.set_led(True))
+
+
+
+class TestSimulatedGForce(unittest.TestCase):
+
+    def setUp(self):
+        self.band = SimulatedGForce(packet_rate=1000, fragment_size=40, seed=0)
+        self.gforce = GForceProfile(device=self.band)
+        self.gforce.connect('simulator')
+
+    def tearDown(self):
+        self.gforce.disconnect()
+
+    def test_answers_commands(self):
+        info = asyncio.run(AsyncGForceProfile(self.gforce).interrogate())
+        self.assertEqual(info['firmware_version'], SimulatedGForce.FIRMWARE_VERSION)
+        self.assertEqual(info['emg_config']['channels'], 128)
+
+    def test_disconnect_stops_the_timeout_thread(self):
+        asyncio.run(AsyncGForceProfile(self.gforce).set_led(True))
+        thread = self.gforce.timeoutScheduler._thread
+        self.assertTrue(thread.is_alive())
+
+        self.gforce.disconnect()
+        self.assertFalse(thread.is_alive())
+
+    def test_streams_fragmented_emg_packets(self):
+        packets = []
+        received = threading.Event()
+
+        def on_data(data):
+            packets.append(bytes(data))
+            if len(packets) == 20:
+                received.set()
+
+        asyncio.run(AsyncGForceProfile(self.gforce).set_data_notif_switch(DataNotifFlags['DNF_EMG_RAW']))
+        self.gforce.startDataNotification(on_data)
+
+        self.assertTrue(received.wait(2))
+        self.assertTrue(all(len(packet) == 129 for packet in packets))
+
+    def test_notifications_are_switched_on_the_io_thread(self):
+        writers = []
+        write = self.band.writeCharacteristic
+
+        def record_writer(*args, **kwargs):
+            writers.append(threading.current_thread())
+            return write(*args, **kwargs)
+
+        with patch.object(self.band, 'writeCharacteristic', side_effect=record_writer):
+            self.assertEqual(self.gforce.startDataNotification(lambda data: None), GF_RET_CODE.GF_SUCCESS)
+            self.assertTrue(self.band.notificationsEnabled)
+            self.assertEqual(self.gforce.stopDataNotification(), GF_RET_CODE.GF_SUCCESS)
+
+        self.assertFalse(self.band.notificationsEnabled)
+        self.assertEqual(writers, [self.gforce.ioLoop._thread] * 2)
+
+
+
+class TestMultiBandSession(unittest.TestCase):
+
+    def test_merges_bands_on_a_common_timeline(self):
+        session = MultiBandSession(gforce_factory=lambda: GForceProfile(device=SimulatedGForce(packet_rate=200)))
+        session.connect({'left': 'simulator-1', 'right': 'simulator-2'})
+        try:
+            session.configure_emg(500, 0xFF, 128, 8)
+            session.start()
+            time.sleep(0.5)
+            session.stop()
+
+            merged = session.merged_signal()
+            stats = session.stats()
+        finally:
+            session.disconnect()
+
+        self.assertEqual(list(merged.columns.levels[0]), ['left', 'right'])
+        self.assertEqual(merged.shape[1], 16)
+        self.assertGreater(len(merged), 0)
+        self.assertGreater(stats['left']['packets'], 0)
+        self.assertGreater(stats['right']['packets_per_s'], 0)
+
+    def test_sample_times_skip_the_samples_of_lost_packets(self):
+        band = BandStream('left', gforce=None)
+        band.configure({'sampling_rate': 500, 'channel_mask': 0xFF, 'channels': 128, 'resolution': 8})
+        samples_per_packet = band.decoder.samples_per_packet
+        packet_duration = samples_per_packet / 500
+
+        rng = np.random.default_rng(0)
+        sent = 10 + np.arange(1, 101) * packet_duration  # once the last sample of the packet is taken
+        jitter = rng.uniform(0, 0.45 * packet_duration, size=100)
+        jitter[::10] = 0
+        received = np.setdiff1d(np.arange(100), [40, 41, 42, 77])
+        arrivals = np.repeat(sent[received] + 0.005 + jitter[received], samples_per_packet)
+
+        sample_times = band.sample_times(arrivals)
+
+        taken = (received[:, np.newaxis] * samples_per_packet + np.arange(samples_per_packet)).ravel()
+        np.testing.assert_allclose(sample_times, 10.005 + taken / 500, atol=1e-9)
+
+    def test_merged_signal_marks_the_samples_of_lost_packets(self):
+        session = MultiBandSession()
+        session._started_at = 10
+        for name, lost_packets in [('left', [20, 21]), ('right', [])]:
+            band = session.bands[name] = BandStream(name, gforce=None)
+            band.on_data(bytes(129))  # before the band is configured, dropped
+            band.configure({'sampling_rate': 500, 'channel_mask': 0xFF, 'channels': 128, 'resolution': 8})
+            received = [packet for packet in range(50) if packet not in lost_packets]
+            band._packets = [(10 + (packet + 1) * 0.032, bytes([packet]) * 128) for packet in received]
+
+        merged = session.merged_signal()
+        lost = session.lost_samples()
+
+        self.assertEqual(len(merged), len(lost))
+        self.assertFalse(lost['right'].any())
+        # Packets 20 and 21 held samples 320-351
+        self.assertEqual(lost.index[lost['left']].tolist(), merged.index[320:352].tolist())
+        self.assertEqual(session.to_emg_signal().metadata['bands']['left']['lost_samples'], 32)
+
+
+
+class TestAcquisitionMetrics(unittest.TestCase):
+
+    def test_snapshot_reports_totals_session_errors_and_latency(self):
+        reassembler = PacketReassembler()
+        reassembler.feed(_partial(2, b'a'))
+        reassembler.feed(_partial(0, b'c'))  # lost fragment before the session started
+
+        metrics = AcquisitionMetrics()
+        metrics.attach_reassembler(reassembler)
+        metrics.add_gauge('queue', lambda: 3)
+        for _ in range(10):
+            metrics.on_packet(129, 16)
+            metrics.record_latency(0.0003)
+        reassembler.feed(_partial(3, b'a'))
+        reassembler.feed(_partial(0, b'd'))
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['packets'], 10)
+        self.assertEqual(snapshot['samples'], 160)
+        self.assertEqual(snapshot['bytes'], 1290)
+        self.assertEqual(snapshot['dropped_fragments'], 2)
+        self.assertEqual(snapshot['queue_depths'], {'queue': 3})
+        self.assertAlmostEqual(snapshot['latency_p99'], 512e-6)
+
+    def test_readers_get_their_own_rates(self):
+        with patch('backend.acquisition_metrics.time.monotonic', side_effect=[100, 102, 103, 104, 104]):
+            metrics = AcquisitionMetrics()
+            for _ in range(10):
+                metrics.on_packet(129, 16)
+            polled = metrics.snapshot()
+            metrics.summary()  # another reader in between
+            for _ in range(20):
+                metrics.on_packet(129, 16)
+
+            self.assertEqual(metrics.snapshot(polled)['packets_per_s'], 10.0)
+            self.assertEqual(metrics.snapshot()['packets_per_s'], 7.5)
+
+
+
+
+class TestEmgPacketDecoder(unittest.TestCase):
+
+    def test_decodes_8_bit_packets_into_samples_by_channels(self):
+        decoder = EmgPacketDecoder(channel_mask=0xFF, channels=128, resolution=8)
+        samples = decoder.decode(bytes(range(128)))
+
+        self.assertEqual(samples.shape, (16, 8))
+        self.assertEqual(samples.dtype, np.uint8)
+        self.assertEqual(list(samples[1]), list(range(8, 16)))
+        self.assertEqual(list(samples[:, 2]), list(range(2, 128, 8)))
+
+    def test_unpacks_12_bit_packets_of_masked_channels(self):
+        decoder = EmgPacketDecoder(channel_mask=0b1011, channels=128, resolution=12)
+        expected = np.arange(decoder.samples_per_packet * 3, dtype=np.uint16).reshape(-1, 3) * 97 % 4096
+        payload = _pack12(expected.ravel()).ljust(128, b'\x00')
+
+        self.assertEqual(decoder.channel_ids, [0, 1, 3])
+        self.assertEqual(decoder.samples_per_packet, 28)
+        np.testing.assert_array_equal(decoder.decode_many(payload * 2), np.vstack([expected, expected]))
+
+
+
+
+class TestDecodingStage(unittest.TestCase):
+
+    def test_publishes_staged_packets_in_order_and_drops_on_overflow(self):
+        emg_signal = EMGSignal()
+        blocks = []
+        stage = DecodingStage(EmgPacketDecoder(), emg_signal, batch_packets=4, capacity=8, on_block=blocks.append)
+
+        for packet in range(10):
+            stage.push(bytes([packet]) * 128)
+        self.assertEqual(stage.dropped_packets, 2)
+
+        stage.start()
+        stage.stop()
+
+        self.assertEqual([len(block) for block in blocks], [64, 64])
+        signal = emg_signal.signal
+        self.assertEqual(signal.shape, (128, 8))
+        self.assertEqual(list(signal[0].iloc[::16]), list(range(8)))
+
+    def test_stop_waits_until_every_packet_is_published(self):
+        emg_signal = EMGSignal()
+        stage = DecodingStage(EmgPacketDecoder(), emg_signal, batch_packets=1, capacity=64,
+                              on_block=lambda block: time.sleep(0.01))
+        for packet in range(50):
+            stage.push(bytes([packet]) * 128)
+        stage.start()
+
+        with self.assertRaises(TimeoutError):
+            stage.stop(timeout=0.05)
+        stage.stop()
+
+        self.assertEqual(stage.pending(), 0)
+        self.assertEqual(len(emg_signal.signal), 50 * 16)
+
+
+
+
+class TestRingBuffer(unittest.TestCase):
+
+    @staticmethod
+    def _block(start, count):
+        return np.arange(start, start + count).repeat(2).reshape(-1, 2)
+
+    def test_drop_newest_keeps_buffered_samples(self):
+        buffer = RingBuffer(capacity=8, channels=2, dtype=np.int64)
+        buffer.write(self._block(0, 6))
+        self.assertEqual(buffer.write(self._block(6, 4)), 2)
+
+        self.assertEqual(buffer.dropped_samples, 2)
+        self.assertEqual(list(buffer.read_block()[:, 0]), list(range(8)))
+
+    def test_drop_oldest_wraps_and_skips_overwritten_samples(self):
+        buffer = RingBuffer(capacity=8, channels=2, dtype=np.int64, overflow='drop_oldest')
+        buffer.write(self._block(0, 5))
+        buffer.read_block(3)
+        buffer.write(self._block(5, 9))
+
+        self.assertEqual(buffer.dropped_samples, 3)
+        self.assertEqual(list(buffer.read_block()[:, 1]), list(range(6, 14)))
+        self.assertEqual(len(buffer), 0)
+
+    def test_concurrent_producer_and_consumer_see_every_sample_in_order(self):
+        buffer = RingBuffer(capacity=64, channels=2, dtype=np.int64, overflow='block')
+        received = []
+
+        def produce():
+            for start in range(0, 20000, 16):
+                buffer.write(self._block(start, 16))
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+        while producer.is_alive() or len(buffer):
+            received.append(buffer.read_block())
+        producer.join()
+
+        samples = np.concatenate(received)
+        np.testing.assert_array_equal(samples[:, 0], np.arange(20000))
+        self.assertEqual(buffer.dropped_samples, 0)
+
+
+
+
+class TestEMGSignalStorage(unittest.TestCase):
+
+    def test_signal_is_cached_until_new_samples_arrive(self):
+        emg_signal = EMGSignal(buffer_capacity=256)
+        for packet in range(100):
+            emg_signal.add_data_block(np.full((16, 8), packet, dtype=np.uint8))
+            if packet % 10 == 0:
+                emg_signal.signal  # drains the ring buffer into the store
+
+        signal = emg_signal.signal
+        self.assertIs(emg_signal.signal, signal)
+        self.assertEqual(signal.shape, (1600, 8))
+        self.assertEqual(list(signal[0].iloc[::16]), list(range(100)))
+        self.assertEqual(emg_signal.buffer.dropped_samples, 0)
+
+        emg_signal.add_data_row([1] * 8)
+        self.assertEqual(len(emg_signal.signal), 1601)
+
+    def test_initial_data_is_held_once(self):
+        data = pd.DataFrame(np.arange(80, dtype=np.uint8).reshape(10, 8), index=pd.RangeIndex(100, 110))
+        emg_signal = EMGSignal(data)
+
+        signal = emg_signal.signal
+        self.assertTrue(np.shares_memory(signal.to_numpy(), emg_signal._store.values()))
+        self.assertFalse(np.shares_memory(signal.to_numpy(), data.to_numpy()))
+        pd.testing.assert_frame_equal(signal, data)
+
+    def test_store_grows_geometrically_and_upcasts(self):
+        store = SignalStore(2, np.uint8, capacity=4)
+        for _ in range(100):
+            store.append(np.ones((3, 2), dtype=np.uint8))
+        store.append(np.full((1, 2), 0.5))
+
+        self.assertEqual(len(store), 301)
+        self.assertEqual(store.capacity, 512)
+        self.assertEqual(store.dtype, np.float64)
+        self.assertTrue(np.shares_memory(store.to_frame().to_numpy(), store.values()))
+
+    def test_long_recording_spills_to_memory_mapped_file(self):
+        emg_signal = EMGSignal(buffer_capacity=256, spill_bytes=4096)
+        for packet in range(1000):  # never read while recording, the buffer alone would overflow
+            emg_signal.add_data_block(np.full((16, 8), packet % 256, dtype=np.uint8))
+
+        self.assertTrue(emg_signal._store.spilled)
+        self.assertEqual(emg_signal.buffer.dropped_samples, 0)
+        signal = emg_signal.signal
+        self.assertEqual(signal.shape, (16000, 8))
+        self.assertEqual(list(signal[7].iloc[::16]), [packet % 256 for packet in range(1000)])
+
+
+
+
+class TestSignalWindows(unittest.TestCase):
+
+    def test_batch_windows_are_strided_views(self):
+        data = pd.DataFrame(np.arange(40).reshape(10, 4), columns=['a', 'b', 'c', 'd'])
+        emg_signal = EMGSignal(data)
+
+        windows = list(emg_signal.windows(size=4, hop=3, channels=['b', 'c']))
+
+        self.assertEqual(len(windows), 3)
+        self.assertEqual(windows[1].shape, (4, 2))
+        self.assertEqual(list(windows[1][:, 0]), [13, 17, 21, 25])
+        self.assertTrue(np.shares_memory(windows[0], windows[1]))
+        self.assertFalse(windows[0].flags.writeable)
+
+    def test_live_windows_follow_new_samples(self):
+        emg_signal = EMGSignal(buffer_capacity=1024)
+
+        def produce():
+            for start in range(0, 100, 10):
+                emg_signal.add_data_block(np.arange(start, start + 10).repeat(2).reshape(-1, 2))
+                time.sleep(0.005)
+
+        producer = threading.Thread(target=produce)
+        producer.start()
+        starts = []
+        for window in emg_signal.windows(size=20, hop=10, live=True):
+            starts.append(window[0, 0])
+            if len(starts) == 9:
+                break
+        producer.join()
+
+        self.assertEqual(starts, list(range(0, 90, 10)))
+
+
+
+
+class TestSignalSubscriptions(unittest.TestCase):
+
+    @staticmethod
+    def _publish(emg_signal, start, count):
+        emg_signal.add_data_block(np.arange(start, start + count).reshape(-1, 1))
+        emg_signal.publish()
+
+    def test_subscribers_and_dataframe_see_every_sample(self):
+        emg_signal = EMGSignal(buffer_capacity=1024)
+        plot, writer = emg_signal.subscribe('plot'), emg_signal.subscribe('writer')
+
+        self._publish(emg_signal, 0, 10)
+        self.assertEqual(list(plot.poll()[:, 0]), list(range(10)))
+        self._publish(emg_signal, 10, 10)
+
+        self.assertEqual(list(plot.poll()[:, 0]), list(range(10, 20)))
+        self.assertEqual(list(writer.poll()[:, 0]), list(range(20)))
+        self.assertEqual(len(emg_signal.signal), 20)
+
+    def test_slow_consumer_policies(self):
+        emg_signal = EMGSignal(buffer_capacity=1024)
+        oldest = emg_signal.subscribe(policy='drop_oldest', max_lag=15)
+        latest = emg_signal.subscribe(policy='skip_to_latest', max_lag=15)
+
+        for start in range(0, 40, 10):
+            self._publish(emg_signal, start, 10)
+
+        self.assertEqual(list(oldest.poll()[:, 0]), list(range(25, 40)))
+        self.assertEqual(list(latest.poll()[:, 0]), list(range(30, 40)))
+        self.assertEqual((oldest.skipped_samples, latest.skipped_samples), (25, 30))
+
+    def test_blocking_consumer_holds_back_the_publisher(self):
+        emg_signal = EMGSignal(buffer_capacity=1024)
+        subscription = emg_signal.subscribe(policy='block', max_lag=10, block_timeout=5)
+        self._publish(emg_signal, 0, 10)
+
+        publisher = threading.Thread(target=self._publish, args=(emg_signal, 10, 10))
+        publisher.start()
+        publisher.join(0.1)
+        self.assertTrue(publisher.is_alive())
+        self.assertEqual(emg_signal.published_samples(), 10)
+
+        self.assertEqual(len(subscription.get(timeout=1)), 10)
+        publisher.join(1)
+        self.assertEqual(list(subscription.get(timeout=1)[:, 0]), list(range(10, 20)))
+
+    def test_streams_are_independent(self):
+        emg_signal = EMGSignal(buffer_capacity=1024)
+
+        async def consume(count):
+            received = 0
+            async for samples in emg_signal.stream():
+                received += len(samples)
+                if received >= count:
+                    return received
+
+        async def run():
+            consumers = [asyncio.ensure_future(consume(30)) for _ in range(2)]
+            await asyncio.sleep(0.02)
+            for start in range(0, 30, 10):
+                emg_signal.add_data_block(np.arange(start, start + 10).reshape(-1, 1))
+                await asyncio.sleep(0.02)
+            return await asyncio.gather(*consumers)
+
+        self.assertEqual(asyncio.run(run()), [30, 30])
+
+
+
+
+class TestStreamingFilters(unittest.TestCase):
+
+    def setUp(self):
+        self.samples = np.random.default_rng(0).integers(0, 256, size=(1000, 8)).astype(np.uint8)
+        self.bandpass = IIRFilter.butterworth(4, (20, 200), 'bandpass', sampling_rate=500)
+
+    def test_online_filtering_matches_the_batch_path(self):
+        batch = IIRFilter(self.bandpass.sos).filter(pd.DataFrame(self.samples))
+
+        emg_signal = EMGSignal(buffer_capacity=4096)
+        emg_signal.schedule_filter(self.bandpass)
+        emg_signal.schedule_filter(IIRFilter.notch(50, 30, sampling_rate=500))
+        for start in range(0, 1000, 16):
+            emg_signal.add_data_block(self.samples[start:start + 16])
+            emg_signal.publish()
+
+        with patch.object(IIRFilter, 'filter') as batch_filter:
+            emg_signal.apply_filters()
+        batch_filter.assert_not_called()
+
+        expected = IIRFilter.notch(50, 30, sampling_rate=500).filter(batch)
+        np.testing.assert_allclose(emg_signal.signal.to_numpy(), expected.to_numpy(), atol=1e-9)
+
+    def test_filters_scheduled_after_acquisition_run_as_a_compiled_plan(self):
+        emg_signal = EMGSignal(pd.DataFrame(self.samples))
+        emg_signal.schedule_filter(self.bandpass)
+        rectify = Rectify()
+        emg_signal.schedule_filter(rectify)
+
+        with patch.object(FilterPlan, 'compile', wraps=FilterPlan.compile) as compile_plan:
+            emg_signal.apply_filters()
+        compile_plan.assert_called_once_with([self.bandpass, rectify])
+
+        expected = rectify.filter(self.bandpass.filter(pd.DataFrame(self.samples)))
+        self.assertEqual(emg_signal.signal.dtypes.unique().tolist(), [np.float32])
+        np.testing.assert_allclose(emg_signal.signal.to_numpy(), expected.to_numpy(), atol=1e-3)
+
+
+
+    def test_filters_applied_during_acquisition_stay_attached(self):
+        emg_signal = EMGSignal(buffer_capacity=4096)
+        emg_signal.schedule_filter(Offset(128))
+        for start in range(0, 1000, 16):
+            emg_signal.add_data_block(self.samples[start:start + 16])
+            emg_signal.publish()
+            if start == 480:
+                emg_signal.apply_filters()
+                emg_signal.schedule_filter(self.bandpass)
+            elif start == 720:
+                emg_signal.apply_filters()
+
+        expected = self.bandpass.filter(Offset(128).filter(pd.DataFrame(self.samples)))
+        self.assertEqual(emg_signal.signal.dtypes.unique().tolist(), [FilterPlan.DTYPE])
+        np.testing.assert_allclose(emg_signal.signal.to_numpy(), expected.to_numpy(), atol=1e-3)
+
+    def test_only_streaming_filters_are_applied_to_live_signals(self):
+        emg_signal = EMGSignal(buffer_capacity=4096)
+        emg_signal.add_data_block(self.samples)
+        emg_signal.schedule_filter(Sample())
+        with self.assertRaises(RuntimeError):
+            emg_signal.apply_filters()
+
+        recorded = EMGSignal(pd.DataFrame(self.samples))
+        recorded.schedule_filter(self.bandpass)
+        recorded.apply_filters()
+        with self.assertRaises(RuntimeError):
+            recorded.add_data_block(self.samples)
+
+
+class TestFilterPlan(unittest.TestCase):
+
+    def test_compiled_chain_matches_stage_by_stage_filtering(self):
+        data = pd.DataFrame(np.random.default_rng(1).integers(0, 256, size=(2000, 8)).astype(np.uint8))
+        filters = [Offset(120), IIRFilter.butterworth(4, (20, 200), 'bandpass', sampling_rate=500),
+                   IIRFilter.notch(50, 30, sampling_rate=500), Rectify(), Gain(0.5)]
+
+        plan = FilterPlan.compile(filters)
+        self.assertEqual(repr(plan), 'FilterPlan([fused(Offset), sos(5 sections), fused(Rectify, Gain)])')
+
+        expected = data
+        for emg_filter in filters:
+            expected = emg_filter.filter(expected)
+        filtered = plan.filter(data)
+
+        self.assertEqual(filtered.dtypes.unique().tolist(), [np.float32])
+        np.testing.assert_allclose(filtered.to_numpy(), expected.to_numpy(), atol=1e-3)
+
+
+
+
+class _ChannelPeaks(FeatureExtractor):
+    per_channel = True
+
+    def extract(self, data):
+        return data.abs().max().to_frame('peak').T
+
+
+class TestChannelExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.data = pd.DataFrame(np.random.default_rng(2).integers(0, 256, size=(5000, 8)).astype(np.uint8))
+        self.plan = FilterPlan.compile([Offset(120), IIRFilter.butterworth(4, (20, 200), 'bandpass', 500),
+                                        Rectify()])
+
+    def test_filtering_does_not_depend_on_the_workers(self):
+        serial = self.plan.filter(self.data)
+        for executor in (ChannelExecutor(workers=3), ChannelExecutor(workers=2, kind='process')):
+            with executor:
+                np.testing.assert_array_equal(self.plan.filter(self.data, executor).to_numpy(), serial.to_numpy())
+
+    def test_per_channel_features_are_extracted_in_parallel(self):
+        extractor = _ChannelPeaks()
+        results = []
+        for executor in (ChannelExecutor.serial(), ChannelExecutor(workers=4)):
+            emg_signal = EMGSignal(self.data, executor=executor)
+            emg_signal.schedule_feature_extraction(extractor)
+            emg_signal.extract_features()
+            results.append(emg_signal.features[extractor])
+            executor.shutdown()
+
+        pd.testing.assert_frame_equal(results[0], results[1])
+        self.assertEqual(list(results[1].columns), list(range(8)))
+
+    def test_applied_filters_run_on_the_executor(self):
+        filters = [Offset(120), IIRFilter.butterworth(4, (20, 200), 'bandpass', 500), Rectify()]
+        expected = self.plan.filter(self.data)
+        with ChannelExecutor(workers=4) as executor:
+            emg_signal = EMGSignal(self.data, executor=executor)
+            for emg_filter in filters:
+                emg_signal.schedule_filter(emg_filter)
+            with patch.object(executor, 'map', wraps=executor.map) as executor_map:
+                emg_signal.apply_filters()
+        executor_map.assert_called()
+        np.testing.assert_array_equal(emg_signal.signal.to_numpy(), expected.to_numpy())
+
+    def test_online_filtering_runs_on_the_executor(self):
+        filters = [Offset(120), IIRFilter.butterworth(4, (20, 200), 'bandpass', 500), Rectify()]
+        expected = self.data
+        for emg_filter in filters:
+            expected = emg_filter.filter(expected)
+        with ChannelExecutor(workers=4) as executor:
+            emg_signal = EMGSignal(buffer_capacity=8192, executor=executor)
+            for emg_filter in filters:
+                emg_signal.schedule_filter(emg_filter)
+            with patch.object(executor, 'map', wraps=executor.map) as executor_map:
+                for start in range(0, len(self.data), 250):
+                    emg_signal.add_data_block(self.data.to_numpy()[start:start + 250])
+                    emg_signal.publish()
+                emg_signal.apply_filters()
+        self.assertEqual(executor_map.call_count, len(self.data) // 250)
+        np.testing.assert_allclose(emg_signal.signal.to_numpy(), expected.to_numpy(), atol=1e-9)
+
+
+
+
+class _CountingPeaks(_ChannelPeaks):
+    calls = 0
+
+    def __init__(self, scale=1):
+        self.scale = scale
+
+    def extract(self, data):
+        _CountingPeaks.calls += 1
+        return super().extract(data) * self.scale
+
+
+class TestFeatureCache(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.cache = FeatureCache(Path(self.folder.name))
+        self.data = pd.DataFrame(np.random.default_rng(3).integers(0, 256, size=(500, 8)))
+        _CountingPeaks.calls = 0
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def _extract(self, data, extractor, filters=()):
+        emg_signal = EMGSignal(data, feature_cache=self.cache)
+        for emg_filter in filters:
+            emg_signal.schedule_filter(emg_filter)
+        if filters:
+            emg_signal.apply_filters()
+        emg_signal.schedule_feature_extraction(extractor)
+        emg_signal.extract_features()
+        return emg_signal.features[extractor]
+
+    def test_features_are_reused_until_an_input_changes(self):
+        first = self._extract(self.data, _CountingPeaks())
+        pd.testing.assert_frame_equal(self._extract(self.data, _CountingPeaks()), first)
+        self.assertEqual((_CountingPeaks.calls, self.cache.hits), (1, 1))
+
+        self._extract(self.data, _CountingPeaks(scale=2))
+        self._extract(self.data, _CountingPeaks(), filters=[Offset(120)])
+        self._extract(self.data + 1, _CountingPeaks())
+        self.assertEqual(_CountingPeaks.calls, 4)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        for key in 'abc':
+            self.cache.put(key, self.data)
+            time.sleep(0.01)
+        entry_size = self.cache.size() // 3
+        self.cache.get('a')
+        self.cache.max_bytes = 2 * entry_size + entry_size // 2
+
+        self.cache.put('d', self.data)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('a'))
+
+
+
+
+class TestTimeDomainFeatures(unittest.TestCase):
+
+    def test_matches_per_window_scalar_features(self):
+        data = pd.DataFrame(np.random.default_rng(4).integers(-128, 128, size=(1003, 3)), columns=['a', 'b', 'c'])
+        features = TimeDomainFeatures(window=100, hop=30).extract(data)
+
+        self.assertEqual(list(features.columns), ['window', 'start', 'channel', 'mav', 'rms', 'zc', 'ssc', 'wl', 'var'])
+        self.assertEqual(len(features), 31 * 3)
+
+        for row in features.sample(10, random_state=0).itertuples():
+            window = data[row.channel].to_numpy()[row.start:row.start + 100].astype(float)
+            self.assertAlmostEqual(row.mav, np.mean(np.abs(window)))
+            self.assertAlmostEqual(row.rms, np.sqrt(np.mean(window ** 2)))
+            self.assertEqual(row.zc, np.count_nonzero(np.diff(np.signbit(window))))
+            self.assertEqual(row.ssc, np.count_nonzero(np.diff(np.signbit(np.diff(window)))))
+            self.assertAlmostEqual(row.wl, np.sum(np.abs(np.diff(window))))
+            self.assertAlmostEqual(row.var, np.var(window), places=6)
+
+
+
+class TestStreamingSNR(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        self.noise = rng.normal(0, 2, size=(20 * 500, 2))
+        bursts = np.zeros_like(self.noise)
+        for start in range(0, len(bursts), 2000):  # 1 s contraction every 4 s
+            bursts[start:start + 500] = rng.normal(0, 20, size=(500, 2))
+        self.data = 100 + self.noise + bursts
+
+    def test_estimates_noise_floor_without_rest_marking(self):
+        snr = StreamingSNR().extract(pd.DataFrame(self.data, columns=['a', 'b']))
+
+        true_snr = 10 * np.log10(np.mean(np.square(self.data - 100), axis=0) / 4)
+        np.testing.assert_allclose(snr.loc['snr_db'], true_snr, atol=1.5)
+
+    def test_incremental_updates_match_whole_recording(self):
+        streaming = StreamingSNR()
+        for block in np.array_split(self.data, 37):
+            streaming.update(block)
+
+        whole = StreamingSNR()
+        whole.update(self.data)
+        np.testing.assert_allclose(streaming.snr(), whole.snr())
+
+
+
+class TestRawDataDtype(unittest.TestCase):
+
+    def test_narrows_to_resolution(self):
+        legacy = pd.DataFrame([[0, 120], [242, 7]], dtype=object)
+        self.assertEqual(set(narrow_raw_data(legacy).dtypes), {np.dtype(np.uint8)})
+        self.assertEqual(set(narrow_raw_data(legacy.astype(np.int64), resolution=12).dtypes), {np.dtype(np.uint16)})
+
+        filtered = pd.DataFrame([[-0.5, 1.5]])
+        self.assertIs(narrow_raw_data(filtered), filtered)
+        out_of_range = pd.DataFrame([[-1, 300]])
+        self.assertEqual(set(narrow_raw_data(out_of_range, resolution=8).dtypes), {np.dtype(np.int64)})
+
+    def test_signal_keeps_raw_samples_narrow_until_filtered(self):
+        signal = EMGSignal(metadata={'band': {'resolution': 8, 'sampling_rate': 500}})
+        for _ in range(10):
+            signal.add_data_row([120, 121, 119])
+        self.assertEqual(set(signal.signal.dtypes), {np.dtype(np.uint8)})
+
+        signal.schedule_filter(Offset(120))
+        signal.apply_filters()
+        self.assertEqual(signal.signal[0].tolist(), [0.0] * 10)
+        self.assertEqual(signal.signal[2].tolist(), [-1.0] * 10)
+
+
+
+class TestChunkedDataset(unittest.TestCase):
+
+    def test_round_trip(self):
+        rng = np.random.default_rng(6)
+        frames = [pd.DataFrame(rng.integers(0, 256, size=(1000, 8), dtype=np.uint8)),
+                  pd.DataFrame(rng.integers(0, 4096, size=(333, 3), dtype=np.uint16), columns=['a', 'b', 'c']),
+                  pd.DataFrame(rng.normal(size=(50, 2)), index=pd.RangeIndex(10, 110, 2)),
+                  pd.DataFrame(np.empty((0, 4), dtype=np.uint8))]
+        with tempfile.TemporaryDirectory() as folder:
+            for number, frame in enumerate(frames):
+                for codec in ChunkedDataset.CODECS:
+                    path = Path(folder) / f'{number}{codec}{ChunkedDataset.FORMAT}'
+                    dataset = ChunkedDataset.write(path, frame, codec, chunk_samples=128)
+                    self.assertEqual(len(dataset.chunks), -(-len(frame) // 128))
+                    pd.testing.assert_frame_equal(ChunkedDataset(path).to_frame(), frame, check_column_type=False)
+
+    def test_reads_both_formats(self):
+        frame = pd.DataFrame(np.arange(40).reshape(10, 4))
+        with tempfile.TemporaryDirectory() as folder:
+            legacy = Path(folder) / 'emg_raw_data.pkl.gz'
+            frame.to_pickle(legacy, compression='gzip')
+            chunked = ChunkedDataset.write(Path(folder) / f'emg_raw_data{ChunkedDataset.FORMAT}', frame).path
+
+            for path in (legacy, chunked):
+                data = DataManager.read_data_file(path)
+                np.testing.assert_array_equal(data.to_numpy(), frame.to_numpy())
+        self.assertFalse(ChunkedDataset.supports(frame.set_index(pd.date_range('2024-01-01', periods=10, freq='2ms'))))
+
+    def test_reads_ranges_of_channels(self):
+        frame = pd.DataFrame(np.random.default_rng(8).integers(0, 4096, size=(1000, 6), dtype=np.uint16),
+                             columns=['a', 'b', 'c', 'd', 'e', 'f'])
+        with tempfile.TemporaryDirectory() as folder:
+            for codec in ChunkedDataset.CODECS:
+                dataset = ChunkedDataset.write(Path(folder) / f'{codec}{ChunkedDataset.FORMAT}', frame, codec, 128)
+                for start, stop, channels in [(0, None, None), (100, 300, ['b', 'e']), (127, 129, ['f', 'a']),
+                                              (900, 2000, ['c']), (500, 500, None)]:
+                    expected = frame.iloc[start:stop] if channels is None else frame.iloc[start:stop][channels]
+                    pd.testing.assert_frame_equal(dataset.to_frame(start, stop, channels), expected)
+                with self.assertRaises(KeyError):
+                    dataset.read(0, 10, ['z'])
+
+
+
+class TestReadRange(unittest.TestCase):
+
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.data_manager = DataManager()
+        self.data_manager.BAND_ASSETS_PATH = Path(temporary.name)
+        self.frame = pd.DataFrame(np.random.default_rng(9).integers(0, 256, size=(2000, 8), dtype=np.uint8))
+
+    def add_dataset(self, dataset_id, metadata, data_file):
+        dataset_folder = self.data_manager.BAND_ASSETS_PATH / dataset_id
+        dataset_folder.mkdir()
+        with open(dataset_folder / 'metadata.yaml', 'w') as f:
+            yaml.dump(metadata, f)
+        if data_file.endswith(ChunkedDataset.FORMAT):
+            ChunkedDataset.write(dataset_folder / data_file, self.frame, chunk_samples=256)
+        else:
+            self.frame.astype(np.int64).to_pickle(dataset_folder / data_file, compression='gzip')
+        return dataset_folder
+
+    def test_converts_seconds_to_samples(self):
+        self.add_dataset('1', {'band': {'sampling_rate': 500}}, f'emg_raw_data{ChunkedDataset.FORMAT}')
+
+        pd.testing.assert_frame_equal(self.data_manager.read_range('1', 1.5, 2.0, channels=[2, 5]),
+                                      self.frame.iloc[750:1000][[2, 5]], check_column_type=False)
+        pd.testing.assert_frame_equal(self.data_manager.read_range('1', 0.0031, 0.01), self.frame.iloc[2:5],
+                                      check_column_type=False)
+
+    def test_legacy_dataset_is_read_from_its_mapped_copy(self):
+        dataset_folder = self.add_dataset('2', {'subject': {'gender': 'f'}}, 'emg_raw_data.pkl.gz')
+
+        with self.assertRaises(ValueError):
+            self.data_manager.read_range('2', 0, 1)
+        data = self.data_manager.read_range('2', 1, 3, channels=[0], sampling_rate=250)
+
+        self.assertTrue((dataset_folder / 'emg_raw_data.mapped').exists())
+        np.testing.assert_array_equal(data.to_numpy(), self.frame.iloc[250:750][[0]].to_numpy())
+        self.assertEqual(data.index[0], 250)
+
+    def test_stored_datasets_are_mapped_without_a_copy(self):
+        dataset_folder = self.add_dataset('1', {'band': {'sampling_rate': 500}}, f'emg_raw_data{ChunkedDataset.FORMAT}')
+
+        emg_signal = self.data_manager.load_dataset('1', lazy=True)
+
+        self.assertIsInstance(emg_signal._store.values().base, np.memmap)
+        self.assertFalse((dataset_folder / 'emg_raw_data.mapped').exists())
+        np.testing.assert_array_equal(emg_signal.signal.to_numpy(), self.frame.to_numpy())
+
+    def test_rejects_negative_times(self):
+        self.add_dataset('1', {'band': {'sampling_rate': 500}}, f'emg_raw_data{ChunkedDataset.FORMAT}')
+        for start, stop in [(-1, 2), (0, -0.5)]:
+            with self.assertRaises(ValueError):
+                self.data_manager.read_range('1', start, stop)
+
+
+
+class TestLazySignal(unittest.TestCase):
+
+    def test_signal_over_memory_mapped_dataset(self):
+        frame = pd.DataFrame(np.random.default_rng(7).integers(0, 256, size=(5000, 4), dtype=np.uint8))
+        with tempfile.TemporaryDirectory() as folder:
+            dataset = ChunkedDataset.write(Path(folder) / f'data{ChunkedDataset.FORMAT}', frame, 'raw', 1024,
+                                           attributes={'content_hash': FeatureCache.content_hash(frame)})
+            samples = dataset.memmap()
+            self.assertIsInstance(samples, np.memmap)
+
+            cache = FeatureCache(Path(folder) / 'cache')
+            emg_signal = EMGSignal.from_store(SignalStore.from_array(samples.T, dataset.columns), {},
+                                              dataset.attributes['content_hash'], feature_cache=cache)
+            self.assertTrue(np.shares_memory(emg_signal.signal.to_numpy(), samples))
+            pd.testing.assert_frame_equal(emg_signal.signal, frame, check_column_type=False)
+
+            # Same cache key as the signal of the data read into memory
+            eager = EMGSignal(frame, {}, feature_cache=cache)
+            for signal in (eager, emg_signal):
+                signal.schedule_feature_extraction(_ChannelPeaks())
+                signal.extract_features()
+            self.assertEqual((cache.misses, cache.hits), (1, 1))
+
+            emg_signal.schedule_filter(Offset(128))
+            emg_signal.apply_filters()
+            np.testing.assert_array_equal(emg_signal.signal.to_numpy(), frame.to_numpy() - 128.0)
+            np.testing.assert_array_equal(ChunkedDataset(dataset.path).memmap(), frame.to_numpy())
+
+            with self.assertRaises(ValueError):
+                ChunkedDataset.write(Path(folder) / f'zlib{ChunkedDataset.FORMAT}', frame, 'zlib').memmap()
+
+
+
+class TestDatasetCatalog(unittest.TestCase):
+
+    def setUp(self):
+        temporary = tempfile.TemporaryDirectory()
+        self.addCleanup(temporary.cleanup)
+        self.folder = Path(temporary.name)
+        self.described = []
+
+    def describe(self, dataset_folder):
+        self.described.append(dataset_folder.name)
+        return {'gender': (dataset_folder / 'metadata.yaml').read_text(), 'samples': 10,
+                'subject': {'name': dataset_folder.name}, 'band': {}, 'metadata': {}}
+
+    def add_dataset(self, dataset_id, gender):
+        (self.folder / dataset_id).mkdir(exist_ok=True)
+        (self.folder / dataset_id / 'metadata.yaml').write_text(gender)
+
+    def test_refreshes_only_changed_datasets(self):
+        for dataset_id, gender in [('2', 'm'), ('10', 'f'), ('1', 'm')]:
+            self.add_dataset(dataset_id, gender)
+        catalog = DatasetCatalog(self.folder / 'catalog.sqlite', self.folder, ('metadata.yaml',), self.describe)
+        self.assertFalse((self.folder / 'catalog.sqlite').exists())
+
+        self.assertEqual(catalog.refresh(), 3)
+        self.assertEqual([entry['dataset_id'] for entry in catalog.entries()], ['1', '2', '10'])
+        self.assertEqual([entry['dataset_id'] for entry in catalog.entries(gender='m')], ['1', '2'])
+        self.assertEqual(catalog.entry('10')['subject'], {'name': '10'})
+
+        self.described.clear()
+        self.assertEqual(catalog.refresh(), 0)
+        self.assertEqual(self.described, [])
+
+        self.add_dataset('2', 'female')  # a different size, whatever the timestamp resolution
+        (self.folder / '1' / 'metadata.yaml').unlink()
+        (self.folder / '1').rmdir()
+        self.assertEqual(catalog.refresh(), 2)
+        self.assertEqual(self.described, ['2'])
+        self.assertIsNone(catalog.entry('1'))
+
+        # Persistent, a new catalog of the same database doesn't describe anything again
+        reopened = DatasetCatalog(self.folder / 'catalog.sqlite', self.folder, ('metadata.yaml',), self.describe)
+        self.assertEqual(reopened.refresh(), 0)
+        self.assertEqual(reopened.entry('2')['gender'], 'female')
+
+    def test_datasets_are_described_outside_of_the_write_transaction(self):
+        self.add_dataset('1', 'm')
+        self.add_dataset('2', 'f')
+        database_path = self.folder / 'catalog.sqlite'
+
+        def describe(dataset_folder):
+            # Another process can still write while a dataset is read
+            connection = sqlite3.connect(database_path, timeout=0)
+            with connection:
+                connection.execute('BEGIN IMMEDIATE')
+            connection.close()
+            return self.describe(dataset_folder)
+
+        catalog = DatasetCatalog(database_path, self.folder, ('metadata.yaml',), describe)
+        catalog.entries()
+        self.assertEqual(catalog.refresh(), 2)
+
+    def test_describes_datasets_with_empty_metadata_sections(self):
+        self.add_dataset('1', 'subject:\nband:\n')
+        data_manager = DataManager()
+        data_manager.BAND_ASSETS_PATH = self.folder
+        entry = data_manager._describe_dataset(self.folder / '1')
+        self.assertEqual((entry['subject'], entry['band'], entry['gender']), ({}, {}, None))
+
+
+
 
 if __name__ == "__main__":
     pytest.main()
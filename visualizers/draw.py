@@ -1,16 +1,17 @@
 import pandas as pd
-import numpy as np
 import matplotlib.pyplot as plt
 
 import matplotlib
 
+from backend.data_manager import DataManager
+from backend.feature_extractors.snr import StreamingSNR
 
 
 def main(file_path):
     # Path to the dataset file
     dataset_file = file_path
     # Read the dataset into a pandas DataFrame without a header
-    df = pd.read_pickle(dataset_file, compression='gzip')
+    df = DataManager.read_data_file(dataset_file)
 
     # Assuming the EMG data starts from the first column and goes onward
     # Rename the columns to reflect EMG channels (e.g., 'emg1', 'emg2', etc.)
@@ -18,25 +19,17 @@ def main(file_path):
     column_names = [f'emg{i+1}' for i in range(num_columns)]
     df.columns = column_names
 
+    # Per channel SNR, the noise floor is estimated from the quietest parts of each channel
+    channels = df
+    if num_columns == 128:  # recorded one 8-channel packet (16 interleaved samples of each channel) per row
+        channels = pd.DataFrame(df.values.reshape(-1, 8), columns=[f'emg{i+1}' for i in range(8)])
+    snr = StreamingSNR().extract(channels).loc['snr_db']
+    print('SNR:', ', '.join(f'{channel} {value:.2f} dB' for channel, value in snr.items()))
+
     # Assuming we are interested in all EMG channels for analysis
     # Combine all columns into a single series for processing
     emg_signal = df.values.flatten()
 
-    # Define the noise segment (for simplicity, using the first 100 samples as noise)
-    noise_segment = emg_signal[:100]
-    signal_segment = emg_signal
-
-    # Function to calculate SNR
-    def calculate_snr(signal, noise):
-        signal_power = np.mean(signal**2)
-        noise_power = np.mean(noise**2)
-        snr = 10 * np.log10(signal_power / noise_power)
-        return snr
-
-    # Calculate SNR
-    snr = calculate_snr(signal_segment, noise_segment)
-    print(f'SNR: {snr:.2f} dB')
-
     # Visualize the EMG data
     fig, ax = plt.subplots(figsize=(12, 6))
     ax.plot(emg_signal, label='Raw EMG Signal')